@@ -0,0 +1,254 @@
+"""Page render benchmarks against synthetic hospital datasets.
+
+Runs every page under ``pages/`` headless with Streamlit's AppTest against
+synthetic copies of UAE_hospitals_data.csv of different sizes, and records
+for each page and interaction:
+
+- ``wall_s``: wall-clock time of the script run
+- ``peak_rss_mb``: peak resident memory of the process during the run
+  (Linux resets the high-water mark per run; elsewhere it is the process peak)
+- ``figure_bytes``: total size of the Plotly figure JSON sent to the browser
+- ``csv_parses``: number of ``pd.read_csv`` calls made during the run
+
+Interactions are ``first_run`` (new session), ``rerun`` (same session, no
+change) and ``filter`` (the global Emirate filter set to one Emirate;
+skipped on pages without the global filter, such as Diagnostics).
+
+Each dataset size runs in its own Python process, so caches and memory do not
+leak between sizes; ``--isolate`` also gives every page a fresh process, which
+measures each page's cold start rather than its cost after earlier pages.
+
+Usage (from my_streamlit_app/):
+
+    python benchmarks/run_benchmarks.py --rows 7000 100000 1000000 --out results.json
+
+Synthetic CSVs are cached in ``benchmarks/data``. Results are written as JSON.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+SOURCE_CSV = os.path.join(APP_DIR, "UAE_hospitals_data.csv")
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+INTERACTIONS = ['first_run', 'rerun', 'filter']
+
+NAME_COL = 'Name of hospital or clinic'
+REVIEW_COLS = ['number of reviews', 'positive reviews', 'negative reviews']
+COORD_COLS = ['Location_Lat', 'Location_Lon']
+
+
+# --- Synthetic data ---
+
+def synthesize(n_rows, seed=0, source=SOURCE_CSV):
+    """A frame with the source CSV's columns and value distributions, ``n_rows`` long.
+
+    Rows are resampled from the source. Numeric columns are scaled by a
+    random factor of up to 10%, coordinates are jittered, and names get a
+    replica suffix, so larger datasets also have more distinct hospitals.
+    """
+    src = pd.read_csv(source)
+    rng = np.random.default_rng(seed)
+    df = src.iloc[rng.integers(0, len(src), n_rows)].reset_index(drop=True)
+
+    replica = np.arange(n_rows) // len(src)
+    df[NAME_COL] = np.where(replica == 0, df[NAME_COL].astype(str),
+                            df[NAME_COL].astype(str) + ' ' + (replica + 1).astype(str))
+    numeric = [col for col in df.select_dtypes('number').columns if col not in COORD_COLS]
+    for col in numeric:
+        if col in REVIEW_COLS:
+            continue
+        values = df[col].to_numpy(dtype='float64') * rng.uniform(0.9, 1.1, n_rows)
+        integral = np.all(np.mod(src[col].dropna(), 1) == 0)
+        df[col] = np.round(values) if integral else np.round(values, 2)
+    # One factor for all review counts keeps positive + negative <= total.
+    factor = rng.uniform(0.9, 1.1, n_rows)
+    for col in REVIEW_COLS:
+        if col in df.columns:
+            df[col] = np.floor(df[col].to_numpy(dtype='float64') * factor)
+    for col in COORD_COLS:
+        if col in df.columns:
+            df[col] = df[col] + rng.normal(0, 0.01, n_rows)
+    for col in numeric:
+        if np.all(np.mod(df[col].dropna(), 1) == 0):
+            df[col] = df[col].astype('Int64')
+    return df
+
+
+def dataset_path(n_rows, seed=0):
+    """Path of the synthetic CSV with ``n_rows`` rows, generating it on first use."""
+    path = os.path.join(DATA_DIR, f"hospitals_{n_rows}_seed{seed}.csv")
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        synthesize(n_rows, seed).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    return path
+
+
+# --- Measurements (run inside the worker process) ---
+
+def _reset_peak_rss():
+    # Writing 5 to clear_refs resets VmHWM (Linux only).
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class _ParseCounter:
+    """Wraps ``pd.read_csv`` to count calls."""
+
+    def __init__(self):
+        self.count = 0
+        self._read_csv = pd.read_csv
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+        return self._read_csv(*args, **kwargs)
+
+
+def _measure(at, run, counter):
+    _reset_peak_rss()
+    parses_before = counter.count
+    started = time.perf_counter()
+    run()
+    wall = time.perf_counter() - started
+    figures = at.get('plotly_chart')
+    return {
+        'wall_s': round(wall, 4),
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+        'figure_bytes': sum(len(chart.proto.spec) for chart in figures),
+        'figures': len(figures),
+        'csv_parses': counter.count - parses_before,
+        'exceptions': [str(e.value)[:300] for e in at.exception],
+    }
+
+
+def _has_state_filter(at):
+    return any(widget.key == 'global_filter_states' for widget in at.multiselect)
+
+
+def _set_state_filter(at):
+    widget = at.multiselect(key='global_filter_states')
+    widget.set_value(list(widget.options[:1]))
+
+
+def run_pages(pages, timeout):
+    """Run every page through each interaction in this process; returns result rows."""
+    from streamlit.testing.v1 import AppTest
+
+    counter = _ParseCounter()
+    pd.read_csv = counter
+    results = []
+    for page in pages:
+        at = AppTest.from_file(os.path.join(APP_DIR, page), default_timeout=timeout)
+        steps = {
+            'first_run': at.run,
+            'rerun': at.run,
+            'filter': lambda: (_set_state_filter(at), at.run()),
+        }
+        for interaction in INTERACTIONS:
+            if interaction == 'filter' and not _has_state_filter(at):
+                continue  # the page has no global filter (e.g. Diagnostics), so there is nothing to measure
+            try:
+                row = _measure(at, steps[interaction], counter)
+            except Exception as e:  # a failed interaction is recorded, the remaining ones still run
+                row = {'error': f"{type(e).__name__}: {e}"}
+            results.append({'page': page, 'interaction': interaction, **row})
+    return results
+
+
+# --- Driver ---
+
+def _worker(args):
+    os.chdir(APP_DIR)
+    sys.path.insert(0, APP_DIR)
+    print(json.dumps(run_pages(args.pages, args.timeout)))
+
+
+def _run_worker(n_rows, pages, args):
+    env = dict(os.environ, HOSPITALS_DATA_PATH=dataset_path(n_rows, args.seed),
+               HOSPITALS_WARMUP='1' if args.warmup else '0')
+    command = [sys.executable, os.path.abspath(__file__), '--worker', '--timeout', str(args.timeout), '--pages', *pages]
+    started = time.perf_counter()
+    done = subprocess.run(command, env=env, capture_output=True, text=True, cwd=APP_DIR)
+    if done.returncode != 0:
+        raise RuntimeError(f"Benchmark worker failed for {n_rows} rows:\n{done.stderr[-2000:]}")
+    rows = json.loads(done.stdout.strip().splitlines()[-1])
+    print(f"{n_rows:>9,} rows: {', '.join(pages) if len(pages) == 1 else f'{len(pages)} pages'} "
+          f"in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return [{'rows': n_rows, **row} for row in rows]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[7000, 100000, 1000000],
+                        help="dataset sizes to benchmark")
+    parser.add_argument('--pages', nargs='+', default=None,
+                        help="page files relative to my_streamlit_app/ (default: every page under pages/)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--isolate', action='store_true', help="run every page in a fresh process")
+    parser.add_argument('--warmup', action='store_true', help="leave the background cache warm-up switched on")
+    parser.add_argument('--timeout', type=float, default=600, help="seconds allowed per script run")
+    parser.add_argument('--out', default=None, help="JSON file for the results (default: benchmarks/results/<time>.json)")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.pages is None:
+        args.pages = sorted(os.path.relpath(page, APP_DIR) for page in glob.glob(os.path.join(APP_DIR, 'pages', '*.py')))
+    if args.worker:
+        _worker(args)
+        return
+
+    results = []
+    for n_rows in args.rows:
+        batches = [[page] for page in args.pages] if args.isolate else [args.pages]
+        for pages in batches:
+            results.extend(_run_worker(n_rows, pages, args))
+
+    import streamlit
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'streamlit': streamlit.__version__,
+        'platform': platform.platform(),
+        'isolate': args.isolate,
+        'warmup': args.warmup,
+        'results': results,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(results)} measurements to {out}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
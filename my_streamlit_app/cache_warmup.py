@@ -0,0 +1,201 @@
+"""Background warm-up of the shared dataset and every derived table.
+
+Without it the first visitor to each page pays for loading the typed frame
+and building the aggregates that page needs, inside their own script run.
+``start_warmup`` (called by the shared page loader) builds all of them in a
+small thread pool as soon as the app process handles its first run, and a
+watcher thread repeats the warm-up whenever the CSV changes on disk or a
+delta file arrives (tables with an update function are then patched, not
+rebuilt, see hospital_deltas). Figures cached for the previous version are
+dropped at that point.
+
+Threads rather than processes: the caches live in this process's memory, so
+work done in another process would not be visible to the pages. The heavy
+steps are NumPy/pandas/pyarrow calls that release the GIL for most of their
+run. If a page asks for a table that is still being built, the per-table
+build lock in ``cached_artifact`` makes it wait for the worker's result
+instead of computing it a second time.
+
+``warmup_status`` and ``is_ready`` report progress so pages can say what is
+still being prepared. Setting ``HOSPITALS_WARMUP=0`` in the environment
+turns the warm-up off, so every table is built on first use as before.
+"""
+import contextlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from distributions import distribution_groups, histogram
+from figure_cache import clear_figure_cache
+from hospital_data import HOSPITALS_DATA_PATH, dataset_fingerprint, load_hospitals
+from hospital_forecast import hospital_fits, state_forecast
+from hospital_index import hospital_names, trigram_index
+from hospital_metrics import available_years, metric_totals, patient_growth, state_cube, state_summary
+from hospital_rankings import RANKING_METRICS, leaderboard
+from keyword_engine import TERM_COLUMNS, keyword_frequencies, term_bitsets
+from map_clusters import CLUSTER_MAX_ZOOM, clusters_for_zoom, grid_index, state_centers
+from pair_statistics import pair_statistics
+from spatial_index import spatial_index
+
+logger = logging.getLogger(__name__)
+
+WARMUP_WORKERS = 4
+WATCH_INTERVAL_S = 5.0
+WARMUP_ENABLED = os.environ.get('HOSPITALS_WARMUP', '1') != '0'
+
+
+def _warm_metrics():
+    state_cube()
+    state_summary()
+    metric_totals()
+    patient_growth()
+
+
+def _warm_rankings():
+    for metric in RANKING_METRICS:
+        leaderboard(metric)
+
+
+def _warm_forecasts():
+    hospital_fits()
+    for metric in ('cost', 'income'):
+        state_forecast(metric)
+
+
+def _warm_keywords():
+    for kind in TERM_COLUMNS:
+        keyword_frequencies(kind)
+    term_bitsets('treatments')
+
+
+def _warm_map():
+    grid_index()
+    spatial_index()
+    state_centers()
+    for zoom in range(CLUSTER_MAX_ZOOM):
+        clusters_for_zoom(zoom)
+
+
+def _warm_names():
+    hospital_names()
+    trigram_index()
+
+
+def _warm_distributions():
+    for columns in distribution_groups(available_years()).values():
+        for column in columns:
+            histogram(column)
+
+
+def _warm_correlations():
+    pair_statistics()
+
+
+# Step name -> (label, function). The typed frame is loaded first; the other
+# steps run concurrently once it is in memory.
+WARMUP_STEPS = {
+    'metrics': ("State x year cube and totals", _warm_metrics),
+    'rankings': ("Hospital rankings", _warm_rankings),
+    'forecasts': ("Hospital trend fits and State forecasts", _warm_forecasts),
+    'names': ("Hospital name and search indexes", _warm_names),
+    'keywords': ("Keyword and treatment frequencies and treatment bitsets", _warm_keywords),
+    'map': ("Map clusters, grid index and nearest-facility index", _warm_map),
+    'distributions': ("Distribution histograms", _warm_distributions),
+    'correlations': ("Correlation matrix and pair fits", _warm_correlations),
+}
+
+_state_lock = threading.Lock()
+_status = {'fingerprint': None, 'steps': {}, 'errors': {}, 'seconds': {}}
+_watcher = None
+
+
+def _set(step, state, seconds=None, error=None):
+    with _state_lock:
+        _status['steps'][step] = state
+        if seconds is not None:
+            _status['seconds'][step] = seconds
+        if error is not None:
+            _status['errors'][step] = error
+
+
+def _run_step(step, function):
+    _set(step, 'running')
+    started = time.perf_counter()
+    try:
+        function()
+    except Exception as e:  # a failed step only means that page builds its table on demand
+        logger.warning("Warm-up step '%s' failed: %s", step, e)
+        _set(step, 'failed', time.perf_counter() - started, str(e))
+    else:
+        _set(step, 'ready', time.perf_counter() - started)
+
+
+def _warm(path, fingerprint):
+    if _status['fingerprint'] is not None:
+        # Figures of the previous version can no longer be served; free their memory now rather than by eviction.
+        clear_figure_cache()
+    with _state_lock:
+        _status.update(fingerprint=fingerprint, errors={}, seconds={},
+                       steps=dict.fromkeys(['frame', *WARMUP_STEPS], 'pending'))
+    _run_step('frame', lambda: load_hospitals(path))
+    if _status['steps']['frame'] != 'ready':
+        return
+    with ThreadPoolExecutor(max_workers=WARMUP_WORKERS, thread_name_prefix='warmup') as pool:
+        for step, (_label, function) in WARMUP_STEPS.items():
+            pool.submit(_run_step, step, function)
+
+
+def _fingerprint_or_none(path):
+    try:
+        return dataset_fingerprint(path)
+    except OSError:
+        return None
+
+
+def _watch(path):
+    # Warm-ups run one after another on this thread; a CSV change during a
+    # warm-up is picked up by the next check.
+    while True:
+        fingerprint = _fingerprint_or_none(path)
+        if fingerprint is not None and fingerprint != _status['fingerprint']:
+            _warm(path, fingerprint)
+        time.sleep(WATCH_INTERVAL_S)
+
+
+def start_warmup(path=HOSPITALS_DATA_PATH):
+    """Start the warm-up and CSV watcher threads (once per process; later calls are no-ops)."""
+    global _watcher
+    with _state_lock:
+        if _watcher is not None or not WARMUP_ENABLED:
+            return
+        _watcher = threading.Thread(target=_watch, args=(path,), name='warmup-watcher', daemon=True)
+        _watcher.start()
+
+
+def warmup_status():
+    """Snapshot of the warm-up: dataset fingerprint plus per-step state, errors and seconds taken.
+
+    Step states are 'pending', 'running', 'ready' or 'failed'.
+    """
+    with _state_lock:
+        return {key: dict(value) if isinstance(value, dict) else value for key, value in _status.items()}
+
+
+def is_ready(*steps):
+    """Whether every step in ``steps`` has been warmed for the dataset currently on disk."""
+    status = warmup_status()
+    if status['fingerprint'] != _fingerprint_or_none(HOSPITALS_DATA_PATH):
+        return False
+    return all(status['steps'].get(step) == 'ready' for step in steps)
+
+
+def warmup_spinner(*steps):
+    """A spinner naming the steps still being prepared, or a no-op context if they are ready."""
+    if is_ready(*steps):
+        return contextlib.nullcontext()
+    labels = [WARMUP_STEPS[step][0].lower() for step in steps if step in WARMUP_STEPS]
+    return st.spinner(f"Preparing {', '.join(labels)} (first load after start-up or a data update)...")
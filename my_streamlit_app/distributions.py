@@ -0,0 +1,56 @@
+"""Histograms computed live from the shared dataset.
+
+Replaces the pre-rendered PNG gallery: bin counts come from ``np.histogram``
+over the cached frame and are memoized per (dataset version, column, bins,
+filter), so a chart is recomputed only when the data or the request changes
+and the browser receives a few dozen bar heights instead of an image.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from hospital_data import dataset_fingerprint, filter_key, load_hospitals, year_metric_columns
+from hospital_metrics import METRIC_LABELS, patient_growth
+from instrumentation import track_cache
+
+GROWTH_COLUMNS = ['Patient_Growth_abs', 'Patient_Growth_rel']
+REVIEW_COLUMNS = ['number of reviews', 'positive reviews', 'negative reviews']
+
+
+def distribution_groups(years=None):
+    """Chart groups shown on the page: label -> list of column names (year columns limited to ``years``)."""
+    columns = load_hospitals().columns
+    groups = {}
+    for col, metric, year in year_metric_columns(columns):
+        if years is not None and year not in years:
+            continue
+        groups.setdefault(METRIC_LABELS.get(metric, metric), []).append(col)
+    groups['Patient Growth'] = list(GROWTH_COLUMNS)
+    groups['Reviews'] = [col for col in REVIEW_COLUMNS if col in columns]
+    return groups
+
+
+def column_values(column):
+    """Values of a frame column or of one of the derived growth columns, as float64."""
+    if column in GROWTH_COLUMNS:
+        return patient_growth()[column].to_numpy(dtype='float64')
+    return load_hospitals()[column].to_numpy(dtype='float64')
+
+
+@track_cache
+@lru_cache(maxsize=512)
+def _histogram(fingerprint, column, bins, hospital_filter):
+    values = column_values(column)
+    rows = None if hospital_filter is None else hospital_filter.rows()
+    if rows is not None:
+        values = values[rows]
+    values = values[~np.isnan(values)]
+    counts, edges = np.histogram(values, bins=bins)
+    counts.setflags(write=False)
+    edges.setflags(write=False)
+    return counts, edges
+
+
+def histogram(column, bins=30, hospital_filter=None):
+    """Return (counts, bin_edges) for ``column`` over the hospitals kept by ``hospital_filter``."""
+    return _histogram(dataset_fingerprint(), column, int(bins), filter_key(hospital_filter))
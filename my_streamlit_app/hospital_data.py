@@ -0,0 +1,401 @@
+"""Shared, process-wide access to UAE_hospitals_data.csv.
+
+Every page used to run its own ``pd.read_csv`` + ``pd.to_numeric`` block on
+every rerun. This module parses and type-coerces the dataset once per process,
+keeps it in memory until the file on disk changes (mtime/size check), and
+hands each caller a read-only view of that single frame. Column types come
+from the declared schema in hospital_schema, and the typed frame is
+validated once per load.
+
+When pyarrow is installed the typed frame is also written next to the CSV as
+an uncompressed Feather file (``UAE_hospitals_data.feather``). A fresh process
+memory-maps that snapshot instead of re-running the CSV text parser, and the
+snapshot is rebuilt automatically whenever the CSV is newer than it.
+
+Files of ``HOSPITALS_STORE_THRESHOLD_MB`` (256 MB) or more are not parsed in
+one go. They are streamed in chunks into an on-disk columnar store (see
+hospital_store) and the frame is loaded from it without the long free-text
+columns, which are read on demand through ``load_columns`` and
+``column_batches``. ``HOSPITALS_STORE=1`` or ``0`` forces the choice.
+
+Delta files next to the CSV (see hospital_deltas) are merged into the
+loaded frame as they appear, and derived tables registered with an
+``update`` function are patched from the changed rows instead of rebuilt.
+Each dataset version is an immutable entry: a page run pins the version it
+started with, so a refresh in the middle of a run never mixes two versions
+on one page.
+
+With ``HOSPITALS_SHARED_DIR`` set, the frame and the derived tables are
+published once per host and memory-mapped by every server process (see
+shared_dataset); a process only loads or builds what no other has yet.
+"""
+import logging
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from hospital_schema import (
+    NAME_COL, RATE_COL, STATE_COL, apply_schema, column_dtypes, conforms, validate, year_metric_columns,
+)
+from hospital_deltas import delta_files, delta_signature, merge_delta, read_delta
+from hospital_store import LAZY_COLUMNS, ingest_csv, iter_column, read_columns, store_is_current, store_manifest
+from instrumentation import begin_run, count, span
+from shared_dataset import attach as attach_shared, prune as prune_shared, publish as publish_shared
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # snapshot is an optimisation; fall back to the CSV parser
+    feather = None
+
+# --- Define Path for Data ---
+# HOSPITALS_DATA_PATH in the environment points the app at another CSV with the
+# same columns (used by the benchmarks for synthetic datasets).
+app_directory = os.path.dirname(os.path.abspath(__file__))
+HOSPITALS_DATA_PATH = os.environ.get("HOSPITALS_DATA_PATH") or os.path.join(app_directory, "UAE_hospitals_data.csv")
+SNAPSHOT_SUFFIX = ".feather"
+STORE_THRESHOLD_BYTES = int(float(os.environ.get("HOSPITALS_STORE_THRESHOLD_MB", 256)) * 2 ** 20)
+
+# pandas < 3 only protects shared frames from in-place edits with Copy-on-Write
+# switched on; pandas 3 always behaves this way.
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_loaded = {}  # path -> {'fingerprint', 'frame', 'store', 'overlay', 'issues', 'artifacts', 'updaters', 'locks'}
+_local = threading.local()  # .pinned: path -> entry seen by the current page run
+
+
+def _file_fingerprint(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def dataset_version(path=HOSPITALS_DATA_PATH):
+    """Cheap identity of the data on disk: the CSV's mtime and size plus the delta files applied on top."""
+    return (*_file_fingerprint(path), delta_signature(path))
+
+
+def dataset_fingerprint(path=HOSPITALS_DATA_PATH):
+    """Version of the dataset the current page run sees (the latest on disk outside a page run)."""
+    pinned = getattr(_local, 'pinned', {}).get(path)
+    return pinned['fingerprint'] if pinned is not None else dataset_version(path)
+
+
+def snapshot_path(path=HOSPITALS_DATA_PATH):
+    return os.path.splitext(path)[0] + SNAPSHOT_SUFFIX
+
+
+def _parse_hospitals(path):
+    return apply_schema(pd.read_csv(path))
+
+
+def build_snapshot(path=HOSPITALS_DATA_PATH):
+    """Parse the CSV and write the typed columnar snapshot next to it; returns the parsed frame.
+
+    The Feather file is written uncompressed so it can be memory-mapped, and
+    goes through a temporary file so readers never see a half-written snapshot.
+    """
+    df = _parse_hospitals(path)
+    if feather is not None:
+        target = snapshot_path(path)
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        try:
+            feather.write_feather(df, tmp_path, compression='uncompressed')
+            os.replace(tmp_path, target)
+        except OSError:
+            # Read-only deployments still work, they just parse the CSV on start.
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return df
+
+
+def _read_snapshot(path):
+    target = snapshot_path(path)
+    if feather is None or not os.path.exists(target):
+        return None
+    if os.stat(target).st_mtime_ns < os.stat(path).st_mtime_ns:
+        return None  # CSV is newer; snapshot is stale
+    try:
+        table = feather.read_table(target, memory_map=True)
+    except Exception:
+        return None  # unreadable snapshot (e.g. older pyarrow); rebuild it
+    df = table.to_pandas(split_blocks=True)
+    if not all(conforms(df[col].dtype, declared) for col, declared in column_dtypes(df.columns).items()):
+        return None  # written under an older schema; rebuild it
+    return df
+
+
+def uses_store(path=HOSPITALS_DATA_PATH):
+    """Whether ``path`` is loaded through the chunked on-disk store rather than parsed in one go."""
+    setting = os.environ.get("HOSPITALS_STORE")
+    if feather is None:
+        return False
+    if setting in ('0', '1'):
+        return setting == '1'
+    return os.stat(path).st_size >= STORE_THRESHOLD_BYTES
+
+
+def uses_stored_aggregates(path=HOSPITALS_DATA_PATH):
+    """Whether the store's ingestion-time aggregates describe the current version (store used, no delta applied)."""
+    entry = _current(path)
+    return entry['store'] and not entry['fingerprint'][2]
+
+
+def _load_from_store(path):
+    fingerprint = _file_fingerprint(path)
+    if not store_is_current(path, fingerprint):
+        with span('ingest'):
+            ingest_csv(path, fingerprint)
+    columns = [col for col in store_manifest(path)['columns'] if col not in LAZY_COLUMNS]
+    return apply_schema(read_columns(path, columns))
+
+
+def _load_typed(path):
+    if uses_store(path):
+        return _load_from_store(path)
+    df = _read_snapshot(path)
+    if df is None:
+        df = build_snapshot(path)
+    return df
+
+
+def load_hospitals(path=HOSPITALS_DATA_PATH):
+    """Return the hospitals frame, parsing the CSV only if it changed since the last call.
+
+    The result is a shallow, copy-on-write view of the shared frame: callers may
+    add columns or filter freely, but nothing they do reaches other sessions.
+    Raises FileNotFoundError if the CSV is missing.
+    """
+    return _current(path)['frame'].copy(deep=False)
+
+
+def _current(path):
+    pinned = getattr(_local, 'pinned', {}).get(path)
+    if pinned is not None:
+        return pinned
+    version = dataset_version(path)
+    with _lock:
+        entry = _loaded.get(path)
+        if entry is None or entry['fingerprint'] != version:
+            entry = _refresh(path, entry, version)
+            _loaded[path] = entry
+    return entry
+
+
+def _load_entry(path, base):
+    fingerprint = (*base, ())
+    store = uses_store(path)
+    frame, issues = attach_shared(path, fingerprint, 'frame'), attach_shared(path, fingerprint, 'issues')
+    if frame is None or issues is None:
+        frame = _load_typed(path)
+        issues = validate(frame, deferred=LAZY_COLUMNS if store else ())
+        frame = publish_shared(path, fingerprint, 'frame', frame)
+        publish_shared(path, fingerprint, 'issues', issues)
+        prune_shared(path)
+    else:
+        count('shared_attach')
+    for issue in issues:
+        logger.warning("%s: %s", os.path.basename(path), issue)
+    return {'fingerprint': fingerprint, 'frame': frame, 'store': store, 'overlay': {},
+            'store_rows': len(frame), 'issues': issues, 'artifacts': {}, 'updaters': {}, 'locks': {}}
+
+
+def _refresh(path, entry, version):
+    # Only new delta files since ``entry``: apply just those. Anything else: reload the CSV first.
+    *base, deltas = version
+    base = tuple(base)
+    if entry is not None:
+        applied = entry['fingerprint'][2]
+        if entry['fingerprint'][:2] != base or deltas[:len(applied)] != applied:
+            entry = None
+    if entry is None:
+        entry = _load_entry(path, base)
+    applied = len(entry['fingerprint'][2])
+    for file, signature in zip(delta_files(path)[applied:], deltas[applied:]):
+        entry = _apply_delta(path, entry, file, signature)
+    return entry
+
+
+def _apply_delta(path, entry, file, signature):
+    """A new entry with the delta ``file`` merged in and every updatable derived table patched."""
+    fingerprint = (*entry['fingerprint'][:2], entry['fingerprint'][2] + (signature,))
+    try:
+        with span('ingest', os.path.basename(file)):
+            delta = read_delta(file)
+            change = merge_delta(entry['frame'], delta, skip_columns=LAZY_COLUMNS if entry['store'] else ())
+    except Exception as e:  # a bad delta must not take the app down; report it and keep the data as it was
+        logger.warning("Skipping delta file %s: %s", os.path.basename(file), e)
+        issue = f"Delta file {os.path.basename(file)} skipped: {e}"
+        return {**entry, 'fingerprint': fingerprint, 'issues': [*entry['issues'], issue]}
+
+    overlay = dict(entry['overlay'])
+    if entry['store']:
+        # Text columns stay on disk; the delta's non-empty values for them are kept in memory on top.
+        for col in LAZY_COLUMNS:
+            if col in change.delta.columns:
+                values = change.delta[col].dropna()
+                overlay[col] = values if col not in overlay else values.combine_first(overlay[col])
+    artifacts, updaters = {}, {}
+    for name, update in entry['updaters'].items():
+        if name in entry['artifacts']:
+            result = attach_shared(path, fingerprint, name)  # another process may have patched it already
+            if result is None:
+                with span('aggregate', f'update:{name}'):
+                    result = update(entry['artifacts'][name], change)
+                if result is not None:
+                    result = publish_shared(path, fingerprint, name, result)
+            if result is not None:
+                artifacts[name] = result
+                updaters[name] = update
+    logger.info("Applied %s: %d hospitals updated, %d added", os.path.basename(file), len(change.replaced), len(change.added))
+    return {**entry, 'fingerprint': fingerprint, 'frame': change.frame, 'overlay': overlay,
+            'artifacts': artifacts, 'updaters': updaters, 'locks': {}}
+
+
+def load_columns(columns, rows=None, path=HOSPITALS_DATA_PATH):
+    """``columns`` of the hospitals at positions ``rows`` (all if None), including columns kept on disk.
+
+    Columns missing from the dataset are left out. Returns a read-only view.
+    """
+    entry = _current(path)
+    frame = entry['frame']
+    result = frame[[col for col in columns if col in frame.columns]]
+    if rows is not None:
+        result = result.iloc[rows]
+    on_disk = [col for col in columns if col not in frame.columns]
+    if on_disk and entry['store']:
+        extra = _read_on_disk(entry, path, on_disk, rows)
+        extra.index = result.index
+        result = pd.concat([result, extra], axis=1)
+        result = result[[col for col in columns if col in result.columns]]
+    return result.copy(deep=False)
+
+
+def _read_on_disk(entry, path, columns, rows):
+    # Stored values for rows that existed at ingestion, with delta values laid over them.
+    positions = np.arange(len(entry['frame'])) if rows is None else np.asarray(rows, dtype='int64')
+    in_store = positions[positions < entry['store_rows']]
+    stored = read_columns(path, columns, None if rows is None and len(in_store) == entry['store_rows'] else in_store)
+    values = stored.reindex(positions)
+    for col in columns:
+        if col in entry['overlay'] and col in values.columns:
+            patch = entry['overlay'][col].reindex(positions)
+            values[col] = patch.where(patch.notna(), values[col])
+    return values
+
+
+def column_batches(column, path=HOSPITALS_DATA_PATH):
+    """Yield ``(first row position, Series)`` blocks covering ``column`` in row order.
+
+    Columns kept on disk are read one stored chunk at a time; anything else is a single block.
+    """
+    entry = _current(path)
+    if column not in entry['frame'].columns and entry['store']:
+        patch = entry['overlay'].get(column)
+        for first, values in iter_column(path, column):
+            if patch is not None:
+                hit = patch[(patch.index >= first) & (patch.index < first + len(values))]
+                if len(hit):
+                    values = values.copy()
+                    values.iloc[hit.index.to_numpy() - first] = hit.to_numpy()
+            yield first, values
+        if len(entry['frame']) > entry['store_rows']:
+            tail = range(entry['store_rows'], len(entry['frame']))
+            yield entry['store_rows'], (patch.reindex(tail) if patch is not None
+                                        else pd.Series(pd.NA, index=tail, dtype='string')).reset_index(drop=True)
+    else:
+        yield 0, entry['frame'][column]
+
+
+def validation_issues(path=HOSPITALS_DATA_PATH):
+    """Problems found by the schema validation of the currently loaded dataset."""
+    return list(_current(path)['issues'])
+
+
+def filter_key(hospital_filter, uses_years=False):
+    """``hospital_filter`` as part of an LRU cache key: None for any filter that keeps every row.
+
+    Pages pass the sidebar's ``HospitalFilter()`` where the warm-up and other
+    callers pass None; both must land on the same cache entry. With
+    ``uses_years`` the result depends on the filter's year range, so a filter
+    with a year range set is kept as it is.
+    """
+    if hospital_filter is None or hospital_filter.restricts_rows or (uses_years and hospital_filter.years is not None):
+        return hospital_filter
+    return None
+
+
+def cached_artifact(name, build, path=HOSPITALS_DATA_PATH, update=None):
+    """Return ``build(df)`` computed once per version of the dataset.
+
+    Derived tables (long format, aggregates, indexes, ...) live next to the
+    frame they were built from and are dropped together with it when the CSV
+    changes. Results are shared between sessions, so treat them as read-only.
+
+    When a delta file arrives, ``update(old_result, change)`` (if given)
+    derives the new version's table from the old one and the
+    hospital_deltas.DeltaChange; it must not modify ``old_result`` and may
+    return None to have the table rebuilt on next use instead.
+    """
+    entry = _current(path)
+    artifacts = entry['artifacts']
+    if name not in artifacts:
+        with _lock:
+            build_lock = entry['locks'].setdefault(name, threading.Lock())
+        with build_lock:
+            if name not in artifacts:
+                shared = attach_shared(path, entry['fingerprint'], name)
+                if shared is not None:
+                    count('shared_attach')
+                    artifacts[name] = shared
+                else:
+                    count('artifact_miss')
+                    with span('aggregate', name):
+                        result = build(entry['frame'].copy(deep=False))
+                    artifacts[name] = publish_shared(path, entry['fingerprint'], name, result)
+                if update is not None:
+                    entry['updaters'][name] = update
+    else:
+        count('artifact_hit')
+    result = artifacts[name]
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return result.copy(deep=False)
+    return result
+
+
+def loaded_tables(path=HOSPITALS_DATA_PATH):
+    """The shared frame and every derived table built so far, by name (for diagnostics; read-only)."""
+    entry = _loaded.get(path)
+    if entry is None:
+        return {}
+    return {'frame': entry['frame'], **entry['artifacts']}
+
+
+def load_hospitals_for_page(path=HOSPITALS_DATA_PATH):
+    """Page-facing wrapper: reports load problems with st.error and returns an empty frame.
+
+    It also opens the timing record of the calling page's run (see
+    instrumentation) and pins the dataset version for the rest of the run. The first call in a process starts the background
+    warm-up of every derived table (see cache_warmup).
+    """
+    begin_run(sys._getframe(1).f_globals.get('__file__', '?'))
+    # Imported here because cache_warmup depends on the modules built on top of this one.
+    from cache_warmup import start_warmup
+    start_warmup(path)
+    _local.pinned = {}
+    try:
+        with span('load'):
+            entry = _current(path)
+            _local.pinned = {path: entry}
+            return entry['frame'].copy(deep=False)
+    except FileNotFoundError:
+        st.error(f"Hospital data file '{os.path.basename(path)}' not found. Please ensure it's in your main project folder: `{path}`.")
+    except Exception as e:
+        st.error(f"Error reading hospital data file: {e}. Please ensure 'UAE_hospitals_data.csv' is in your main project folder.")
+    return pd.DataFrame()
@@ -0,0 +1,230 @@
+"""Incremental updates of the hospitals dataset from delta files.
+
+A delta is a CSV with some or all of the main file's columns, dropped into
+the ``<data file>.deltas`` directory next to it (``add_delta`` or this
+module's command line does that atomically). Rows are matched to the
+current data by hospital name and location (``KEY_COLUMNS``):
+
+- a row whose key already exists updates that hospital; empty cells leave
+  the current value as it is, so a delta can carry just a new year's figures
+- a row with a new key is appended as a new hospital
+- columns the main file does not have yet (e.g. the next year's metrics)
+  are added, empty for hospitals the delta does not mention
+
+Delta files are applied in file-name order. hospital_data applies new files
+on top of the loaded frame and hands every derived table that registered an
+``update`` function a ``DeltaChange`` describing the rows that moved, so the
+aggregates are patched rather than rebuilt. To fold the deltas into the main
+file, replace the CSV and empty the directory; that triggers a full reload.
+"""
+import argparse
+import os
+import shutil
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from hospital_schema import (
+    LAT_COL, LON_COL, NAME_COL, apply_schema, column_dtypes, year_metric_columns,
+)
+
+DELTA_SUFFIX = ".deltas"
+KEY_COLUMNS = [NAME_COL, LAT_COL, LON_COL]
+# Coordinates are compared after rounding (about 10 cm), so float formatting differences still match.
+KEY_DECIMALS = 6
+
+
+@dataclass(frozen=True, eq=False)
+class DeltaChange:
+    """One applied delta file.
+
+    ``old_frame`` and ``frame`` are the hospitals frame before and after it.
+    ``replaced`` holds the row positions of updated hospitals and ``added``
+    those of new ones (at the end of ``frame``). ``delta`` is the delta's
+    rows (numeric columns parsed, empty cells NaN) indexed by the row
+    position they were applied to.
+    """
+    old_frame: pd.DataFrame
+    frame: pd.DataFrame
+    replaced: np.ndarray
+    added: np.ndarray
+    delta: pd.DataFrame
+
+    @property
+    def changed(self):
+        """Row positions whose values may differ from ``old_frame``: updated, then new."""
+        return np.concatenate([self.replaced, self.added])
+
+    @property
+    def same_years(self):
+        """Whether the delta left the set of year metric columns unchanged."""
+        return {col for col, _, _ in year_metric_columns(self.frame.columns)} == \
+            {col for col, _, _ in year_metric_columns(self.old_frame.columns)}
+
+
+def delta_dir(path):
+    return os.path.splitext(path)[0] + DELTA_SUFFIX
+
+
+def delta_files(path):
+    """Delta CSVs for the data file ``path``, in the order they apply."""
+    directory = delta_dir(path)
+    try:
+        names = sorted(name for name in os.listdir(directory) if name.endswith('.csv'))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, name) for name in names]
+
+
+def delta_signature(path):
+    """(file name, mtime, size) of every delta file; part of the dataset version."""
+    signature = []
+    for file in delta_files(path):
+        stat = os.stat(file)
+        signature.append((os.path.basename(file), stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+def read_delta(file):
+    """Parse a delta CSV: key columns required, declared numeric columns coerced, later duplicates win.
+
+    Raises ValueError if a key column is missing.
+    """
+    delta = pd.read_csv(file)
+    missing = [col for col in KEY_COLUMNS if col not in delta.columns]
+    if missing:
+        raise ValueError(f"{os.path.basename(file)} is missing the key column(s) {', '.join(missing)}")
+    for col, dtype in column_dtypes(delta.columns).items():
+        if not (isinstance(dtype, pd.CategoricalDtype) or dtype in ('category', 'string')):
+            delta[col] = pd.to_numeric(delta[col], errors='coerce')
+    return delta[~_keys(delta).duplicated(keep='last')].reset_index(drop=True)
+
+
+def _keys(df):
+    return pd.MultiIndex.from_arrays([
+        df[NAME_COL].astype('string').str.strip().to_numpy(dtype=object),
+        df[LAT_COL].astype('float64').round(KEY_DECIMALS).to_numpy(),
+        df[LON_COL].astype('float64').round(KEY_DECIMALS).to_numpy(),
+    ])
+
+
+def _positions(frame, delta):
+    # Row position of each delta key in ``frame`` (-1 if new); the first row wins if a key repeats.
+    # Only rows sharing a name with the delta are compared, so the cost follows the delta's size.
+    wanted = delta[NAME_COL].astype('string').str.strip().dropna().unique()
+    names = frame[NAME_COL]
+    if isinstance(names.dtype, pd.CategoricalDtype):
+        label_hit = names.cat.categories.astype(str).str.strip().isin(wanted)
+        codes = names.cat.codes.to_numpy()
+        candidates = np.flatnonzero((codes >= 0) & label_hit[codes]) if len(label_hit) else np.empty(0, dtype='int64')
+    else:
+        candidates = np.flatnonzero(names.astype('string').str.strip().isin(wanted).to_numpy(dtype=bool))
+    first = pd.Series(candidates, index=_keys(frame.iloc[candidates]))
+    first = first[~first.index.duplicated()]
+    return first.reindex(_keys(delta)).fillna(-1).to_numpy(dtype='int64', copy=True)
+
+
+def _merge_column(current, appended, updates, replaced_at):
+    """``current`` followed by ``appended``, with ``updates`` (non-null values only) written at ``replaced_at``.
+
+    Categorical and string columns keep their type; numbers come back as
+    float64 and anything else as objects, for the caller to re-type.
+    """
+    keep = updates.notna().to_numpy()
+    if isinstance(current.dtype, pd.CategoricalDtype):
+        dtype = current.dtype
+        if not dtype.ordered:
+            # New labels join the categories, which stay sorted like apply_schema makes them.
+            incoming = pd.Index(pd.concat([appended, updates[keep]]).dropna().astype(str).unique())
+            dtype = pd.CategoricalDtype(current.cat.categories.union(incoming))
+        codes = np.concatenate([
+            pd.Categorical(current, dtype=dtype).codes if dtype != current.dtype else current.cat.codes.to_numpy(),
+            pd.Categorical(appended, dtype=dtype).codes,
+        ])
+        codes[replaced_at[keep]] = pd.Categorical(updates[keep], dtype=dtype).codes
+        return pd.Categorical.from_codes(codes, dtype=dtype)
+    if isinstance(current.dtype, pd.StringDtype):
+        values = pd.concat([current, appended.astype(current.dtype)], ignore_index=True)
+        values.iloc[replaced_at[keep]] = updates[keep].astype(current.dtype).to_numpy()
+        return values.array
+    if pd.api.types.is_numeric_dtype(current):
+        values = np.concatenate([current.to_numpy(dtype='float64'),
+                                 pd.to_numeric(appended, errors='coerce').to_numpy(dtype='float64')])
+        updates = pd.to_numeric(updates, errors='coerce')
+    else:
+        values = np.concatenate([current.to_numpy(dtype=object), appended.to_numpy(dtype=object)])
+    values[replaced_at[keep]] = updates.to_numpy()[keep]
+    return values
+
+
+def merge_delta(frame, delta, skip_columns=()):
+    """Apply ``delta`` (from ``read_delta``) to ``frame``; returns a ``DeltaChange``.
+
+    Columns in ``skip_columns`` are left out of the merged frame (the caller
+    keeps them elsewhere); they stay available in ``DeltaChange.delta``.
+    """
+    positions = _positions(frame, delta)
+    is_new = positions < 0
+    added = np.arange(len(frame), len(frame) + int(is_new.sum()))
+    positions[is_new] = added
+    replaced_at = positions[~is_new]
+    columns = [col for col in delta.columns if col not in skip_columns]
+    new_rows = delta.loc[is_new, columns]
+    no_updates = pd.Series(np.nan, index=replaced_at)
+
+    merged, retype = {}, []
+    for col in [*frame.columns, *(col for col in columns if col not in frame.columns)]:
+        current = frame[col] if col in frame.columns else pd.Series(np.nan, index=frame.index)
+        updates = delta.loc[~is_new, col] if col in columns and col not in KEY_COLUMNS else no_updates
+        if not len(added) and not updates.notna().any():
+            merged[col] = current  # untouched: shared with the previous version, not copied
+            continue
+        appended = new_rows[col] if col in new_rows.columns else pd.Series(np.nan, index=added)
+        merged[col] = _merge_column(current, appended, updates, replaced_at)
+        if not isinstance(merged[col], (pd.Categorical, pd.api.extensions.ExtensionArray)):
+            retype.append(col)
+    merged = pd.DataFrame(merged, index=pd.RangeIndex(len(frame) + len(added)), copy=False)
+
+    # Merged numbers are float64; cast them back to the schema (integers again where possible).
+    declared = column_dtypes(merged.columns)
+    retype = [col for col in retype if col in declared]
+    if retype:
+        typed = apply_schema(merged[retype].copy())
+        for col in retype:
+            merged[col] = typed[col]
+    return DeltaChange(old_frame=frame, frame=merged, replaced=replaced_at, added=added,
+                       delta=delta.set_axis(positions))
+
+
+def add_delta(source, path):
+    """Validate the delta CSV ``source`` and queue it for the data file ``path``; returns its new path.
+
+    The file is copied under the next sequence number, through a temporary
+    file, so running apps never see it half-written.
+    """
+    read_delta(source)
+    directory = delta_dir(path)
+    os.makedirs(directory, exist_ok=True)
+    existing = [os.path.basename(file) for file in delta_files(path)]
+    numbers = [int(name.split('-', 1)[0]) for name in existing if name.split('-', 1)[0].isdigit()]
+    target = os.path.join(directory, f"{max(numbers, default=0) + 1:06d}-{os.path.basename(source)}")
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, target)
+    return target
+
+
+def main(argv=None):
+    from hospital_data import HOSPITALS_DATA_PATH
+
+    parser = argparse.ArgumentParser(description="Queue delta CSVs for the hospitals dataset.")
+    parser.add_argument('deltas', nargs='+', help="delta CSV files, applied in the order given")
+    parser.add_argument('--data', default=HOSPITALS_DATA_PATH, help="main data file the deltas apply to")
+    args = parser.parse_args(argv)
+    for source in args.deltas:
+        print(add_delta(source, args.data))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Global hospital filter shared by every page.
+
+One filter (Emirates, rating bands, year range, treatment types offered and
+excluded, doctor-count range) lives in ``st.session_state`` and is edited from the same sidebar
+block on every page, so switching pages keeps the selection. The rows a
+filter selects are computed once per (dataset version, filter) and kept in a
+bounded LRU cache as read-only row-position arrays; pages and the aggregation
+modules reuse those instead of re-masking and copying the frame. Treatment
+conditions are answered from keyword_engine's per-treatment bitsets.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+import streamlit as st
+
+from hospital_data import RATE_COL, STATE_COL, dataset_fingerprint, load_hospitals
+from hospital_metrics import available_years
+from instrumentation import span, track_cache
+from keyword_engine import term_mask, term_matrix
+
+DOCTORS_COL = 'Number of Doctors'
+SESSION_KEY = 'global_filter'
+WIDGET_PREFIX = 'global_filter_'
+
+
+@dataclass(frozen=True)
+class HospitalFilter:
+    """Normalized filter; empty tuples / None mean "no restriction".
+
+    Instances are hashable and compare by value, so they double as cache keys.
+    """
+    states: tuple = ()
+    ratings: tuple = ()
+    treatments: tuple = ()
+    treatment_match: str = 'any'  # hospitals offering 'any' or 'all' of ``treatments``
+    excluded_treatments: tuple = ()
+    doctors: tuple = None  # (min, max), inclusive
+    years: tuple = None    # (first, last), inclusive; restricts time series, not rows
+
+    @property
+    def restricts_rows(self):
+        return bool(self.states or self.ratings or self.treatments or self.excluded_treatments or self.doctors)
+
+    def rows(self):
+        """Row positions selected by this filter, or None when every row is selected."""
+        if not self.restricts_rows:
+            return None
+        return _rows_for(dataset_fingerprint(), self.states, self.ratings, self.treatments, self.treatment_match,
+                         self.excluded_treatments, self.doctors)
+
+    def select_years(self, years):
+        """The subset of ``years`` inside the filter's year range."""
+        if self.years is None:
+            return list(years)
+        return [year for year in years if self.years[0] <= year <= self.years[1]]
+
+
+NO_FILTER = HospitalFilter()
+
+
+@track_cache
+@lru_cache(maxsize=128)
+def _rows_for(fingerprint, states, ratings, treatments, treatment_match, excluded_treatments, doctors):
+    df = load_hospitals()
+    mask = np.ones(len(df), dtype=bool)
+    if states:
+        mask &= df[STATE_COL].isin(states).to_numpy()
+    if ratings:
+        mask &= df[RATE_COL].isin(ratings).to_numpy()
+    if doctors:
+        values = df[DOCTORS_COL].to_numpy()
+        mask &= (values >= doctors[0]) & (values <= doctors[1])
+    if treatments or excluded_treatments:
+        mask &= term_mask('treatments', all_of=treatments if treatment_match == 'all' else (),
+                          any_of=treatments if treatment_match == 'any' else (), none_of=excluded_treatments)
+    rows = np.flatnonzero(mask)
+    rows.setflags(write=False)
+    return rows
+
+
+def filtered_frame(hospital_filter, df=None):
+    """``df`` (default: the shared frame) restricted to the filter's rows."""
+    df = load_hospitals() if df is None else df
+    rows = hospital_filter.rows()
+    return df if rows is None else df.iloc[rows]
+
+
+def current_filter():
+    return st.session_state.get(SESSION_KEY, NO_FILTER)
+
+
+def _rating_options(df):
+    if hasattr(df[RATE_COL], 'cat'):
+        return [str(label) for label in df[RATE_COL].cat.categories]
+    return sorted(df[RATE_COL].dropna().astype(str).unique())
+
+
+def filter_sidebar(df):
+    """Draw the global filter controls in the sidebar and return the current HospitalFilter."""
+    with span('filter'):
+        hospital_filter = _draw_filter_sidebar(df)
+        hospital_filter.rows()  # resolve the row selection inside the span
+    return hospital_filter
+
+
+def _draw_filter_sidebar(df):
+    stored = current_filter()
+    years = available_years()
+    doctor_values = df[DOCTORS_COL].dropna()
+    doctor_bounds = (int(doctor_values.min()), int(doctor_values.max()))
+
+    # Streamlit forgets widget values when another page runs. Re-assigning each
+    # key turns it into plain session state, which survives page switches; keys
+    # that are already gone are re-seeded from the stored filter.
+    defaults = {
+        'states': list(stored.states),
+        'ratings': list(stored.ratings),
+        'treatments': list(stored.treatments),
+        'treatment_match': stored.treatment_match,
+        'excluded_treatments': list(stored.excluded_treatments),
+        'doctors': stored.doctors or doctor_bounds,
+        'years': stored.years or (years[0], years[-1]),
+    }
+    for field, value in defaults.items():
+        key = WIDGET_PREFIX + field
+        st.session_state[key] = st.session_state[key] if key in st.session_state else value
+
+    st.sidebar.header("Global Filters")
+    states = st.sidebar.multiselect("Emirates (empty = all):", sorted(df[STATE_COL].dropna().astype(str).unique()),
+                                    key=WIDGET_PREFIX + 'states')
+    ratings = st.sidebar.multiselect("Hospital rate (empty = all):", _rating_options(df), key=WIDGET_PREFIX + 'ratings')
+    treatment_options = term_matrix('treatments')['vocabulary'].tolist()
+    treatments = st.sidebar.multiselect("Offers treatments (empty = all):", treatment_options,
+                                        key=WIDGET_PREFIX + 'treatments')
+    treatment_match = st.sidebar.radio("Offering:", ['any', 'all'], horizontal=True,
+                                       format_func=lambda match: f"{match} of them",
+                                       key=WIDGET_PREFIX + 'treatment_match')
+    excluded_treatments = st.sidebar.multiselect("But none of these treatments:", treatment_options,
+                                                 key=WIDGET_PREFIX + 'excluded_treatments')
+    doctors = st.sidebar.slider("Number of Doctors:", doctor_bounds[0], doctor_bounds[1], key=WIDGET_PREFIX + 'doctors')
+    year_range = years[0], years[-1]
+    if len(years) > 1:
+        year_range = st.sidebar.slider("Years:", years[0], years[-1], key=WIDGET_PREFIX + 'years')
+    st.sidebar.markdown("---")
+
+    hospital_filter = HospitalFilter(
+        states=tuple(sorted(states)),
+        ratings=tuple(sorted(ratings)),
+        treatments=tuple(sorted(treatments)),
+        treatment_match=treatment_match,
+        excluded_treatments=tuple(sorted(excluded_treatments)),
+        doctors=None if tuple(doctors) == doctor_bounds else tuple(doctors),
+        years=None if tuple(year_range) == (years[0], years[-1]) else tuple(year_range),
+    )
+    st.session_state[SESSION_KEY] = hospital_filter
+    return hospital_filter
@@ -0,0 +1,157 @@
+"""Linear-trend forecasts of patients, cost, income and surgeries beyond the last year.
+
+``fit_linear_trends`` fits many yearly series at once: ordinary least
+squares of value on year, written as row sums over a (series x years)
+matrix, so fitting every series is a few array operations rather than a
+Python loop per series. Missing years are skipped per series.
+
+The fits of every hospital's series, for every metric, are a derived table
+of the dataset version (``hospital_fits``): refitted when the data reloads,
+and only for the changed rows when a delta file arrives. Per-hospital
+forecasts read their parameters from there.
+
+State trend forecasts fit the summed series of the hospitals kept by the
+filter, over its year range, all States in one batch. The band needs the
+summed series' own residuals, so it cannot be assembled from the hospital
+fits. Results are cached per dataset version, metric, horizon and filter.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from hospital_data import STATE_COL, cached_artifact, dataset_fingerprint, filter_key, load_hospitals
+from hospital_metrics import build_year_matrices, year_matrices
+from instrumentation import track_cache
+
+FORECAST_METRICS = {
+    'patients': 'Patients',
+    'cost': 'Total Cost (Million AED)',
+    'income': 'Total Income (Million AED)',
+    'surgeries': 'Surgeries',
+}
+
+# Two-sided 95% Student t quantiles by residual degrees of freedom (n years - 2);
+# the normal quantile is close enough beyond 10.
+_T_95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262, 10: 2.228}
+_Z_95 = 1.960
+
+
+def fit_linear_trends(years, values):
+    """Fit ``value = intercept + slope * (year - x_mean)`` to every row of ``values``.
+
+    ``values`` is a (series x years) array; NaNs are left out of each row's
+    fit. Returns a dict of per-series arrays: ``intercept``, ``slope``,
+    ``x_mean``, ``sxx`` (sum of squared year deviations), ``resid_std`` and
+    ``n_obs``. Series with fewer than two observed years get a NaN slope,
+    and those with fewer than three a NaN ``resid_std``.
+    """
+    x = np.asarray(years, dtype='float64')
+    y = np.asarray(values, dtype='float64')
+    observed = ~np.isnan(y)
+    n_obs = observed.sum(axis=1)
+    y0 = np.where(observed, y, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = (observed * x).sum(axis=1) / n_obs
+        y_mean = y0.sum(axis=1) / n_obs
+        dx = np.where(observed, x - x_mean[:, None], 0.0)
+        sxx = (dx ** 2).sum(axis=1)
+        slope = np.where(sxx > 0, (dx * (y0 - y_mean[:, None])).sum(axis=1) / sxx, np.nan)
+        residuals = np.where(observed, y0 - y_mean[:, None] - slope[:, None] * dx, 0.0)
+        resid_std = np.where(n_obs > 2, np.sqrt((residuals ** 2).sum(axis=1) / (n_obs - 2)), np.nan)
+    return {'intercept': y_mean, 'slope': slope, 'x_mean': x_mean, 'sxx': sxx,
+            'resid_std': resid_std, 'n_obs': n_obs}
+
+
+def forecast_from_fit(fit, target_years):
+    """Point forecasts and 95% prediction intervals for ``target_years``.
+
+    Returns ``(mean, lower, upper)``, each a (series x target years) array.
+    """
+    x0 = np.asarray(target_years, dtype='float64')[None, :]
+    dx = x0 - fit['x_mean'][:, None]
+    mean = fit['intercept'][:, None] + fit['slope'][:, None] * dx
+    quantile = np.array([_T_95.get(df, _Z_95) for df in np.maximum(fit['n_obs'] - 2, 1)])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spread = fit['resid_std'][:, None] * np.sqrt(1 + 1 / fit['n_obs'][:, None] + dx ** 2 / fit['sxx'][:, None])
+    margin = quantile[:, None] * spread
+    return mean, mean - margin, mean + margin
+
+
+def build_hospital_fits(_df):
+    """Trend fits of every hospital for every metric, over all years in the data."""
+    matrices = year_matrices()
+    return {metric: fit_linear_trends(matrices['years'], matrices[metric])
+            for metric in FORECAST_METRICS if metric in matrices}
+
+
+def update_hospital_fits(fits, change):
+    """``fits`` grown to the rows of ``change.frame``, with updated and new hospitals refitted."""
+    if not change.same_years:
+        return None
+    matrices = build_year_matrices(change.frame.iloc[change.changed])
+    updated = {}
+    for metric, fit in fits.items():
+        fresh = fit_linear_trends(matrices['years'], matrices[metric])
+        updated[metric] = {}
+        for key, values in fit.items():
+            grown = np.empty(len(change.frame), dtype=values.dtype)
+            grown[:len(values)] = values
+            grown[change.changed] = fresh[key]
+            updated[metric][key] = grown
+    return updated
+
+
+def hospital_fits():
+    return cached_artifact('hospital_trend_fits', build_hospital_fits, update=update_hospital_fits)
+
+
+def hospital_forecast(rows, metric, horizon=3):
+    """Forecast of ``metric`` for the hospitals at ``rows``, ``horizon`` years past the data.
+
+    Read from the cached per-hospital fits. Indexed by (row, Year) with
+    forecast, lower and upper (95% prediction interval).
+    """
+    rows = np.asarray(rows, dtype='int64')
+    fit = {key: values[rows] for key, values in hospital_fits()[metric].items()}
+    last_year = year_matrices()['years'][-1]
+    target_years = np.arange(last_year + 1, last_year + 1 + horizon)
+    mean, lower, upper = forecast_from_fit(fit, target_years)
+    index = pd.MultiIndex.from_product([rows, target_years], names=['row', 'Year'])
+    return pd.DataFrame({'forecast': mean.ravel(), 'lower': lower.ravel(), 'upper': upper.ravel()}, index=index)
+
+
+@track_cache
+@lru_cache(maxsize=64)
+def _state_forecast(fingerprint, metric, horizon, hospital_filter):
+    matrices = year_matrices()
+    all_years = matrices['years']
+    years = all_years if hospital_filter is None else hospital_filter.select_years(all_years)
+    columns = [all_years.index(year) for year in years]
+    values = matrices[metric][:, columns]
+
+    states = pd.Categorical(load_hospitals()[STATE_COL])
+    rows = None if hospital_filter is None else hospital_filter.rows()
+    codes = states.codes if rows is None else states.codes[rows]
+    values = values if rows is None else values[rows]
+    keep = codes >= 0
+    # Per-State totals of every year (NaN counts as 0, as in the State sums elsewhere).
+    totals = np.zeros((len(states.categories), len(years)))
+    np.add.at(totals, codes[keep], np.nan_to_num(values[keep]))
+    present = np.bincount(codes[keep], minlength=len(states.categories)) > 0
+
+    last_year = all_years[-1]
+    target_years = np.arange(years[-1] + 1, last_year + 1 + horizon)
+    mean, lower, upper = forecast_from_fit(fit_linear_trends(years, totals[present]), target_years)
+    index = pd.MultiIndex.from_product([states.categories[present].astype(str), target_years], names=[STATE_COL, 'Year'])
+    return pd.DataFrame({'forecast': mean.ravel(), 'lower': lower.ravel(), 'upper': upper.ravel()}, index=index)
+
+
+def state_forecast(metric, horizon=3, hospital_filter=None):
+    """Per-State forecast of the total ``metric``, fitted on the filter's hospitals and year range.
+
+    Indexed by (State, Year) with forecast, lower and upper (95% prediction
+    interval). Years run from the end of the selected range to ``horizon``
+    years past the data.
+    """
+    return _state_forecast(dataset_fingerprint(), metric, horizon, filter_key(hospital_filter, uses_years=True)).copy(deep=False)
@@ -0,0 +1,215 @@
+"""Lookup indexes over the hospitals frame, built once per dataset version.
+
+Many facilities share a name (2,338 distinct names across 7,349 rows in the
+bundled CSV, one row per branch), so a name maps to an array of row
+positions rather than a single row. Datasets loaded through the on-disk
+store reuse the name index built during ingestion.
+
+Name search uses a character-trigram index over the distinct names: each
+word is padded (``"  al "``, like PostgreSQL's pg_trgm) and cut into
+three-letter pieces, and every trigram maps to the ids of the names that
+contain it. A query is scored by the share of its trigrams a name has,
+so typos and partial names still match, and ranked by trigram similarity.
+Only the postings of the query's own trigrams are read.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from hospital_data import (
+    HOSPITALS_DATA_PATH, NAME_COL, STATE_COL, cached_artifact, dataset_fingerprint, load_columns, load_hospitals,
+    uses_stored_aggregates,
+)
+from hospital_store import read_name_index
+from instrumentation import track_cache
+
+POSITIVE_KEYWORDS_COL = 'most repeated keywords for the hospital in positive reviews'
+NEGATIVE_KEYWORDS_COL = 'most repeated keywords for the hospital in negative reviews'
+REVIEW_COLUMNS = {
+    'reviews': 'number of reviews',
+    'positive_reviews': 'positive reviews',
+    'negative_reviews': 'negative reviews',
+}
+
+
+def build_name_index(df):
+    """Map each hospital name to the int32 row positions of all its branches."""
+    groups = df.groupby(NAME_COL, observed=True, sort=False).indices
+    return {name: rows.astype('int32') for name, rows in groups.items()}
+
+
+def update_name_index(index, change):
+    """``index`` plus the hospitals a delta added (updates keep their name, it is part of the key)."""
+    names = change.frame[NAME_COL].iloc[change.added]
+    present = names.notna().to_numpy()
+    if not present.any():
+        return index
+    added = change.added[present]
+    index = dict(index)
+    for name, local in pd.Series(added).groupby(names[present].astype(str).to_numpy(), sort=False).indices.items():
+        index[name] = np.concatenate([index.get(name, np.empty(0, dtype='int32')), added[local]]).astype('int32')
+    return index
+
+
+def name_index():
+    build = (lambda _df: read_name_index(HOSPITALS_DATA_PATH)) if uses_stored_aggregates() else build_name_index
+    return cached_artifact('name_index', build, update=update_name_index)
+
+
+@track_cache
+@lru_cache(maxsize=64)
+def _filtered_names(fingerprint, hospital_filter):
+    names = load_hospitals()[NAME_COL].iloc[hospital_filter.rows()].dropna()
+    return sorted(names.astype(str).unique())
+
+
+def hospital_names(hospital_filter=None):
+    """Hospital names, sorted alphabetically (computed once per dataset version and filter)."""
+    if hospital_filter is not None and hospital_filter.restricts_rows:
+        return _filtered_names(dataset_fingerprint(), hospital_filter)
+    return cached_artifact('hospital_names', lambda _df: sorted(name_index()))
+
+
+def _normalize(text):
+    return re.sub(r'[^0-9a-z]+', ' ', str(text).lower()).strip()
+
+
+def _trigrams(text):
+    grams = set()
+    for word in _normalize(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def build_trigram_index(names, index):
+    """Trigram index over the sorted distinct ``names`` (``index``: the name index).
+
+    Returns a dict of arrays: ``names`` and their ``normalized`` forms,
+    ``trigrams`` (sorted) with ``offsets`` into ``postings`` (name ids per
+    trigram), ``sizes`` (trigram count per name) and ``row_names`` (name id
+    of every row, -1 if none).
+    """
+    names = np.asarray(names, dtype=object)
+    normalized = pd.Series(names, dtype='string').str.lower().str.replace(r'[^0-9a-z]+', ' ', regex=True).str.strip()
+    # Padded words, then every 3-character slice of them, one vectorized pass per position.
+    words = normalized.str.split().explode().dropna()
+    padded = '  ' + words + ' '
+    lengths = padded.str.len().to_numpy()
+    pieces = [padded[lengths >= i + 3].str.slice(i, i + 3) for i in range(int(lengths.max(initial=0)) - 2)]
+    pairs = pd.concat(pieces) if pieces else pd.Series([], dtype='string')
+    gram_ids, trigrams = pd.factorize(pairs, sort=True)
+    # Unique (trigram, name) pairs, sorted by trigram then name.
+    keys = np.sort(gram_ids.astype('int64') * len(names) + pairs.index.to_numpy(dtype='int64'))
+    keys = keys[np.r_[True, keys[1:] != keys[:-1]]] if len(keys) else keys
+    gram_ids, name_ids = keys // max(len(names), 1), keys % max(len(names), 1)
+    lengths = np.array([len(index[name]) for name in names], dtype='int64')
+    rows = np.concatenate([index[name] for name in names]) if len(names) else np.empty(0, dtype='int32')
+    row_names = np.full(int(rows.max(initial=-1)) + 1, -1, dtype='int32')
+    row_names[rows] = np.repeat(np.arange(len(names), dtype='int32'), lengths)
+    return {
+        'names': names,
+        'normalized': normalized.fillna('').to_numpy(dtype=object),
+        'trigrams': np.asarray(trigrams, dtype=object),
+        'offsets': np.searchsorted(gram_ids, np.arange(len(trigrams) + 1)).astype('int64'),
+        'postings': name_ids.astype('int32'),
+        'sizes': np.bincount(name_ids, minlength=len(names)).astype('int32'),
+        'row_names': row_names,
+    }
+
+
+def trigram_index():
+    return cached_artifact('name_trigrams', lambda _df: build_trigram_index(hospital_names(), name_index()))
+
+
+# Share of the query's trigrams a name must contain to be listed.
+MIN_MATCH = 0.3
+# Best candidates ranked in full (substring check included) when a query matches many names.
+SHORTLIST = 500
+
+
+def search_names(query, hospital_filter=None, states=(), limit=10):
+    """Up to ``limit`` hospital names best matching ``query``, best first.
+
+    Names must have a branch kept by ``hospital_filter`` and, if ``states``
+    is given, located in one of them. Names containing the query as typed
+    come first, then the rest by trigram similarity (shared trigrams over
+    all trigrams of both; ties alphabetical). An empty query lists names
+    alphabetically. A name equal to the query up to case and punctuation
+    always comes first.
+    """
+    index = trigram_index()
+    names, sizes = index['names'], index['sizes']
+    allowed = None
+    if (hospital_filter is not None and hospital_filter.restricts_rows) or states:
+        rows = hospital_filter.rows() if hospital_filter is not None and hospital_filter.restricts_rows else None
+        if states:
+            in_states = load_hospitals()[STATE_COL].isin(states).to_numpy()
+            rows = np.flatnonzero(in_states) if rows is None else rows[in_states[rows]]
+        ids = index['row_names'][rows]
+        allowed = np.zeros(len(names), dtype=bool)
+        allowed[ids[ids >= 0]] = True
+
+    grams = sorted(_trigrams(query))
+    if not grams:
+        return names[:limit].tolist() if allowed is None else names[np.flatnonzero(allowed)[:limit]].tolist()
+    trigrams = index['trigrams']
+    ids = np.searchsorted(trigrams, np.asarray(grams, dtype=object)).clip(max=max(len(trigrams) - 1, 0))
+    ids = ids[trigrams[ids] == np.asarray(grams, dtype=object)] if len(trigrams) else ids[:0]
+    postings = [index['postings'][index['offsets'][i]:index['offsets'][i + 1]] for i in ids]
+    shared = np.bincount(np.concatenate(postings), minlength=len(names)) if postings else np.zeros(len(names), 'int64')
+    match = shared / len(grams)
+    if allowed is not None:
+        match[~allowed] = 0
+    candidates = np.flatnonzero(match >= MIN_MATCH)
+    similarity = shared[candidates] / (len(grams) + sizes[candidates] - shared[candidates])
+    if len(candidates) > SHORTLIST:
+        # Names containing the query match nearly all of its trigrams, so they survive this cut.
+        keep = np.argpartition(-(match[candidates] + similarity), SHORTLIST)[:SHORTLIST]
+        candidates, similarity = candidates[keep], similarity[keep]
+    typed = _normalize(query)
+    normalized = index['normalized'][candidates]
+    contains = np.array([typed in name for name in normalized], dtype=bool)
+    # Trigrams are sets, so 'al shifa khaleej al sihi' scores like 'shifa khaleej al sihi'; equality breaks the tie.
+    exact = normalized == typed
+    order = np.lexsort((candidates, -match[candidates], -similarity, ~contains, ~exact))[:limit]
+    return names[candidates[order]].tolist()
+
+
+def hospital_rows(name, hospital_filter=None):
+    """Row positions of every branch called ``name`` (empty if unknown), optionally only those the filter keeps."""
+    rows = name_index().get(name, np.empty(0, dtype='int32'))
+    if hospital_filter is not None and hospital_filter.restricts_rows:
+        rows = rows[np.isin(rows, hospital_filter.rows())]
+    return rows
+
+
+def _merge_keywords(values):
+    # Keep the first-seen order of keywords while dropping repeats across branches.
+    merged = {}
+    for value in values:
+        if isinstance(value, str):
+            for keyword in value.split(';'):
+                keyword = keyword.strip()
+                if keyword:
+                    merged[keyword] = None
+    return list(merged)
+
+
+def hospital_review_summary(name, hospital_filter=None):
+    """Review totals and keywords for ``name``, aggregated across its branches.
+
+    Only branches kept by ``hospital_filter`` count. Returns None if no branch matches.
+    """
+    rows = hospital_rows(name, hospital_filter)
+    if len(rows) == 0:
+        return None
+    branches = load_columns([STATE_COL, *REVIEW_COLUMNS.values(), POSITIVE_KEYWORDS_COL, NEGATIVE_KEYWORDS_COL], rows)
+    summary = {'branches': len(rows), 'states': sorted(branches[STATE_COL].astype(str).unique())}
+    for key, col in REVIEW_COLUMNS.items():
+        summary[key] = int(branches[col].sum()) if col in branches.columns else 0
+    summary['positive_keywords'] = _merge_keywords(branches.get(POSITIVE_KEYWORDS_COL, []))
+    summary['negative_keywords'] = _merge_keywords(branches.get(NEGATIVE_KEYWORDS_COL, []))
+    return summary
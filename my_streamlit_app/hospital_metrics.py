@@ -0,0 +1,305 @@
+"""Long-format (tidy) view of the year-suffixed metric columns.
+
+The CSV stores patients, cost, income and surgeries as one column per year
+(24 columns for 2020-2025). This module melts them once per dataset version
+into a compact table keyed by (hospital row, hospital, state, year, metric)
+and offers a single vectorized groupby over it, so pages never build column
+names with f-strings or sum columns one at a time.
+
+On top of it sits a materialized State x Year x Metric cube (count, sum,
+mean) plus per-State totals of the year-less columns (doctors, reviews).
+Summary charts read a handful of rows from these instead of scanning the
+hospitals frame, so their cost does not grow with the number of hospitals.
+For datasets loaded through the on-disk store both come from the
+aggregates accumulated during ingestion, so the long table is only built
+when a filter needs it. With the SQL backend switched on (see query_engine),
+cubes and summaries are computed by DuckDB instead, filtered ones included,
+and the long table is not needed at all. When delta files arrive (see hospital_deltas), the
+cube, the summary and the matrices are patched from the changed rows.
+Per-hospital rankings and the State forecasts use the same columns as one
+(hospitals x years) matrix per metric.
+
+Functions taking ``hospital_filter`` (see hospital_filters.HospitalFilter)
+serve the unfiltered case from the shared tables and compute filtered
+variants once per (dataset version, filter) in a bounded LRU cache.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from hospital_data import (
+    HOSPITALS_DATA_PATH, NAME_COL, STATE_COL, cached_artifact, dataset_fingerprint, load_hospitals, uses_stored_aggregates,
+    year_metric_columns,
+)
+from hospital_schema import SUMMARY_COLUMNS
+from hospital_store import read_cube, read_state_summary
+from instrumentation import track_cache
+from query_engine import enabled as sql_enabled, state_summary_totals, state_totals
+
+CUBE_STATS = ['count', 'sum', 'mean']
+
+# Display labels for the metric keys used in the long table.
+METRIC_LABELS = {
+    'patients': 'Number of Patients',
+    'cost': 'Total Cost (Million AED)',
+    'income': 'Total Income (Million AED)',
+    'surgeries': 'Total Surgeries',
+}
+
+
+def build_long_metrics(df):
+    """Melt every year-suffixed metric column of ``df`` into one long table.
+
+    Columns: ``row`` (position in the hospitals frame), hospital name, State,
+    ``Year``, ``Metric`` (categorical) and ``Value`` (float64).
+    """
+    specs = year_metric_columns(df.columns)
+    values = df[[col for col, _, _ in specs]].to_numpy(dtype='float64')
+    # AED amounts are stored as float32; rounding drops the widening noise
+    # (14.23 -> 14.229999542...) so sums match the CSV's 2-decimal figures.
+    values = np.round(values, 4)
+    n_rows, n_cols = values.shape
+
+    metric_names = list(dict.fromkeys(metric for _, metric, _ in specs))
+    metric_codes = np.array([metric_names.index(metric) for _, metric, _ in specs], dtype='int8')
+    years = np.array([year for _, _, year in specs], dtype='int16')
+
+    row = np.repeat(np.arange(n_rows, dtype='int32'), n_cols)
+    col = np.tile(np.arange(n_cols), n_rows)
+    return pd.DataFrame({
+        'row': row,
+        NAME_COL: pd.Categorical(df[NAME_COL]).take(row),
+        STATE_COL: pd.Categorical(df[STATE_COL]).take(row),
+        'Year': years[col],
+        'Metric': pd.Categorical.from_codes(metric_codes[col], metric_names),
+        'Value': values.ravel(),
+    })
+
+
+def long_metrics():
+    return cached_artifact('long_metrics', build_long_metrics)
+
+
+def available_years():
+    """Sorted list of the years present in the dataset's metric columns."""
+    return cached_artifact('available_years', lambda df: sorted({year for _, _, year in year_metric_columns(df.columns)}))
+
+
+def build_year_matrices(df):
+    """One float64 (hospitals x years) matrix per year-suffixed metric.
+
+    Returns ``{'years': [...], 'patients': array, 'cost': array, ...}``; a
+    metric missing for some year has NaN in that column.
+    """
+    years = sorted({year for _, _, year in year_metric_columns(df.columns)})
+    position = {year: i for i, year in enumerate(years)}
+    matrices = {'years': years}
+    for col, metric, year in year_metric_columns(df.columns):
+        if metric not in matrices:
+            matrices[metric] = np.full((len(df), len(years)), np.nan)
+        # Rounded like the long metrics table, so float32 amounts keep their 2-decimal values.
+        matrices[metric][:, position[year]] = np.round(df[col].to_numpy(dtype='float64'), 4)
+    return matrices
+
+
+def update_year_matrices(matrices, change):
+    """``matrices`` grown to the rows of ``change.frame``, with updated and new hospitals' rows rebuilt."""
+    if not change.same_years:
+        return None
+    fresh = build_year_matrices(change.frame.iloc[change.changed])
+    updated = {'years': matrices['years']}
+    for metric, values in matrices.items():
+        if metric == 'years':
+            continue
+        grown = np.empty((len(change.frame), values.shape[1]))
+        grown[:len(values)] = values
+        grown[change.changed] = fresh[metric]
+        updated[metric] = grown
+    return updated
+
+
+def year_matrices():
+    return cached_artifact('year_matrices', build_year_matrices, update=update_year_matrices)
+
+
+def build_state_cube(long_df):
+    """State x Year x Metric aggregates of the long table.
+
+    Indexed by (Year, Metric, State), sorted, so ``cube.loc[(year, metric)]``
+    is a contiguous slice of one row per State. Columns: count, sum, mean.
+    """
+    cube = long_df.groupby(['Year', 'Metric', STATE_COL], observed=True)['Value'].agg(CUBE_STATS)
+    return cube.sort_index()
+
+
+def _add_doctors_mean(summary):
+    if 'doctors' in summary.columns:
+        summary['doctors_mean'] = summary['doctors'] / summary['hospitals']
+    return summary
+
+
+def build_state_summary(df):
+    """Per-State hospital count plus sums of doctors and review counts."""
+    present = {key: col for key, col in SUMMARY_COLUMNS.items() if col in df.columns}
+    grouped = df.groupby(STATE_COL, observed=True)
+    summary = grouped[list(present.values())].sum().rename(columns={col: key for key, col in present.items()})
+    summary.insert(0, 'hospitals', grouped.size())
+    return _add_doctors_mean(summary)
+
+
+def _cube_from_totals(totals, df):
+    # Long (Year, Metric, State, count, sum) frame -> the cube layout, categories in ``df``'s order.
+    cube = totals.copy()
+    cube['Year'] = cube['Year'].astype('int16')
+    cube['Metric'] = pd.Categorical(cube['Metric'], list(dict.fromkeys(metric for _, metric, _ in year_metric_columns(df.columns))))
+    cube[STATE_COL] = pd.Categorical(cube[STATE_COL], df[STATE_COL].cat.categories)
+    cube = cube[cube['count'] > 0].astype({'count': 'int64'}).set_index(['Year', 'Metric', STATE_COL])
+    cube['mean'] = cube['sum'] / cube['count']
+    return cube[CUBE_STATS].sort_index()
+
+
+def _cube_totals(cube):
+    totals = cube[['count', 'sum']].reset_index()
+    totals['Metric'] = totals['Metric'].astype(str)
+    totals[STATE_COL] = totals[STATE_COL].astype(str)
+    return totals.set_index(['Year', 'Metric', STATE_COL])
+
+
+def update_state_cube(cube, change):
+    """``cube`` with the old values of updated hospitals taken out and their new values and new hospitals added."""
+    if not change.same_years:
+        # A new year column gets a row for every State on a rebuild, also States the delta left untouched.
+        return None
+    removed = build_state_cube(build_long_metrics(change.old_frame.iloc[change.replaced]))
+    added = build_state_cube(build_long_metrics(change.frame.iloc[change.changed]))
+    totals = _cube_totals(cube).add(_cube_totals(added), fill_value=0).sub(_cube_totals(removed), fill_value=0)
+    return _cube_from_totals(totals.reset_index(), change.frame)
+
+
+def _summary_totals(summary):
+    totals = summary.drop(columns='doctors_mean', errors='ignore')
+    return totals.set_axis(totals.index.astype(str))
+
+
+def update_state_summary(summary, change):
+    """``state_summary`` patched the same way as ``update_state_cube``."""
+    if not change.same_years:
+        return None
+    removed = build_state_summary(change.old_frame.iloc[change.replaced])
+    added = build_state_summary(change.frame.iloc[change.changed])
+    totals = _summary_totals(summary).add(_summary_totals(added), fill_value=0).sub(_summary_totals(removed), fill_value=0)
+    totals = totals[totals['hospitals'] > 0].astype(_summary_totals(summary).dtypes.to_dict())
+    totals.index = pd.CategoricalIndex(totals.index, categories=change.frame[STATE_COL].cat.categories, name=STATE_COL)
+    return _add_doctors_mean(totals.sort_index())
+
+
+def stored_state_cube(df):
+    """``build_state_cube``'s result from the ingestion-time aggregates of the store."""
+    return _cube_from_totals(read_cube(HOSPITALS_DATA_PATH), df)
+
+
+def stored_state_summary(df):
+    """``build_state_summary``'s result from the ingestion-time aggregates of the store."""
+    summary = read_state_summary(HOSPITALS_DATA_PATH)
+    summary[STATE_COL] = pd.Categorical(summary[STATE_COL], df[STATE_COL].cat.categories)
+    return _add_doctors_mean(summary.set_index(STATE_COL).sort_index())
+
+
+def _filtered_long(rows):
+    long_df = long_metrics()
+    selected = np.zeros(len(load_hospitals()), dtype=bool)
+    selected[rows] = True
+    return long_df[selected[long_df['row'].to_numpy()]]
+
+
+def sql_state_cube(df, hospital_filter=None):
+    """``build_state_cube``'s result computed by the SQL backend (see query_engine)."""
+    return _cube_from_totals(state_totals(hospital_filter), df)
+
+
+def sql_state_summary(df, hospital_filter=None):
+    """``build_state_summary``'s result computed by the SQL backend."""
+    summary = state_summary_totals(hospital_filter)
+    summary.index = pd.CategoricalIndex(summary.index, categories=df[STATE_COL].cat.categories, name=STATE_COL)
+    return _add_doctors_mean(summary.sort_index())
+
+
+@track_cache
+@lru_cache(maxsize=64)
+def _filtered_cube(fingerprint, hospital_filter):
+    if sql_enabled():
+        return sql_state_cube(load_hospitals(), hospital_filter)
+    return build_state_cube(_filtered_long(hospital_filter.rows()))
+
+
+@track_cache
+@lru_cache(maxsize=64)
+def _filtered_summary(fingerprint, hospital_filter):
+    if sql_enabled():
+        return sql_state_summary(load_hospitals(), hospital_filter)
+    return build_state_summary(load_hospitals().iloc[hospital_filter.rows()])
+
+
+def state_cube(hospital_filter=None):
+    if hospital_filter is not None and hospital_filter.restricts_rows:
+        return _filtered_cube(dataset_fingerprint(), hospital_filter).copy(deep=False)
+    if uses_stored_aggregates():
+        return cached_artifact('state_cube', stored_state_cube, update=update_state_cube)
+    if sql_enabled():
+        return cached_artifact('state_cube', sql_state_cube, update=update_state_cube)
+    return cached_artifact('state_cube', lambda _df: build_state_cube(long_metrics()), update=update_state_cube)
+
+
+def state_summary(hospital_filter=None):
+    if hospital_filter is not None and hospital_filter.restricts_rows:
+        return _filtered_summary(dataset_fingerprint(), hospital_filter).copy(deep=False)
+    if uses_stored_aggregates():
+        build = stored_state_summary
+    else:
+        build = sql_state_summary if sql_enabled() else build_state_summary
+    return cached_artifact('state_summary', build, update=update_state_summary)
+
+
+def state_breakdown(year, metric, stat='sum', hospital_filter=None):
+    """One value per State for ``metric`` in ``year`` (e.g. total cost in 2023), read from the cube."""
+    return state_cube(hospital_filter).loc[(year, metric), stat]
+
+
+def build_patient_growth(df):
+    """Patient growth of every hospital from the first to the last year in the data.
+
+    ``Patient_Growth_abs`` is the difference in patients, ``Patient_Growth_rel``
+    the same change as a fraction of the first year's patients.
+    """
+    patient_cols = sorted((year, col) for col, metric, year in year_metric_columns(df.columns) if metric == 'patients')
+    first = df[patient_cols[0][1]].to_numpy(dtype='float64')
+    last = df[patient_cols[-1][1]].to_numpy(dtype='float64')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = np.where(first > 0, (last - first) / first, np.nan)
+    return pd.DataFrame({'Patient_Growth_abs': last - first, 'Patient_Growth_rel': relative}, index=df.index)
+
+
+def patient_growth():
+    return cached_artifact('patient_growth', build_patient_growth)
+
+
+def metric_totals(by=STATE_COL, agg='sum', hospital_filter=None):
+    """Aggregate every metric for every year in one pass.
+
+    Returns a frame indexed by (``by``, Year) with one column per metric key
+    ('patients', 'cost', 'income', 'surgeries'). ``agg`` is any pandas
+    groupby reduction name ('sum', 'mean', 'count', ...). Per-State
+    count/sum/mean come straight from the cube.
+    """
+    if by == STATE_COL and agg in CUBE_STATS:
+        totals = state_cube(hospital_filter)[agg].unstack('Metric')
+        return totals.reorder_levels([STATE_COL, 'Year']).sort_index()
+    if hospital_filter is not None and hospital_filter.restricts_rows:
+        grouped = _filtered_long(hospital_filter.rows()).groupby([by, 'Year', 'Metric'], observed=True)['Value']
+        return getattr(grouped, agg)().unstack('Metric')
+
+    def build(_df):
+        grouped = long_metrics().groupby([by, 'Year', 'Metric'], observed=True)['Value']
+        return getattr(grouped, agg)().unstack('Metric')
+    return cached_artifact(f'metric_totals:{by}:{agg}', build)
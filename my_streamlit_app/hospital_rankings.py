@@ -0,0 +1,162 @@
+"""Hospital leaderboards: derived per-hospital metrics and top-k queries.
+
+Derived ranking metrics (income minus cost, patient growth, surgeries per
+doctor, share of positive reviews) are plain array arithmetic over the
+cached (hospitals x years) matrices of hospital_metrics, for the selected
+year range. The table is kept per year range with the dataset and patched
+row by row when a delta file updates or adds hospitals.
+
+Top-k answers partition around the k-th value (``np.partition``) and only
+order the k winners instead of sorting every hospital. They are cached per
+(dataset version, metric, k, filter).
+
+Rankings are per row, i.e. per branch: a chain with branches in several
+Emirates appears once per branch.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from hospital_data import NAME_COL, STATE_COL, cached_artifact, dataset_fingerprint, filter_key, load_hospitals
+from hospital_metrics import available_years, build_year_matrices, year_matrices
+from instrumentation import track_cache
+
+DOCTORS_COL = 'Number of Doctors'
+REVIEWS_COL = 'number of reviews'
+POSITIVE_COL = 'positive reviews'
+
+# Ranking metric key -> display label. Larger is better for all of them.
+RANKING_METRICS = {
+    'margin': 'Income - Cost (Million AED)',
+    'margin_pct': 'Margin (% of Income)',
+    'patient_growth': 'Patient Growth (%)',
+    'surgeries_per_doctor': 'Surgeries per Doctor',
+    'positive_ratio': 'Positive Reviews (%)',
+}
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+
+def build_ranking_table(df, matrices, years):
+    """Every ranking metric for every hospital over ``years`` (first to last year of the range).
+
+    Margins and surgeries per doctor use the last year of the range; growth
+    compares its last year with its first.
+    """
+    first, last = matrices['years'].index(years[0]), matrices['years'].index(years[-1])
+    income, cost = matrices['income'][:, last], matrices['cost'][:, last]
+    patients = matrices['patients']
+    doctors = df[DOCTORS_COL].to_numpy(dtype='float64')
+    return pd.DataFrame({
+        'margin': income - cost,
+        'margin_pct': _ratio(income - cost, income) * 100,
+        'patient_growth': _ratio(patients[:, last] - patients[:, first], patients[:, first]) * 100,
+        'surgeries_per_doctor': _ratio(matrices['surgeries'][:, last], doctors),
+        'positive_ratio': _ratio(df[POSITIVE_COL].to_numpy(dtype='float64'),
+                                 df[REVIEWS_COL].to_numpy(dtype='float64')) * 100,
+    })
+
+
+def update_ranking_table(years):
+    """``update`` function for the ranking table of ``years``: recompute only updated and new hospitals."""
+    def update(table, change):
+        if not change.same_years:
+            return None
+        changed = change.frame.iloc[change.changed]
+        updated = table.reindex(range(len(change.frame)))
+        updated.iloc[change.changed] = build_ranking_table(changed, build_year_matrices(changed), years).to_numpy()
+        return updated
+    return update
+
+
+def ranking_table(hospital_filter=None):
+    """Ranking metrics of every hospital (indexed by row position) for the filter's year range."""
+    years = tuple(available_years() if hospital_filter is None else hospital_filter.select_years(available_years()))
+    return cached_artifact(f"ranking_table:{','.join(map(str, years))}",
+                           lambda df: build_ranking_table(df, year_matrices(), years),
+                           update=update_ranking_table(years))
+
+
+def _candidates(metric, hospital_filter):
+    # Row positions kept by the filter that have a value for ``metric``, and those values.
+    values = ranking_table(hospital_filter)[metric].to_numpy()
+    rows = None if hospital_filter is None else hospital_filter.rows()
+    rows = np.arange(len(values)) if rows is None else rows
+    values = values[rows]
+    valid = ~np.isnan(values)
+    return rows[valid], values[valid]
+
+
+def top_k_rows(values, k, ascending=False):
+    """Positions of the ``k`` largest (smallest if ``ascending``) ``values``, best first.
+
+    Only the k winners are sorted. Ties keep their original order, also at
+    the cut: of the values tied with the k-th, the first ones win (like
+    ``Series.nlargest(keep='first')``).
+    """
+    k = min(k, len(values))
+    if k <= 0:
+        return np.empty(0, dtype='int64')
+    key = values if ascending else -values
+    if k < len(values):
+        # argpartition would take an arbitrary subset of the values tied at the cut.
+        kth = np.partition(key, k - 1)[k - 1]
+        picked = np.flatnonzero(key < kth)
+        picked = np.concatenate([picked, np.flatnonzero(key == kth)[:k - len(picked)]])
+    else:
+        picked = np.arange(len(values))
+    return picked[np.lexsort((picked, key[picked]))]
+
+
+@track_cache
+@lru_cache(maxsize=256)
+def _leaderboard(fingerprint, metric, k, ascending, hospital_filter):
+    rows, values = _candidates(metric, hospital_filter)
+    picked = rows[top_k_rows(values, k, ascending)]
+    return compare_rows(picked, hospital_filter)
+
+
+def leaderboard(metric, k=10, ascending=False, hospital_filter=None):
+    """Top ``k`` hospitals by ``metric`` (bottom k if ``ascending``) among those the filter keeps.
+
+    Returns a frame with Rank, hospital name, State and every ranking metric,
+    indexed by row position, cached per dataset version, metric, k and filter.
+    """
+    return _leaderboard(dataset_fingerprint(), metric, k, ascending, filter_key(hospital_filter, uses_years=True)).copy(deep=False)
+
+
+@track_cache
+@lru_cache(maxsize=64)
+def _sorted_population(fingerprint, metric, hospital_filter):
+    values = np.sort(_candidates(metric, hospital_filter)[1])
+    values.setflags(write=False)
+    return values
+
+
+def compare_rows(rows, hospital_filter=None):
+    """Side-by-side ranking metrics for the hospitals at ``rows``.
+
+    Each metric gets a ``<metric>_percentile`` column: the share of hospitals
+    kept by the filter with a lower value (0-100).
+    """
+    rows = np.asarray(rows, dtype='int64')
+    df = load_hospitals()
+    table = ranking_table(hospital_filter).iloc[rows]
+    result = pd.DataFrame({
+        'Rank': np.arange(1, len(rows) + 1),
+        NAME_COL: df[NAME_COL].iloc[rows].astype(str).to_numpy(),
+        STATE_COL: df[STATE_COL].iloc[rows].astype(str).to_numpy(),
+    }, index=pd.Index(rows, name='row'))
+    fingerprint = dataset_fingerprint()
+    for metric in RANKING_METRICS:
+        values = table[metric].to_numpy()
+        population = _sorted_population(fingerprint, metric, filter_key(hospital_filter, uses_years=True))
+        result[metric] = values
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percentile = np.searchsorted(population, values, side='left') / len(population) * 100
+        result[f'{metric}_percentile'] = np.where(np.isnan(values), np.nan, percentile)
+    return result
@@ -0,0 +1,244 @@
+"""Chunked ingestion of large hospital CSVs into an on-disk columnar store.
+
+For extracts too large to parse in one ``pd.read_csv`` call, ``ingest_csv``
+streams the CSV in batches of ``CHUNK_ROWS`` rows. Each batch is written as
+one record batch of an Arrow IPC file (the Feather v2 format) and folded
+into running aggregates before the next batch is read, so peak memory is
+one batch plus the aggregates, whatever the size of the input. The store is
+a directory next to the CSV:
+
+- ``rows.arrow``: every row and column; numbers as float64 (NaN = missing),
+  text as strings
+- ``cube.arrow``: State x Year x Metric count and sum of the year metric
+  columns
+- ``summary.arrow``: hospital count and review/doctor totals per State
+- ``names.arrow`` and ``name_rows.npy``: row positions of every hospital
+  name, grouped by name
+- ``manifest.json``: the CSV fingerprint and row count the store was built
+  from, written last so a half-built store is never used
+
+Readers memory-map ``rows.arrow`` and take only the columns (and rows) they
+ask for. hospital_data uses the store for large files: the long text columns
+in ``LAZY_COLUMNS`` stay on disk and are read on demand.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from hospital_schema import COLUMN_DTYPES, NAME_COL, STATE_COL, SUMMARY_COLUMNS, year_metric_columns
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # the store needs pyarrow; without it large files are parsed in one go
+    pa = ipc = None
+
+STORE_SUFFIX = ".store"
+CHUNK_ROWS = 100_000
+STORE_VERSION = 1
+
+# Free-text columns kept out of the in-memory frame when the store is used.
+LAZY_COLUMNS = [
+    'Types of treatment it contains',
+    'most repeated keywords for the hospital in positive reviews',
+    'most repeated keywords for the hospital in negative reviews',
+]
+
+
+def store_path(path):
+    return os.path.splitext(path)[0] + STORE_SUFFIX
+
+
+def _is_text(col):
+    declared = COLUMN_DTYPES.get(col)
+    return declared is not None and (isinstance(declared, pd.CategoricalDtype) or declared in ('category', 'string'))
+
+
+def _store_schema(columns, first_chunk):
+    # Declared text columns are strings and everything numeric is float64, so every
+    # batch has the same schema no matter which values it happens to contain.
+    fields = []
+    for col in columns:
+        if _is_text(col):
+            fields.append(pa.field(col, pa.string()))
+        elif col in COLUMN_DTYPES or pd.api.types.is_numeric_dtype(first_chunk[col]):
+            fields.append(pa.field(col, pa.float64()))
+        else:
+            fields.append(pa.field(col, pa.string()))
+    return pa.schema(fields)
+
+
+def _coerce_chunk(chunk, schema):
+    for field in schema:
+        if pa.types.is_floating(field.type):
+            chunk[field.name] = pd.to_numeric(chunk[field.name], errors='coerce').astype('float64')
+        else:
+            chunk[field.name] = chunk[field.name].astype('string')
+    return chunk
+
+
+class _Aggregates:
+    """Running State-level aggregates, updated one chunk at a time."""
+
+    def __init__(self, columns):
+        self.specs = year_metric_columns(columns)
+        self.summary_columns = {key: col for key, col in SUMMARY_COLUMNS.items() if col in columns}
+        self.sums = None
+        self.counts = None
+        self.summary = None
+        self.name_ids = {}
+        self.row_name_ids = []
+
+    def add(self, chunk):
+        grouped = chunk.groupby(STATE_COL, observed=True)
+        metric_cols = [col for col, _, _ in self.specs]
+        sums, counts = grouped[metric_cols].sum(), grouped[metric_cols].count()
+        summary = grouped[list(self.summary_columns.values())].sum()
+        summary.insert(0, 'hospitals', grouped.size())
+        if self.sums is None:
+            self.sums, self.counts, self.summary = sums, counts, summary
+        else:
+            self.sums = self.sums.add(sums, fill_value=0)
+            self.counts = self.counts.add(counts, fill_value=0)
+            self.summary = self.summary.add(summary, fill_value=0)
+        # Name ids in first-seen order; row positions are grouped by id at the end.
+        names = chunk[NAME_COL].astype('string').fillna('')
+        codes, uniques = pd.factorize(names)
+        mapping = np.array([self.name_ids.setdefault(name, len(self.name_ids)) for name in uniques], dtype='int32')
+        self.row_name_ids.append(mapping[codes])
+
+    def cube(self):
+        """Long frame with Year, Metric, State, count and sum."""
+        parts = []
+        for col, metric, year in self.specs:
+            parts.append(pd.DataFrame({'Year': year, 'Metric': metric, STATE_COL: self.sums.index.astype(str),
+                                       'count': self.counts[col].to_numpy(dtype='int64'),
+                                       'sum': self.sums[col].to_numpy(dtype='float64')}))
+        return pd.concat(parts, ignore_index=True)
+
+    def state_summary(self):
+        summary = self.summary.rename(columns={col: key for key, col in self.summary_columns.items()})
+        return summary.astype('int64').rename_axis(STATE_COL).reset_index()
+
+    def name_index(self):
+        """(names, offsets, rows): rows[offsets[i]:offsets[i + 1]] are the positions of names[i]."""
+        ids = np.concatenate(self.row_name_ids) if self.row_name_ids else np.empty(0, dtype='int32')
+        rows = np.argsort(ids, kind='stable').astype('int32')
+        offsets = np.searchsorted(ids[rows], np.arange(len(self.name_ids) + 1)).astype('int64')
+        return list(self.name_ids), offsets, rows
+
+
+def _write_frame(df, target):
+    with ipc.new_file(target, pa.Schema.from_pandas(df, preserve_index=False)) as writer:
+        writer.write_table(pa.Table.from_pandas(df, preserve_index=False))
+
+
+def ingest_csv(path, fingerprint, chunk_rows=CHUNK_ROWS):
+    """Stream ``path`` into its store directory in ``chunk_rows`` batches; returns the row count.
+
+    The store is built in a temporary directory and swapped in at the end.
+    """
+    target = store_path(path)
+    building = f"{target}.{os.getpid()}.tmp"
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+    n_rows = 0
+    writer = None
+    try:
+        for chunk in pd.read_csv(path, chunksize=chunk_rows):
+            if writer is None:
+                schema = _store_schema(list(chunk.columns), chunk)
+                aggregates = _Aggregates(list(chunk.columns))
+                writer = ipc.new_file(os.path.join(building, 'rows.arrow'), schema)
+            chunk = _coerce_chunk(chunk, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            aggregates.add(chunk)
+            n_rows += len(chunk)
+        if writer is None:
+            raise ValueError(f"{os.path.basename(path)} has no rows")
+        writer.close()
+        writer = None
+
+        _write_frame(aggregates.cube(), os.path.join(building, 'cube.arrow'))
+        _write_frame(aggregates.state_summary(), os.path.join(building, 'summary.arrow'))
+        names, offsets, rows = aggregates.name_index()
+        _write_frame(pd.DataFrame({'name': names, 'start': offsets[:-1], 'stop': offsets[1:]}),
+                     os.path.join(building, 'names.arrow'))
+        np.save(os.path.join(building, 'name_rows.npy'), rows)
+        with open(os.path.join(building, 'manifest.json'), 'w') as f:
+            json.dump({'version': STORE_VERSION, 'fingerprint': list(fingerprint), 'rows': n_rows,
+                       'chunk_rows': chunk_rows, 'columns': schema.names}, f)
+
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(building, target)
+    finally:
+        if writer is not None:
+            writer.close()
+        shutil.rmtree(building, ignore_errors=True)
+    return n_rows
+
+
+def store_manifest(path):
+    """The manifest of ``path``'s store, or None if there is no complete store."""
+    try:
+        with open(os.path.join(store_path(path), 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def store_is_current(path, fingerprint):
+    manifest = store_manifest(path)
+    return manifest is not None and manifest.get('version') == STORE_VERSION \
+        and tuple(manifest.get('fingerprint', ())) == tuple(fingerprint)
+
+
+def _open(path, name):
+    return ipc.open_file(pa.memory_map(os.path.join(store_path(path), name))).read_all()
+
+
+def read_columns(path, columns=None, rows=None):
+    """Columns of the stored rows as a pandas frame (all columns / rows if None).
+
+    The file is memory-mapped, so only the requested columns and rows are read from disk.
+    """
+    table = _open(path, 'rows.arrow')
+    if columns is not None:
+        table = table.select([col for col in columns if col in table.column_names])
+    if rows is not None:
+        table = table.take(pa.array(np.asarray(rows, dtype='int64')))
+    df = table.to_pandas(split_blocks=True)
+    if rows is not None:
+        df.index = pd.Index(np.asarray(rows), name=None)
+    return df
+
+
+def iter_column(path, column):
+    """Yield ``(first row position, Series)`` for ``column``, one stored batch at a time."""
+    reader = ipc.open_file(pa.memory_map(os.path.join(store_path(path), 'rows.arrow')))
+    index = reader.schema.get_field_index(column)
+    offset = 0
+    for i in range(reader.num_record_batches):
+        values = reader.get_batch(i).column(index).to_pandas()
+        yield offset, values
+        offset += len(values)
+
+
+def read_cube(path):
+    """Stored State x Year x Metric aggregates, long format (Year, Metric, State, count, sum)."""
+    return _open(path, 'cube.arrow').to_pandas()
+
+
+def read_state_summary(path):
+    return _open(path, 'summary.arrow').to_pandas()
+
+
+def read_name_index(path):
+    """Dict of hospital name -> int32 row positions, from the stored name index."""
+    names = _open(path, 'names.arrow').to_pandas()
+    rows = np.load(os.path.join(store_path(path), 'name_rows.npy'), mmap_mode='r')
+    return {name: np.asarray(rows[start:stop])
+            for name, start, stop in zip(names['name'], names['start'], names['stop']) if name}
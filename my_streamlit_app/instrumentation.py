@@ -0,0 +1,246 @@
+"""Per-run timing spans, cache counters and memory estimates.
+
+Each page run is a record: the page, the session, and the spans timed inside
+it (stage, name, offset, duration, nesting depth). The shared loader starts
+the record, so every page gets one without extra code. The stages are:
+
+- ``load``: the shared hospitals frame
+- ``filter``: the global filter sidebar and its row selection
+- ``aggregate``: derived tables built on a cache miss
+- ``render``: ``st.plotly_chart`` calls made through ``render_chart``
+
+Time not covered by a top-level span is the page's own transform and
+figure-construction code.
+
+A run ends when the page calls ``end_run``. If the page stopped early
+(``st.stop``), the run ends when the same session starts its next one, or
+when the session is dropped. Sessions idle for ``SESSION_TTL_S`` (closed
+browser tabs included) are dropped, and at most ``MAX_SESSIONS`` are kept,
+so a long-running server does not accumulate them. Finished runs go to an
+in-memory ring buffer read by the Diagnostics page.
+Two environment variables add optional output:
+
+- ``HOSPITALS_TRACE_FILE``: append each finished run as one JSON line
+- ``HOSPITALS_PROFILE_DIR``: write a cProfile ``.prof`` file per run
+
+A span costs a couple of microseconds, so the instrumentation stays on in
+production. Only the cProfile dump adds real overhead.
+"""
+import cProfile
+import collections
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+TRACE_FILE = os.environ.get('HOSPITALS_TRACE_FILE')
+PROFILE_DIR = os.environ.get('HOSPITALS_PROFILE_DIR')
+HISTORY_SIZE = 500
+SESSION_TTL_S = 30 * 60
+MAX_SESSIONS = 1000
+
+_local = threading.local()
+_lock = threading.Lock()
+_history = collections.deque(maxlen=HISTORY_SIZE)
+_open_runs = {}      # session id -> run record still in progress
+_sessions = collections.OrderedDict()  # session id -> {'runs', 'last_page', 'last_seen', 'state_bytes'}, least recent first
+_counters = collections.Counter()
+_tracked_caches = {}  # qualified name -> lru_cache-wrapped function
+
+
+class _Span:
+    __slots__ = ('stage', 'name', 'start', 'run', 'depth')
+
+    def __init__(self, stage, name):
+        self.stage = stage
+        self.name = name
+
+    def __enter__(self):
+        self.run = getattr(_local, 'run', None)
+        self.depth = getattr(_local, 'depth', 0)
+        _local.depth = self.depth + 1
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        _local.depth = self.depth
+        if self.run is not None:
+            self.run['spans'].append((self.stage, self.name, self.start - self.run['start'], end - self.start, self.depth))
+            self.run['end'] = end
+        return False
+
+
+def span(stage, name=''):
+    """Context manager timing one stage of the current page run (a no-op record outside a run)."""
+    return _Span(stage, name)
+
+
+def count(event):
+    """Increment a process-wide counter (and the current run's copy), e.g. 'artifact_hit'."""
+    with _lock:
+        _counters[event] += 1
+    run = getattr(_local, 'run', None)
+    if run is not None:
+        run['counters'][event] += 1
+
+
+def track_cache(function):
+    """Register an ``lru_cache``-wrapped function so its hit/miss statistics show in diagnostics."""
+    _tracked_caches[f"{function.__module__}.{function.__name__}"] = function
+    return function
+
+
+def _session_id():
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else f"thread-{threading.get_ident()}"
+
+
+def _drop_idle_sessions(now):
+    # Caller holds _lock. Returns the open runs of the dropped sessions, to be finished.
+    dropped = []
+    while _sessions:
+        session, info = next(iter(_sessions.items()))
+        if now - info['last_seen'] <= SESSION_TTL_S and len(_sessions) <= MAX_SESSIONS:
+            break
+        del _sessions[session]
+        run = _open_runs.pop(session, None)
+        if run is not None:
+            # Its profiler belongs to a script thread that has long finished; disabling it here would stop ours.
+            run['profiler'] = None
+            dropped.append(run)
+    return dropped
+
+
+def begin_run(page):
+    """Start the run record for ``page`` in the current session, closing the session's previous one."""
+    session = _session_id()
+    with _lock:
+        previous = _open_runs.pop(session, None)
+    if previous is not None:
+        _finish(previous)
+    now = time.perf_counter_ns()
+    run = {'page': page, 'session': session, 'started_at': time.time(), 'start': now, 'end': now,
+           'spans': [], 'counters': collections.Counter(), 'profiler': None}
+    if PROFILE_DIR:
+        run['profiler'] = cProfile.Profile()
+        run['profiler'].enable()
+    with _lock:
+        _open_runs[session] = run
+        info = _sessions.setdefault(session, {'runs': 0})
+        _sessions.move_to_end(session)
+        info.update(last_page=page, last_seen=run['started_at'])
+        info['runs'] += 1
+        try:
+            info['state_bytes'] = estimate_bytes(dict(st.session_state))
+        except Exception:  # no session state outside a Streamlit run
+            info['state_bytes'] = None
+        stale = _drop_idle_sessions(run['started_at'])
+    for dropped in stale:
+        _finish(dropped)
+    _local.run = run
+    _local.depth = 0
+    return run
+
+
+def end_run():
+    """Finish the current page run; call it as the last line of a page."""
+    run = getattr(_local, 'run', None)
+    if run is None:
+        return
+    run['end'] = time.perf_counter_ns()
+    with _lock:
+        if _open_runs.get(run['session']) is run:
+            del _open_runs[run['session']]
+        else:
+            return
+    _finish(run)
+
+
+def _finish(run):
+    if getattr(_local, 'run', None) is run:
+        _local.run = None
+    profiler = run.pop('profiler')
+    record = {
+        'page': run['page'],
+        'session': run['session'],
+        'started_at': run['started_at'],
+        'total_ms': (run['end'] - run['start']) / 1e6,
+        'spans': [{'stage': stage, 'name': name, 'offset_ms': offset / 1e6, 'ms': duration / 1e6, 'depth': depth}
+                  for stage, name, offset, duration, depth in run['spans']],
+        'counters': dict(run['counters']),
+    }
+    with _lock:
+        _history.append(record)
+    if TRACE_FILE:
+        with _lock, open(TRACE_FILE, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(run['page']))[0].replace(' ', '_')
+        profiler.dump_stats(os.path.join(PROFILE_DIR, f"{stem}-{int(run['started_at'] * 1000)}.prof"))
+
+
+def render_chart(fig, **kwargs):
+    """``st.plotly_chart`` timed as a 'render' span (figure serialization happens inside it)."""
+    title = fig.layout.title.text if fig.layout.title and fig.layout.title.text else ''
+    with span('render', title):
+        return st.plotly_chart(fig, **kwargs)
+
+
+def run_history():
+    """Finished runs, oldest first."""
+    with _lock:
+        return list(_history)
+
+
+def counters():
+    with _lock:
+        return dict(_counters)
+
+
+def sessions():
+    with _lock:
+        return {session: dict(info) for session, info in _sessions.items()}
+
+
+def cache_statistics():
+    """``cache_info()`` of every tracked ``lru_cache`` as a list of dicts."""
+    rows = []
+    for name, function in sorted(_tracked_caches.items()):
+        info = function.cache_info()
+        rows.append({'cache': name, 'hits': info.hits, 'misses': info.misses,
+                     'size': info.currsize, 'maxsize': info.maxsize})
+    return rows
+
+
+def estimate_bytes(obj, _seen=None):
+    """Approximate memory held by ``obj``.
+
+    Frames and arrays report their buffers (strings are not measured deeply).
+    Containers are walked recursively, counting each object once.
+    """
+    _seen = set() if _seen is None else _seen
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = obj.memory_usage(index=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_bytes(key, _seen) + estimate_bytes(value, _seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_bytes(item, _seen) for item in obj)
+    elif hasattr(obj, '__dataclass_fields__'):
+        size += sum(estimate_bytes(getattr(obj, field), _seen) for field in obj.__dataclass_fields__)
+    return size
@@ -0,0 +1,188 @@
+"""Keyword and treatment frequencies for any subset of hospitals.
+
+The review-keyword and treatment columns hold semicolon-separated terms.
+They are tokenized once per dataset version into an interned vocabulary
+(one integer id per distinct term) and a sparse hospital x term matrix kept
+in coordinate form (row, term id, count). Frequencies for a filter are then
+a weighted ``np.bincount`` over the matrix entries of the selected rows, with
+no string splitting at query time.
+
+The matrix is built block by block (one block, or one per stored chunk for
+large datasets, see hospital_data.column_batches) and the block matrices
+are merged onto one sorted vocabulary. A delta file (see hospital_deltas)
+replaces only the entries of the rows whose terms it changes.
+
+For filtering on terms, ``term_bitsets`` inverts the matrix into one packed
+bitset per term (bit i set = hospital i has the term; 1 bit per hospital,
+about 1 KB per term for 7k hospitals). ``term_mask`` answers all-of /
+any-of / none-of queries such as "Radiology AND Emergency Medicine but NOT
+Psychiatry" with a few bitwise operations over those rows of bytes.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from hospital_data import cached_artifact, column_batches, dataset_fingerprint, filter_key
+from instrumentation import track_cache
+
+TERM_COLUMNS = {
+    'positive': 'most repeated keywords for the hospital in positive reviews',
+    'negative': 'most repeated keywords for the hospital in negative reviews',
+    'treatments': 'Types of treatment it contains',
+}
+TERM_SEPARATOR = ';'
+
+
+def build_term_matrix(values):
+    """Tokenize a column of separator-joined strings into a sparse count matrix.
+
+    Returns a dict with ``vocabulary`` (array of terms), ``rows`` and ``terms``
+    (int32 coordinates of the non-zero entries), ``counts`` (how often the term
+    appears in that row) and ``n_rows``.
+    """
+    values = pd.Series(values).reset_index(drop=True)
+    tokens = values.astype('string').str.split(TERM_SEPARATOR).explode().str.strip()
+    tokens = tokens[tokens.notna() & (tokens != '')]
+    term_ids, vocabulary = pd.factorize(tokens, sort=True)
+    rows = tokens.index.to_numpy(dtype='int64')
+    # Collapse repeated (row, term) pairs into a single entry with a count.
+    pair_keys = rows * len(vocabulary) + term_ids
+    unique_keys, counts = np.unique(pair_keys, return_counts=True)
+    return {
+        'vocabulary': np.asarray(vocabulary, dtype=object),
+        'rows': (unique_keys // max(len(vocabulary), 1)).astype('int32'),
+        'terms': (unique_keys % max(len(vocabulary), 1)).astype('int32'),
+        'counts': counts.astype('int32'),
+        'n_rows': len(values),
+    }
+
+
+def merge_term_matrices(blocks):
+    """Combine ``(first row position, term matrix)`` blocks of consecutive rows into one matrix."""
+    vocabulary = np.unique(np.concatenate([matrix['vocabulary'] for _, matrix in blocks]))
+    rows, terms = [], []
+    for first, matrix in blocks:
+        rows.append(matrix['rows'] + first)
+        # Block term ids -> positions in the merged (sorted) vocabulary.
+        terms.append(np.searchsorted(vocabulary, matrix['vocabulary']).astype('int32')[matrix['terms']])
+    return {
+        'vocabulary': vocabulary.astype(object),
+        'rows': np.concatenate(rows).astype('int32'),
+        'terms': np.concatenate(terms).astype('int32'),
+        'counts': np.concatenate([matrix['counts'] for _, matrix in blocks]),
+        'n_rows': sum(matrix['n_rows'] for _, matrix in blocks),
+    }
+
+
+def update_term_matrix(column):
+    """``update`` function for the term matrix of ``column``: re-tokenize only rows the delta gives values for."""
+    def update(matrix, change):
+        values = change.delta[column].dropna() if column in change.delta.columns else pd.Series(dtype='string')
+        if values.empty:
+            return dict(matrix, n_rows=len(change.frame))
+        positions = values.index.to_numpy()
+        keep = ~np.isin(matrix['rows'], positions)
+        kept = dict(matrix, rows=matrix['rows'][keep], terms=matrix['terms'][keep], counts=matrix['counts'][keep])
+        fresh = build_term_matrix(values)
+        fresh['rows'] = positions[fresh['rows']].astype('int32')
+        return dict(merge_term_matrices([(0, kept), (0, fresh)]), n_rows=len(change.frame))
+    return update
+
+
+def term_matrix(kind):
+    """Cached term matrix for ``kind`` ('positive', 'negative' or 'treatments')."""
+    def build(_df):
+        blocks = [(first, build_term_matrix(values)) for first, values in column_batches(TERM_COLUMNS[kind])]
+        return blocks[0][1] if len(blocks) == 1 else merge_term_matrices(blocks)
+    return cached_artifact(f'term_matrix:{kind}', build, update=update_term_matrix(TERM_COLUMNS[kind]))
+
+
+def _bitsets(vocabulary, rows, terms, n_rows):
+    dense = np.zeros((len(vocabulary), n_rows), dtype=bool)
+    dense[terms, rows] = True
+    return {'vocabulary': vocabulary, 'bits': np.packbits(dense, axis=1), 'n_rows': n_rows}
+
+
+def update_term_bitsets(column):
+    """``update`` function for the bitsets of ``column``: rewrite the bits of rows the delta gives values for."""
+    def update(bitsets, change):
+        values = change.delta[column].dropna() if column in change.delta.columns else pd.Series(dtype='string')
+        n_rows = len(change.frame)
+        if values.empty and n_rows == bitsets['n_rows']:
+            return bitsets
+        positions = values.index.to_numpy()
+        fresh = build_term_matrix(values)
+        vocabulary = np.unique(np.concatenate([bitsets['vocabulary'], fresh['vocabulary']])).astype(object)
+        dense = np.zeros((len(vocabulary), n_rows), dtype=bool)
+        dense[np.searchsorted(vocabulary, bitsets['vocabulary']), :bitsets['n_rows']] = \
+            np.unpackbits(bitsets['bits'], axis=1, count=bitsets['n_rows'])
+        dense[:, positions] = False
+        dense[np.searchsorted(vocabulary, fresh['vocabulary'])[fresh['terms']], positions[fresh['rows']]] = True
+        return {'vocabulary': vocabulary, 'bits': np.packbits(dense, axis=1), 'n_rows': n_rows}
+    return update
+
+
+def term_bitsets(kind):
+    """Inverted index of ``kind``'s terms: ``vocabulary`` (sorted), ``bits`` (one packed row of bits per term)
+    and ``n_rows``."""
+    def build(_df):
+        matrix = term_matrix(kind)
+        return _bitsets(matrix['vocabulary'], matrix['rows'], matrix['terms'], matrix['n_rows'])
+    return cached_artifact(f'term_bitsets:{kind}', build, update=update_term_bitsets(TERM_COLUMNS[kind]))
+
+
+def _term_ids(vocabulary, terms):
+    # Ids of the ``terms`` present in the vocabulary, and whether all of them are.
+    wanted = np.asarray(list(terms), dtype=object)
+    ids = np.searchsorted(vocabulary, wanted).clip(max=max(len(vocabulary) - 1, 0))
+    found = (vocabulary[ids] == wanted) if len(vocabulary) else np.zeros(len(wanted), dtype=bool)
+    return ids[found], bool(found.all())
+
+
+def term_mask(kind, all_of=(), any_of=(), none_of=()):
+    """Boolean mask over hospitals having every term of ``all_of``, at least one of ``any_of``
+    (when given) and none of ``none_of``.
+    """
+    index = term_bitsets(kind)
+    vocabulary, bits = index['vocabulary'], index['bits']
+    result = np.full(bits.shape[1], 0xFF, dtype=np.uint8)
+    if all_of:
+        ids, complete = _term_ids(vocabulary, all_of)
+        result &= np.bitwise_and.reduce(bits[ids], axis=0) if complete else 0
+    if any_of:
+        ids, _ = _term_ids(vocabulary, any_of)
+        result &= np.bitwise_or.reduce(bits[ids], axis=0) if len(ids) else 0
+    if none_of:
+        ids, _ = _term_ids(vocabulary, none_of)
+        if len(ids):
+            result &= ~np.bitwise_or.reduce(bits[ids], axis=0)
+    return np.unpackbits(result, count=index['n_rows']).view(bool)
+
+
+def term_frequencies(kind, rows=None):
+    """Term -> total count over the hospitals at positions ``rows`` (all hospitals if None).
+
+    Sorted by descending count.
+    """
+    matrix = term_matrix(kind)
+    weights = matrix['counts']
+    if rows is not None:
+        selected = np.zeros(matrix['n_rows'], dtype=bool)
+        selected[rows] = True
+        weights = weights * selected[matrix['rows']]
+    totals = np.bincount(matrix['terms'], weights=weights, minlength=len(matrix['vocabulary']))
+    freq = pd.Series(totals.astype('int64'), index=matrix['vocabulary'], name='Count')
+    return freq[freq > 0].sort_values(ascending=False, kind='stable')
+
+
+@track_cache
+@lru_cache(maxsize=256)
+def _cached_frequencies(fingerprint, kind, hospital_filter):
+    return term_frequencies(kind, None if hospital_filter is None else hospital_filter.rows())
+
+
+def keyword_frequencies(kind, hospital_filter=None, top=None):
+    """Term frequencies over the hospitals kept by ``hospital_filter`` (all if None), cached per filter."""
+    freq = _cached_frequencies(dataset_fingerprint(), kind, filter_key(hospital_filter))
+    return freq.head(top) if top else freq.copy(deep=False)
@@ -0,0 +1,141 @@
+"""Zoom-aware clustering and viewport queries for the hospitals map.
+
+Hospitals are bucketed into a square lat/lon grid whose cell size halves with
+every zoom level (like web-map tiles). Below ``CLUSTER_MAX_ZOOM`` the map gets
+one marker per occupied cell (centroid + count); from that zoom on it gets
+the individual facilities inside the visible bounding box only. Either way
+the number of markers sent depends on the viewport, not on the dataset size.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from hospital_data import STATE_COL, cached_artifact, dataset_fingerprint, load_hospitals
+from instrumentation import track_cache
+
+LAT_COL = 'Location_Lat'
+LON_COL = 'Location_Lon'
+
+# Zoom level from which individual facilities replace clusters.
+CLUSTER_MAX_ZOOM = 11
+# Grid cells per 256 px map tile side; 8 gives clusters roughly 32 px apart.
+CELLS_PER_TILE = 8
+# Zoom level of the fine grid used to answer bounding-box queries.
+INDEX_ZOOM = 12
+# Approximate size of the map element in pixels, used to derive the viewport.
+MAP_WIDTH_PX = 1000
+MAP_HEIGHT_PX = 450
+
+
+def cell_size(zoom):
+    """Grid cell side in degrees at ``zoom``."""
+    return 360.0 / (2 ** zoom) / CELLS_PER_TILE
+
+
+def viewport_bbox(center_lat, center_lon, zoom, width_px=MAP_WIDTH_PX, height_px=MAP_HEIGHT_PX):
+    """Approximate (lat_min, lat_max, lon_min, lon_max) visible at ``zoom`` around a center."""
+    lon_span = 360.0 * width_px / (256 * 2 ** zoom)
+    lat_span = lon_span * height_px / width_px * np.cos(np.radians(center_lat))
+    return (center_lat - lat_span / 2, center_lat + lat_span / 2,
+            center_lon - lon_span / 2, center_lon + lon_span / 2)
+
+
+def _located(df):
+    return df.dropna(subset=[LAT_COL, LON_COL])
+
+
+def build_clusters(df, zoom):
+    """One row per occupied grid cell at ``zoom``: centroid, hospital count and dominant State."""
+    df = _located(df)
+    size = cell_size(zoom)
+    cell_y = np.floor(df[LAT_COL].to_numpy() / size).astype(np.int64)
+    cell_x = np.floor(df[LON_COL].to_numpy() / size).astype(np.int64)
+    cells = pd.DataFrame({
+        'cell': (cell_y << 32) + cell_x,
+        LAT_COL: df[LAT_COL].to_numpy(),
+        LON_COL: df[LON_COL].to_numpy(),
+        STATE_COL: df[STATE_COL].to_numpy(),
+    })
+    grouped = cells.groupby('cell', sort=True)
+    clusters = grouped.agg(**{LAT_COL: (LAT_COL, 'mean'), LON_COL: (LON_COL, 'mean'), 'Hospitals': (LAT_COL, 'size')})
+    # Most frequent State per cell, found without a Python loop over cells.
+    state_counts = cells.groupby(['cell', STATE_COL], observed=True).size()
+    dominant = state_counts.sort_values(ascending=False, kind='stable').reset_index().drop_duplicates('cell')
+    clusters[STATE_COL] = dominant.set_index('cell')[STATE_COL].reindex(clusters.index)
+    return clusters.reset_index(drop=True)
+
+
+def clusters_for_zoom(zoom):
+    return cached_artifact(f'map_clusters:{zoom}', lambda df: build_clusters(df, zoom))
+
+
+def build_grid_index(df):
+    """Row positions (and coordinates) sorted by fine-grid cell, plus the sorted cell keys for range lookups."""
+    lat = df[LAT_COL].to_numpy(dtype='float64')
+    lon = df[LON_COL].to_numpy(dtype='float64')
+    located = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+    size = cell_size(INDEX_ZOOM)
+    cell_y = np.floor(lat[located] / size).astype(np.int64)
+    cell_x = np.floor(lon[located] / size).astype(np.int64)
+    keys = (cell_y << 32) + cell_x
+    order = np.argsort(keys, kind='stable')
+    rows = located[order]
+    return {'keys': keys[order], 'rows': rows, 'lat': lat[rows], 'lon': lon[rows]}
+
+
+def grid_index():
+    return cached_artifact('map_grid_index', build_grid_index)
+
+
+def rows_in_bbox(bbox, hospital_filter=None):
+    """Row positions of the located hospitals inside ``(lat_min, lat_max, lon_min, lon_max)``.
+
+    Walks one band of grid rows at a time and binary-searches the x range in
+    each, so only the cells that overlap the box are touched; points in the
+    edge cells are then checked against the exact box.
+    """
+    lat_min, lat_max, lon_min, lon_max = bbox
+    index = grid_index()
+    keys, rows = index['keys'], index['rows']
+    size = cell_size(INDEX_ZOOM)
+    x_lo, x_hi = int(np.floor(lon_min / size)), int(np.floor(lon_max / size))
+    bands = np.arange(int(np.floor(lat_min / size)), int(np.floor(lat_max / size)) + 1, dtype=np.int64)
+    starts = np.searchsorted(keys, (bands << 32) + x_lo, side='left')
+    ends = np.searchsorted(keys, (bands << 32) + x_hi, side='right')
+    spans = [np.arange(start, end) for start, end in zip(starts, ends) if end > start]
+    if not spans:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.concatenate(spans)
+    lat, lon = index['lat'][candidates], index['lon'][candidates]
+    exact = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+    found = rows[candidates[exact]]
+    if hospital_filter is not None and hospital_filter.restricts_rows:
+        found = found[np.isin(found, hospital_filter.rows())]
+    return found
+
+
+@track_cache
+@lru_cache(maxsize=64)
+def _filtered_clusters(fingerprint, zoom, hospital_filter):
+    return build_clusters(load_hospitals().iloc[hospital_filter.rows()], zoom)
+
+
+def clusters_in_bbox(zoom, bbox, hospital_filter=None):
+    if hospital_filter is not None and hospital_filter.restricts_rows:
+        clusters = _filtered_clusters(dataset_fingerprint(), zoom, hospital_filter)
+    else:
+        clusters = clusters_for_zoom(zoom)
+    lat_min, lat_max, lon_min, lon_max = bbox
+    inside = (clusters[LAT_COL].between(lat_min, lat_max) & clusters[LON_COL].between(lon_min, lon_max))
+    return clusters[inside]
+
+
+def build_state_centers(df):
+    df = _located(df)
+    return df.groupby(STATE_COL, observed=True)[[LAT_COL, LON_COL]].mean()
+
+
+def state_centers():
+    """Mean facility location per State, used to center the map on an Emirate."""
+    return cached_artifact('map_state_centers', build_state_centers)
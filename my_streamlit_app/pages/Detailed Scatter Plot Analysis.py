@@ -1,96 +1,157 @@
-import streamlit as st
-import pandas as pd
-import plotly.express as px
-import os
-
-st.title("📈 Detailed Scatter Plot Analysis")
-st.markdown("---")
-
-app_directory = os.path.dirname(os.path.abspath(__file__))
-data_directory = os.path.abspath(os.path.join(app_directory, os.pardir))
-HOSPITALS_DATA_PATH = os.path.join(data_directory, "UAE_hospitals_data.csv")
-
-df_hospitals = pd.DataFrame()
-if os.path.exists(HOSPITALS_DATA_PATH):
-    try:
-        df_hospitals = pd.read_csv(HOSPITALS_DATA_PATH)
-        if 'Hospital rate' in df_hospitals.columns:
-            df_hospitals['Hospital rate'] = pd.to_numeric(df_hospitals['Hospital rate'], errors='coerce')
-        
-        # Convert numerical columns to numeric, coercing errors, where relevant for plotting
-        numerical_cols_to_convert = [
-            'Number of Doctors', 'Number of patients in 2020', 'Number of patients in 2021',
-            'Number of patients in 2022', 'Number of patients in 2023', 'Number of patients in 2024',
-            'Number of patients in 2025', 'total cost of the hospital in 2020 (million AED)',
-            'total cost of the hospital in 2021 (million AED)', 'total cost of the hospital in 2022 (million AED)',
-            'total cost of the hospital in 2023 (million AED)', 'total cost of the hospital in 2024 (million AED)',
-            'total cost of the hospital in 2025 (million AED)', 'total income of the hospital in 2020 (million AED)',
-            'total income of the hospital in 2021 (million AED)', 'total income of the hospital in 2022 (million AED)',
-            'total income of the hospital in 2023 (million AED)', 'total income of the hospital in 2024 (million AED)',
-            'total income of the hospital in 2025 (million AED)', 'total number of surgeries in 2020',
-            'total number of surgeries in 2021', 'total number of surgeries in 2022', 'total number of surgeries in 2023',
-            'total number of surgeries in 2024', 'total number of surgeries in 2025',
-            'number of customers make reviews for the hospital', 'number of reviews',
-            'positive reviews', 'negative reviews'
-        ]
-        for col in numerical_cols_to_convert:
-            if col in df_hospitals.columns:
-                df_hospitals[col] = pd.to_numeric(df_hospitals[col], errors='coerce')
-
-    except Exception as e:
-        st.error(f"Error reading hospital data file: {e}. Please ensure 'UAE_hospitals_data.csv' is in your main project folder.")
-else:
-    st.error(f"Hospital data file '{os.path.basename(HOSPITALS_DATA_PATH)}' not found. Please ensure it's in your main project folder: `{HOSPITALS_DATA_PATH}`.")
-
-if df_hospitals.empty:
-    st.warning("No data loaded to display charts.")
-    st.stop()
-
-# Get all numerical columns suitable for scatter plots (excluding Lat/Lon for now)
-numerical_columns = df_hospitals.select_dtypes(include=['number']).columns.tolist()
-# Filter out lat/lon as they are for maps
-numerical_columns = [col for col in numerical_columns if col not in ['Location_Lat', 'Location_Lon']]
-
-
-st.sidebar.header("Scatter Plot Controls")
-# Allow user to select X and Y axes
-x_axis = st.sidebar.selectbox("Select X-axis:", numerical_columns, index=0)
-y_axis = st.sidebar.selectbox("Select Y-axis:", numerical_columns, index=1)
-color_by = st.sidebar.selectbox("Color points by (Categorical):", ['None'] + df_hospitals.select_dtypes(include=['object', 'category']).columns.tolist(), index=1)
-size_by = st.sidebar.selectbox("Size points by (Numerical):", ['None'] + numerical_columns, index=0)
-
-# Filter out NaN values for selected axes to avoid errors in plotting
-df_plot = df_hospitals.dropna(subset=[x_axis, y_axis])
-
-if not df_plot.empty:
-    st.subheader(f"Relationship between {x_axis} and {y_axis}")
-
-    # Create the scatter plot
-    if color_by == 'None' and size_by == 'None':
-        fig = px.scatter(df_plot, x=x_axis, y=y_axis,
-                         hover_name="Name of hospital or clinic",
-                         title=f'{x_axis} vs. {y_axis}')
-    elif color_by != 'None' and size_by == 'None':
-        fig = px.scatter(df_plot, x=x_axis, y=y_axis, color=color_by,
-                         hover_name="Name of hospital or clinic",
-                         title=f'{x_axis} vs. {y_axis} (Colored by {color_by})')
-    elif color_by == 'None' and size_by != 'None':
-        # Drop NaN for size_by column if it's selected
-        df_plot_size = df_plot.dropna(subset=[size_by])
-        fig = px.scatter(df_plot_size, x=x_axis, y=y_axis, size=size_by,
-                         hover_name="Name of hospital or clinic",
-                         title=f'{x_axis} vs. {y_axis} (Sized by {size_by})')
-    else: # Both color_by and size_by are selected
-        df_plot_both = df_plot.dropna(subset=[size_by])
-        fig = px.scatter(df_plot_both, x=x_axis, y=y_axis, color=color_by, size=size_by,
-                         hover_name="Name of hospital or clinic",
-                         title=f'{x_axis} vs. {y_axis} (Colored by {color_by}, Sized by {size_by})')
-
-    fig.update_layout(hovermode="closest")
-    st.plotly_chart(fig, use_container_width=True)
-
-else:
-    st.warning(f"No valid data to plot for {x_axis} vs. {y_axis} after removing missing values.")
-
-st.markdown("---")
-st.write("Explore relationships between different numerical metrics in the UAE's healthcare data.")
\ No newline at end of file
+import streamlit as st
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+from hospital_data import load_hospitals_for_page
+from hospital_filters import filter_sidebar, filtered_frame
+from query_engine import enabled as sql_enabled, select_rows
+from figure_cache import cached_figure
+from pair_statistics import pair_columns, pair_fit, pair_statistics, state_pair_breakdown, strongest_pairs
+from plot_sampling import MAX_POINTS, density_grid, render_mode_for, stratified_sample, within_ranges
+from instrumentation import end_run, render_chart
+
+st.title("📈 Detailed Scatter Plot Analysis")
+st.markdown("---")
+
+# Numerical columns are coerced once by the shared loader.
+df_hospitals = load_hospitals_for_page()
+
+if df_hospitals.empty:
+    st.warning("No data loaded to display charts.")
+    st.stop()
+
+# Rows kept by the global filter come from the shared selection cache
+hospital_filter = filter_sidebar(df_hospitals)
+if not sql_enabled():
+    df_hospitals = filtered_frame(hospital_filter, df_hospitals)
+
+# Numerical columns suitable for scatter plots (Lat/Lon are for maps); the correlation matrix uses the same list
+numerical_columns = pair_columns(df_hospitals)
+
+
+st.sidebar.header("Scatter Plot Controls")
+# Allow user to select X and Y axes
+# Keyed so a click on the correlation heatmap below can pick the pair
+x_axis = st.sidebar.selectbox("Select X-axis:", numerical_columns, index=0, key="scatter_x")
+y_axis = st.sidebar.selectbox("Select Y-axis:", numerical_columns, index=1, key="scatter_y")
+categorical_columns = ['None'] + df_hospitals.select_dtypes(include=['object', 'category', 'string']).columns.tolist()
+# Default to a low-cardinality column: coloring by hospital name creates one trace per name.
+color_by = st.sidebar.selectbox("Color points by (Categorical):", categorical_columns,
+                                index=categorical_columns.index('State') if 'State' in categorical_columns else 0)
+size_by = st.sidebar.selectbox("Size points by (Numerical):", ['None'] + numerical_columns, index=0)
+render_choice = st.sidebar.radio(
+    "Rendering mode:",
+    ["Auto", "All points (WebGL)", "Downsampled", "Density heatmap"],
+    help=f"Auto draws every point up to {MAX_POINTS:,}; beyond that it sends a stratified sample. Zoom in to see full detail.",
+    key="scatter_render_mode"
+)
+show_trendline = st.sidebar.checkbox("Show least-squares trendline", value=True, key="scatter_trendline")
+
+# Filter out NaN values for selected axes to avoid errors in plotting
+required = [x_axis, y_axis] + ([size_by] if size_by != 'None' else [])
+if sql_enabled():
+    # The SQL backend filters and drops missing values itself and returns only the plotted columns
+    plotted = required + ([color_by] if color_by != 'None' else []) + ["Name of hospital or clinic"]
+    df_plot = select_rows(plotted, hospital_filter, not_null=required)
+else:
+    df_plot = df_hospitals.dropna(subset=required)
+
+if not df_plot.empty:
+    st.subheader(f"Relationship between {x_axis} and {y_axis}")
+
+    # --- Zoom: restrict the axes; a small enough region is drawn point by point ---
+    x_range = y_range = None
+    with st.sidebar.expander("Zoom to a region"):
+        x_min, x_max = float(df_plot[x_axis].min()), float(df_plot[x_axis].max())
+        y_min, y_max = float(df_plot[y_axis].min()), float(df_plot[y_axis].max())
+        if x_min < x_max:
+            x_range = st.slider(f"{x_axis} range", x_min, x_max, (x_min, x_max), key="scatter_zoom_x")
+        if y_min < y_max:
+            y_range = st.slider(f"{y_axis} range", y_min, y_max, (y_min, y_max), key="scatter_zoom_y")
+    df_view = within_ranges(df_plot, x_axis, y_axis, x_range, y_range)
+
+    title = f'{x_axis} vs. {y_axis}'
+    if render_choice == "Density heatmap":
+        # Bin on the server and send only the grid, however many rows there are
+        counts, x_centers, y_centers = density_grid(df_view[x_axis], df_view[y_axis], bins=60,
+                                                    x_range=x_range, y_range=y_range)
+        fig = go.Figure(go.Heatmap(x=x_centers, y=y_centers, z=counts, colorscale='Viridis',
+                                   colorbar=dict(title='Hospitals')))
+        fig.update_layout(title=f'{title} (Density)', xaxis_title=x_axis, yaxis_title=y_axis)
+        st.caption(f"{len(df_view):,} hospitals binned into a 60 x 60 grid.")
+    else:
+        df_shown = df_view
+        if render_choice == "Downsampled" or (render_choice == "Auto" and len(df_view) > MAX_POINTS):
+            df_shown = stratified_sample(df_view, MAX_POINTS, by=None if color_by == 'None' else color_by)
+        if len(df_shown) < len(df_view):
+            st.caption(f"Showing a stratified sample of {len(df_shown):,} of {len(df_view):,} points. Zoom in to see every point.")
+
+        scatter_args = dict(x=x_axis, y=y_axis, hover_name="Name of hospital or clinic",
+                            render_mode=render_mode_for(len(df_shown)))
+        if color_by != 'None':
+            scatter_args['color'] = color_by
+            title += f' (Colored by {color_by}'
+        if size_by != 'None':
+            scatter_args['size'] = size_by
+            title += f', Sized by {size_by})' if color_by != 'None' else f' (Sized by {size_by})'
+        elif color_by != 'None':
+            title += ')'
+        fig = px.scatter(df_shown, title=title, **scatter_args)
+        fig.update_layout(hovermode="closest")
+
+    # --- Trendline from the cached pair fit (all filtered hospitals, not just the points drawn) ---
+    fit = pair_fit(x_axis, y_axis, hospital_filter)
+    if show_trendline and not np.isnan(fit['slope']):
+        line_x = list(x_range) if x_range else [float(df_plot[x_axis].min()), float(df_plot[x_axis].max())]
+        fig.add_trace(go.Scatter(x=line_x, y=[fit['intercept'] + fit['slope'] * x for x in line_x], mode='lines',
+                                 name='Least-squares fit', line=dict(color='black', dash='dash'), hoverinfo='skip'))
+    render_chart(fig, use_container_width=True)
+    st.caption(f"Pearson r = {fit['pearson']:.3f} · Spearman ρ = {fit['spearman']:.3f} · "
+               f"{y_axis} ≈ {fit['intercept']:,.4g} {'−' if fit['slope'] < 0 else '+'} {abs(fit['slope']):,.4g} × {x_axis} "
+               f"({fit['n']:,} hospitals)")
+
+    with st.expander("Correlation of this pair in each Emirate"):
+        st.dataframe(state_pair_breakdown(x_axis, y_axis, hospital_filter).round(4), hide_index=True,
+                     use_container_width=True)
+
+else:
+    st.warning(f"No valid data to plot for {x_axis} vs. {y_axis} after removing missing values.")
+
+# --- Correlation matrix: click a cell to plot that pair above ---
+st.markdown("---")
+st.subheader("Correlation Matrix")
+method = st.radio("Correlation:", ["Pearson", "Spearman"], horizontal=True, key="scatter_correlation_method",
+                  help="Spearman correlates the ranks, so it also picks up monotonic relationships that are not linear.")
+
+
+def build_correlation_heatmap():
+    stats = pair_statistics(hospital_filter)
+    columns, matrix = stats['columns'].tolist(), stats[method.lower()]
+    fig = go.Figure(go.Heatmap(x=columns, y=columns, z=matrix, zmin=-1, zmax=1, colorscale='RdBu', reversescale=True,
+                               colorbar=dict(title='r'), hoverinfo='skip'))
+    # Heatmap cells cannot be selected, so an invisible marker at each cell centre receives the click
+    fig.add_trace(go.Scatter(x=[x for _ in columns for x in columns], y=[y for y in columns for _ in columns],
+                             customdata=matrix.ravel(), mode='markers', marker=dict(size=14, opacity=0),
+                             hovertemplate='%{x}<br>%{y}<br>r = %{customdata:.3f}<extra></extra>', showlegend=False))
+    fig.update_layout(title=f'{method} correlation', height=750, xaxis=dict(showticklabels=False),
+                      yaxis=dict(autorange='reversed', tickfont=dict(size=9)), margin=dict(t=50, b=0, l=0, r=0))
+    return fig
+
+
+def select_pair():
+    points = st.session_state["scatter_correlation_heatmap"].selection.points
+    if points:
+        st.session_state["scatter_x"], st.session_state["scatter_y"] = points[0]['x'], points[0]['y']
+
+
+render_chart(cached_figure('correlation_heatmap', (method, hospital_filter), build_correlation_heatmap),
+             use_container_width=True, on_select=select_pair, selection_mode='points', key="scatter_correlation_heatmap")
+st.caption("Click a cell to plot that pair: the cell's column goes on the X-axis and its row on the Y-axis.")
+st.write("Most strongly correlated pairs:")
+st.dataframe(strongest_pairs(method.lower(), top=10, hospital_filter=hospital_filter).round(4), hide_index=True,
+             use_container_width=True)
+
+st.markdown("---")
+st.write("Explore relationships between different numerical metrics in the UAE's healthcare data.")
+
+end_run()
@@ -0,0 +1,111 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+import json
+import os
+import resource
+from hospital_data import HOSPITALS_DATA_PATH, dataset_version, loaded_tables
+from shared_dataset import SHARED_DIR, enabled as shared_enabled, shared_tables
+from cache_warmup import warmup_status
+from figure_cache import figure_cache_info
+from instrumentation import (
+    PROFILE_DIR, TRACE_FILE, cache_statistics, counters, estimate_bytes, run_history, sessions,
+)
+
+# Only listed in the navigation when switched on (see Home.py).
+st.title("🩺 Diagnostics")
+st.markdown("---")
+
+STAGES = ['load', 'filter', 'aggregate', 'render']
+
+# --- Page Runs ---
+history = run_history()
+st.subheader("Page Runs")
+if not history:
+    st.info("No page runs recorded yet. Open another page and come back.")
+else:
+    rows = []
+    for run in history:
+        row = {'Page': os.path.splitext(os.path.basename(run['page']))[0], 'Session': run['session'][:8],
+               'Started': f"{pd.Timestamp(run['started_at'], unit='s'):%Y-%m-%d %H:%M:%S}", 'Total (ms)': run['total_ms']}
+        top_level = [s for s in run['spans'] if s['depth'] == 0]
+        for stage in STAGES:
+            row[f'{stage} (ms)'] = sum(s['ms'] for s in top_level if s['stage'] == stage)
+        # Whatever no top-level span covers is the page's own transform / figure-building code.
+        row['page code (ms)'] = run['total_ms'] - sum(s['ms'] for s in top_level)
+        row['Cache hits'] = run['counters'].get('artifact_hit', 0)
+        row['Cache misses'] = run['counters'].get('artifact_miss', 0)
+        rows.append(row)
+    runs_df = pd.DataFrame(rows)
+
+    summary = runs_df.groupby('Page')['Total (ms)'].agg(
+        runs='count', median='median', p95=lambda ms: ms.quantile(0.95), max='max')
+    st.dataframe(summary.round(1), use_container_width=True)
+    st.dataframe(runs_df.iloc[::-1].round(2), hide_index=True, use_container_width=True)
+
+    # --- Span timeline of one run ---
+    choice = st.selectbox("Spans of run:", range(len(history) - 1, -1, -1),
+                          format_func=lambda i: f"{rows[i]['Page']} at {rows[i]['Started']} "
+                                                f"({rows[i]['Total (ms)']:.0f} ms)")
+    spans = pd.DataFrame(history[choice]['spans'])
+    if spans.empty:
+        st.info("This run recorded no spans.")
+    else:
+        spans['label'] = [f"{'  ' * depth}{stage}: {name}" if name else f"{'  ' * depth}{stage}"
+                          for stage, name, depth in zip(spans['stage'], spans['name'], spans['depth'])]
+        fig = px.bar(spans, x='ms', y=spans.index.astype(str), base='offset_ms', color='stage', orientation='h',
+                     hover_data={'label': True, 'ms': ':.2f', 'offset_ms': ':.2f'},
+                     labels={'x': 'Milliseconds since run start', 'y': ''})
+        fig.update_layout(yaxis=dict(autorange='reversed', tickvals=spans.index.astype(str), ticktext=spans['label']),
+                          height=max(250, 24 * len(spans)), margin=dict(t=10, b=0, l=0, r=0))
+        st.plotly_chart(fig, use_container_width=True)
+
+    st.download_button("Download runs (JSON lines)", "\n".join(json.dumps(run) for run in history),
+                       file_name="page_runs.jsonl", mime="application/json")
+
+st.caption(f"Trace file: `{TRACE_FILE or 'off (set HOSPITALS_TRACE_FILE)'}` · "
+           f"cProfile dumps: `{PROFILE_DIR or 'off (set HOSPITALS_PROFILE_DIR)'}`")
+st.markdown("---")
+
+# --- Caches ---
+st.subheader("Caches")
+totals = counters()
+hits, misses = totals.get('artifact_hit', 0), totals.get('artifact_miss', 0)
+col1, col2, col3 = st.columns(3)
+col1.metric("Shared table hits", f"{hits:,}")
+col2.metric("Shared table builds", f"{misses:,}")
+col3.metric("Hit rate", f"{hits / (hits + misses):.1%}" if hits + misses else "n/a")
+st.dataframe(pd.DataFrame(cache_statistics()), hide_index=True, use_container_width=True)
+figures = figure_cache_info()
+st.write(f"Figure cache: {figures['entries']:,} figures ({figures['bytes'] / 2 ** 20:,.1f} MB), "
+         f"{figures['hits']:,} memory hits, {figures['disk_hits']:,} disk hits, {figures['misses']:,} builds, "
+         f"{figures['evictions']:,} evictions")
+
+applied = dataset_version()[2]
+if applied:
+    st.write(f"Delta files applied: {', '.join(name for name, _mtime, _size in applied)}")
+if shared_enabled():
+    published = shared_tables(HOSPITALS_DATA_PATH, dataset_version())
+    st.write(f"Shared with other processes (`{SHARED_DIR}`): {len(published):,} tables, "
+             f"{sum(published.values()) / 2 ** 20:,.1f} MB; {totals.get('shared_attach', 0):,} attached by this process")
+warmup = warmup_status()
+if warmup['steps']:
+    st.write("Background warm-up: " + ", ".join(f"{step} {state}" for step, state in warmup['steps'].items()))
+st.markdown("---")
+
+# --- Memory ---
+st.subheader("Memory")
+peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+st.metric("Process peak RSS", f"{peak_kb / 1024:,.0f} MB")
+tables = pd.DataFrame([{'Table': name, 'MB': estimate_bytes(table) / 2 ** 20}
+                       for name, table in loaded_tables().items()])
+if not tables.empty:
+    st.write(f"Shared tables: {tables['MB'].sum():,.1f} MB (string contents not included)")
+    st.dataframe(tables.sort_values('MB', ascending=False).round(2), hide_index=True, use_container_width=True)
+session_rows = [{'Session': session[:8], 'Runs': info['runs'], 'Last page': os.path.basename(info.get('last_page', '')),
+                 'Last seen': f"{pd.Timestamp(info['last_seen'], unit='s'):%Y-%m-%d %H:%M:%S}",
+                 'Session state (KB)': None if info.get('state_bytes') is None else info['state_bytes'] / 1024}
+                for session, info in sessions().items()]
+if session_rows:
+    st.write("Per-session state (estimated at each run's start):")
+    st.dataframe(pd.DataFrame(session_rows).round(1), hide_index=True, use_container_width=True)
@@ -1,43 +1,57 @@
-import streamlit as st
-import os
-
-st.title("📸 Charts")
-st.markdown("---")
-
-# Define the directory where your images are stored
-# This assumes 'assets' is in the main project directory, one level up from 'pages'
-script_dir = os.path.dirname(os.path.abspath(__file__))
-ASSETS_DIR = os.path.abspath(os.path.join(script_dir, os.pardir, "Distribution Charts"))
-
-st.write("""Explore a visual journey for Distribution Charts of medial data in the UAE.""")
-
-st.markdown("---") # Initial separator
-
-# Check if the assets directory exists
-if os.path.exists(ASSETS_DIR) and os.path.isdir(ASSETS_DIR):
-    # List all files in the assets directory
-    all_files = os.listdir(ASSETS_DIR)
-
-    # Filter for common image file extensions
-    image_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff')
-    image_files = [f for f in all_files if f.lower().endswith(image_extensions)]
-
-    # Sort the image files alphabetically for consistent display
-    image_files.sort()
-
-    if not image_files:
-        st.warning(f"No image files found in the directory: {ASSETS_DIR}")
-    else:
-        # Loop through the image files and display each image with its filename as caption
-        for img_file in image_files:
-            image_path = os.path.join(ASSETS_DIR, img_file)
-            # Create caption from filename by removing the extension
-            caption = os.path.splitext(img_file)[0].replace('_', ' ').replace('-', ' ').title()
-
-            st.image(image_path, caption=caption, use_container_width=True)
-            st.markdown("---") # Separator after each image
-else:
-    st.error(f"Image assets directory not found: `{ASSETS_DIR}`. Please ensure your 'assets' folder is in the main project directory.")
-
-
-st.write("Thank you for exploring our gallery.")
+import streamlit as st
+import plotly.graph_objects as go
+from hospital_data import load_hospitals_for_page
+from hospital_filters import filter_sidebar
+from distributions import distribution_groups, histogram
+from hospital_metrics import available_years
+from instrumentation import end_run, render_chart
+from figure_cache import cached_figure
+
+st.title("📊 Distribution Charts")
+st.markdown("---")
+
+st.write("""Explore the distributions of medical data in the UAE, computed live from the current hospital data.""")
+
+st.markdown("---") # Initial separator
+
+# --- Load Data (shared, parsed once per process) ---
+df_hospitals = load_hospitals_for_page()
+if df_hospitals.empty:
+    st.warning("No data loaded to display charts.")
+    st.stop()
+
+# --- Sidebar Controls ---
+hospital_filter = filter_sidebar(df_hospitals)
+st.sidebar.header("Distribution Controls")
+groups = distribution_groups(hospital_filter.select_years(available_years()))
+selected_group = st.sidebar.selectbox("Metric:", list(groups), key="distribution_group")
+bins = st.sidebar.slider("Number of bins:", min_value=5, max_value=100, value=30, key="distribution_bins")
+
+# --- Helper function to draw a histogram from precomputed bin counts ---
+def create_histogram(column):
+    counts, edges = histogram(column, bins=bins, hospital_filter=hospital_filter)
+    if counts.sum() == 0:
+        st.warning(f"No data to display for '{column}'.")
+        return
+
+    def build():
+        fig = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=edges[1:] - edges[:-1],
+                               marker_line_width=0, hovertemplate='%{x:,.2f}: %{y:,} hospitals<extra></extra>'))
+        fig.update_layout(title=column, xaxis_title=column, yaxis_title='Number of hospitals',
+                          bargap=0, margin=dict(t=50, b=0, l=0, r=0))
+        return fig
+
+    render_chart(cached_figure('histogram', (column, bins, hospital_filter), build), use_container_width=True)
+
+# Two charts per row; each chart ships only its bin counts to the browser
+columns = groups[selected_group]
+for start in range(0, len(columns), 2):
+    for chart_col, column in zip(st.columns(2), columns[start:start + 2]):
+        with chart_col:
+            create_histogram(column)
+    st.markdown("---") # Separator after each row
+
+
+st.write("Thank you for exploring our distributions.")
+
+end_run()
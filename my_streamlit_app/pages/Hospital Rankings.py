@@ -0,0 +1,93 @@
+import streamlit as st
+import plotly.express as px
+import plotly.graph_objects as go
+from hospital_data import NAME_COL, STATE_COL, load_hospitals_for_page
+from hospital_filters import filter_sidebar
+from hospital_metrics import available_years
+from hospital_rankings import RANKING_METRICS, compare_rows, leaderboard
+from cache_warmup import warmup_spinner
+from instrumentation import end_run, render_chart
+from figure_cache import cached_figure
+
+st.title("🏆 Hospital Rankings")
+st.markdown("---")
+
+st.write("""Leaderboards of UAE hospitals by financial margin, patient growth, surgical workload and review sentiment.
+Use the global filters to rank hospitals within one Emirate, rating band or treatment type.""")
+
+# --- Load Data (shared, parsed once per process) ---
+df_hospitals = load_hospitals_for_page()
+if df_hospitals.empty:
+    st.warning("No data loaded to display rankings.")
+    st.stop()
+
+# --- Sidebar Controls ---
+hospital_filter = filter_sidebar(df_hospitals)
+years = hospital_filter.select_years(available_years())
+st.sidebar.header("Ranking Options")
+metric = st.sidebar.selectbox("Rank by:", list(RANKING_METRICS), format_func=RANKING_METRICS.get, key="ranking_metric")
+top_n = st.sidebar.slider("Number of hospitals:", min_value=5, max_value=50, value=10, key="ranking_top_n")
+order = st.sidebar.radio("Show:", ["Top", "Bottom"], horizontal=True, key="ranking_order")
+
+if hospital_filter.restricts_rows and len(hospital_filter.rows()) == 0:
+    st.warning("No hospitals match the selected filters.")
+    st.stop()
+
+# --- Leaderboard (top-k by partial selection, cached per filter) ---
+label = RANKING_METRICS[metric]
+with warmup_spinner('rankings'):
+    board = leaderboard(metric, top_n, ascending=(order == "Bottom"), hospital_filter=hospital_filter)
+st.subheader(f"{order} {len(board)} Hospitals by {label}")
+st.caption(f"Margins and surgeries per doctor use {years[-1]}; patient growth compares {years[0]} with {years[-1]}. "
+           "Each branch of a hospital is ranked separately.")
+
+if board.empty:
+    st.info(f"No hospitals have a value for '{label}' with the selected filters.")
+    st.stop()
+
+plot_df = board.assign(Hospital=[f"{rank}. {name} ({state})" for rank, name, state
+                                 in zip(board['Rank'], board[NAME_COL], board[STATE_COL])])
+
+def build_leaderboard_figure():
+    fig = px.bar(plot_df, x=metric, y='Hospital', orientation='h', color=STATE_COL,
+                 labels={metric: label, 'Hospital': ''}, hover_data={NAME_COL: True, 'Hospital': False})
+    fig.update_layout(yaxis=dict(categoryorder='array', categoryarray=plot_df['Hospital'].tolist()[::-1]),
+                      height=max(400, 28 * len(plot_df)), margin=dict(t=30, b=0, l=0, r=0))
+    return fig
+
+fig = cached_figure('leaderboard', (metric, top_n, order, hospital_filter), build_leaderboard_figure)
+render_chart(fig, use_container_width=True)
+
+table = board[['Rank', NAME_COL, STATE_COL] + list(RANKING_METRICS)].rename(columns=RANKING_METRICS)
+st.dataframe(table.round(2), hide_index=True, use_container_width=True)
+
+st.markdown("---")
+
+# --- Side-by-side Comparison ---
+st.subheader("Compare Hospitals")
+options = board.index.tolist()
+labels = dict(zip(options, plot_df['Hospital']))
+selected = st.multiselect("Hospitals from the leaderboard to compare:", options, default=options[:3],
+                          format_func=labels.get)
+
+if selected:
+    comparison = compare_rows(selected, hospital_filter)
+    names = [labels[row] for row in selected]
+    st.dataframe(comparison[list(RANKING_METRICS)].rename(columns=RANKING_METRICS).set_axis(names).T.round(2),
+                 use_container_width=True)
+
+    # Percentiles put metrics with different units on one 0-100 scale.
+    fig_cmp = go.Figure()
+    for name, (_, row) in zip(names, comparison.iterrows()):
+        fig_cmp.add_trace(go.Bar(name=name, x=list(RANKING_METRICS.values()),
+                                 y=[row[f'{key}_percentile'] for key in RANKING_METRICS]))
+    fig_cmp.update_layout(barmode='group', yaxis=dict(title='Percentile among filtered hospitals', range=[0, 100]),
+                          margin=dict(t=30, b=0, l=0, r=0), legend=dict(orientation='h', y=-0.2))
+    render_chart(fig_cmp, use_container_width=True)
+else:
+    st.info("Select hospitals above to compare them side by side.")
+
+st.markdown("---")
+st.write("Identify the strongest and weakest performers across UAE healthcare institutions.")
+
+end_run()
@@ -1,109 +1,144 @@
-import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
-import os
-
-st.title("⭐ Hospital Reviews Analysis")
-st.markdown("---")
-
-# --- Define Path for Data ---
-app_directory = os.path.dirname(os.path.abspath(__file__))
-data_directory = os.path.abspath(os.path.join(app_directory, os.pardir))
-HOSPITALS_DATA_PATH = os.path.join(data_directory, "UAE_hospitals_data.csv")
-
-# --- Load Data ---
-df_hospitals = pd.DataFrame()
-if os.path.exists(HOSPITALS_DATA_PATH):
-    try:
-        df_hospitals = pd.read_csv(HOSPITALS_DATA_PATH)
-        # Ensure numerical columns are numeric, coercing errors
-        numerical_review_cols = ['number of reviews', 'positive reviews', 'negative reviews']
-        for col in numerical_review_cols:
-            if col in df_hospitals.columns:
-                df_hospitals[col] = pd.to_numeric(df_hospitals[col], errors='coerce').fillna(0)
-    except Exception as e:
-        st.error(f"Error reading hospital data file: {e}. Please ensure 'UAE_hospitals_data.csv' is in your main project folder.")
-else:
-    st.error(f"Hospital data file '{os.path.basename(HOSPITALS_DATA_PATH)}' not found. Please ensure it's in your main project folder: `{HOSPITALS_DATA_PATH}`.")
-
-# --- Stop if data not loaded ---
-if df_hospitals.empty:
-    st.warning("No data loaded to display hospital reviews.")
-    st.stop()
-
-# --- Sidebar: Hospital Selection ---
-st.sidebar.header("Select a Hospital")
-# Drop rows where 'Name of hospital or clinic' is missing before getting unique names
-hospitals_list = df_hospitals['Name of hospital or clinic'].dropna().unique().tolist()
-hospitals_list.sort() # Sort hospitals alphabetically
-
-selected_hospital = st.sidebar.selectbox(
-    "Choose a hospital to view its review details:",
-    hospitals_list,
-    key="hospital_selector"
-)
-
-# --- Display Content for Selected Hospital ---
-if selected_hospital:
-    hospital_data = df_hospitals[df_hospitals['Name of hospital or clinic'] == selected_hospital].iloc[0]
-
-    st.subheader(f"Review Analysis for: {selected_hospital}")
-
-    total_reviews = hospital_data['number of reviews']
-    positive_reviews = hospital_data['positive reviews']
-    negative_reviews = hospital_data['negative reviews']
-
-    # Ensure valid numbers for calculations
-    if pd.isna(total_reviews) or total_reviews == 0:
-        st.info(f"No review data available for {selected_hospital}.")
-        total_reviews = 0
-        positive_reviews = 0
-        negative_reviews = 0
-
-    # Calculate percentages
-    pos_percent = (positive_reviews / total_reviews * 100) if total_reviews > 0 else 0
-    neg_percent = (negative_reviews / total_reviews * 100) if total_reviews > 0 else 0
-
-    # --- Pie Chart for Review Sentiment ---
-    st.markdown("#### Positive vs. Negative Reviews")
-    review_labels = ['Positive', 'Negative']
-    review_values = [positive_reviews, negative_reviews]
-    review_colors = ['#2ca02c', '#d62728'] # Green for positive, Red for negative
-
-    if total_reviews > 0:
-        fig_pie = go.Figure(data=[go.Pie(labels=review_labels, values=review_values, hole=.3,
-                                         marker_colors=review_colors,
-                                         hoverinfo="label+percent+value",
-                                         textinfo="label+percent",
-                                         textfont_size=15)])
-        fig_pie.update_layout(showlegend=True, margin=dict(t=50, b=0, l=0, r=0),
-                              title_text=f"Total Reviews: {int(total_reviews)}")
-        st.plotly_chart(fig_pie, use_container_width=True)
-    else:
-        st.info("No reviews to display pie chart.")
-
-    # --- Display Keywords ---
-    st.markdown("#### Most Repeated Keywords")
-    col_pos_keywords, col_neg_keywords = st.columns(2)
-
-    with col_pos_keywords:
-        st.markdown("##### Positive Keywords")
-        pos_keywords = hospital_data.get('most repeated keywords for the hospital in positive reviews', 'N/A')
-        if pd.isna(pos_keywords) or pos_keywords == 'N/A':
-            st.info("No positive keywords available.")
-        else:
-            st.write(pos_keywords)
-
-    with col_neg_keywords:
-        st.markdown("##### Negative Keywords")
-        neg_keywords = hospital_data.get('most repeated keywords for the hospital in negative reviews', 'N/A')
-        if pd.isna(neg_keywords) or neg_keywords == 'N/A':
-            st.info("No negative keywords available.")
-        else:
-            st.write(neg_keywords)
-
-else:
-    st.info("Please select a hospital from the sidebar to view its review analysis.")
-
-st.markdown("---")
-st.write("Gain insights into hospital performance through customer reviews and key feedback themes.")
\ No newline at end of file
+import streamlit as st
+import plotly.graph_objects as go
+from hospital_data import load_hospitals_for_page
+from hospital_filters import filter_sidebar
+from hospital_forecast import FORECAST_METRICS, hospital_forecast
+from hospital_index import hospital_review_summary, hospital_rows, search_names
+from hospital_metrics import year_matrices
+from instrumentation import end_run, render_chart
+
+st.title("⭐ Hospital Reviews Analysis")
+st.markdown("---")
+
+# --- Load Data (shared, parsed once per process; review counts are already numeric) ---
+df_hospitals = load_hospitals_for_page()
+
+# --- Stop if data not loaded ---
+if df_hospitals.empty:
+    st.warning("No data loaded to display hospital reviews.")
+    st.stop()
+
+hospital_filter = filter_sidebar(df_hospitals)
+MAX_FORECAST_BRANCHES = 10
+
+# --- Sidebar: Hospital Search ---
+st.sidebar.header("Find a Hospital")
+# Typo-tolerant search over the shared trigram name index; only the best matches are sent to the browser
+query = st.sidebar.text_input("Hospital name:", key="hospital_search", placeholder="e.g. shifa dowaly")
+emirate = st.sidebar.selectbox("In Emirate:", ['All'] + sorted(df_hospitals['State'].dropna().astype(str).unique()),
+                               key="hospital_search_emirate")
+matches = search_names(query, hospital_filter, states=() if emirate == 'All' else (emirate,), limit=10)
+
+selected_hospital = None
+if matches:
+    selected_hospital = st.sidebar.radio(
+        "Choose a hospital to view its review details:",
+        matches,
+        key="hospital_selector"
+    )
+
+# --- Display Content for Selected Hospital ---
+if selected_hospital:
+    # O(1) lookup of every branch with this name; totals and keywords cover all of them
+    hospital_data = hospital_review_summary(selected_hospital, hospital_filter)
+
+    st.subheader(f"Review Analysis for: {selected_hospital}")
+    if hospital_data['branches'] > 1:
+        st.caption(f"Combined across {hospital_data['branches']} branches in: {', '.join(hospital_data['states'])}")
+
+    total_reviews = hospital_data['reviews']
+    positive_reviews = hospital_data['positive_reviews']
+    negative_reviews = hospital_data['negative_reviews']
+
+    # Ensure valid numbers for calculations
+    if total_reviews == 0:
+        st.info(f"No review data available for {selected_hospital}.")
+        total_reviews = 0
+        positive_reviews = 0
+        negative_reviews = 0
+
+    # Calculate percentages
+    pos_percent = (positive_reviews / total_reviews * 100) if total_reviews > 0 else 0
+    neg_percent = (negative_reviews / total_reviews * 100) if total_reviews > 0 else 0
+
+    # --- Pie Chart for Review Sentiment ---
+    st.markdown("#### Positive vs. Negative Reviews")
+    review_labels = ['Positive', 'Negative']
+    review_values = [positive_reviews, negative_reviews]
+    review_colors = ['#2ca02c', '#d62728'] # Green for positive, Red for negative
+
+    if total_reviews > 0:
+        fig_pie = go.Figure(data=[go.Pie(labels=review_labels, values=review_values, hole=.3,
+                                         marker_colors=review_colors,
+                                         hoverinfo="label+percent+value",
+                                         textinfo="label+percent",
+                                         textfont_size=15)])
+        fig_pie.update_layout(showlegend=True, margin=dict(t=50, b=0, l=0, r=0),
+                              title_text=f"Total Reviews: {int(total_reviews)}")
+        render_chart(fig_pie, use_container_width=True)
+    else:
+        st.info("No reviews to display pie chart.")
+
+    # --- Display Keywords ---
+    st.markdown("#### Most Repeated Keywords")
+    col_pos_keywords, col_neg_keywords = st.columns(2)
+
+    with col_pos_keywords:
+        st.markdown("##### Positive Keywords")
+        pos_keywords = hospital_data['positive_keywords']
+        if not pos_keywords:
+            st.info("No positive keywords available.")
+        else:
+            st.write('; '.join(pos_keywords))
+
+    with col_neg_keywords:
+        st.markdown("##### Negative Keywords")
+        neg_keywords = hospital_data['negative_keywords']
+        if not neg_keywords:
+            st.info("No negative keywords available.")
+        else:
+            st.write('; '.join(neg_keywords))
+
+    # --- Trend and Forecast (parameters come from the cached per-hospital fits) ---
+    st.markdown("#### Trend and Forecast")
+    col_metric, col_horizon = st.columns(2)
+    forecast_metric = col_metric.selectbox("Metric:", list(FORECAST_METRICS), format_func=FORECAST_METRICS.get,
+                                           key="hospital_forecast_metric")
+    forecast_horizon = col_horizon.slider("Forecast years:", min_value=1, max_value=5, value=3,
+                                          key="hospital_forecast_horizon")
+    rows = hospital_rows(selected_hospital, hospital_filter)[:MAX_FORECAST_BRANCHES]
+    matrices = year_matrices()
+    history_years = matrices['years']
+    forecast = hospital_forecast(rows, forecast_metric, forecast_horizon)
+    fig_trend = go.Figure()
+    for i, row in enumerate(rows):
+        branch = f"{df_hospitals['State'].iloc[row]} #{i + 1}" if len(rows) > 1 else selected_hospital
+        band = forecast.loc[row]
+        forecast_years = band.index.tolist()
+        fig_trend.add_trace(go.Scatter(x=forecast_years + forecast_years[::-1],
+                                       y=band['upper'].tolist() + band['lower'].tolist()[::-1],
+                                       fill='toself', line=dict(width=0), opacity=0.2, hoverinfo='skip',
+                                       showlegend=False, legendgroup=branch))
+        history = matrices[forecast_metric][row]
+        fig_trend.add_trace(go.Scatter(x=history_years, y=history, mode='lines+markers', name=branch,
+                                       legendgroup=branch))
+        # Start the forecast line at the last observed point so it joins the history.
+        fig_trend.add_trace(go.Scatter(x=[history_years[-1]] + forecast_years,
+                                       y=[history[-1]] + band['forecast'].tolist(), mode='lines',
+                                       line=dict(dash='dash'), name=f"{branch} (forecast)", legendgroup=branch))
+    fig_trend.update_layout(title=f"{FORECAST_METRICS[forecast_metric]}: history and linear-trend forecast",
+                            xaxis_title='Year', yaxis_title=FORECAST_METRICS[forecast_metric],
+                            margin=dict(t=50, b=0, l=0, r=0))
+    render_chart(fig_trend, use_container_width=True)
+    caption = "Shaded: 95% prediction interval of each branch's linear trend over every year in the data."
+    if hospital_data['branches'] > len(rows):
+        caption += f" Showing the first {len(rows)} of {hospital_data['branches']} branches."
+    st.caption(caption)
+
+else:
+    st.info("No hospital matches the search. Try another spelling, Emirate or filter.")
+
+st.markdown("---")
+st.write("Gain insights into hospital performance through customer reviews and key feedback themes.")
+
+end_run()
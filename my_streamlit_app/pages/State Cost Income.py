@@ -1,89 +1,118 @@
-import streamlit as st
-import pandas as pd
-import plotly.express as px
-import os
-
-st.title("💰 State Cost vs. Income Analysis")
-st.markdown("---")
-
-app_directory = os.path.dirname(os.path.abspath(__file__))
-data_directory = os.path.abspath(os.path.join(app_directory, os.pardir))
-HOSPITALS_DATA_PATH = os.path.join(data_directory, "UAE_hospitals_data.csv")
-
-df_hospitals = pd.DataFrame()
-if os.path.exists(HOSPITALS_DATA_PATH):
-    try:
-        df_hospitals = pd.read_csv(HOSPITALS_DATA_PATH)
-    except Exception as e:
-        st.error(f"Error reading hospital data file: {e}. Please ensure 'UAE_hospitals_data.csv' is in your main project folder.")
-else:
-    st.error(f"Hospital data file '{os.path.basename(HOSPITALS_DATA_PATH)}' not found. Please ensure it's in your main project folder: `{HOSPITALS_DATA_PATH}`.")
-
-years = [2020, 2021, 2022, 2023, 2024, 2025]
-cost_cols = [f'total cost of the hospital in {year} (million AED)' for year in years]
-income_cols = [f'total income of the hospital in {year} (million AED)' for year in years]
-
-
-required_cols_for_plot = ['State'] + cost_cols + income_cols
-
-if not df_hospitals.empty and all(col in df_hospitals.columns for col in required_cols_for_plot):
-    states = df_hospitals['State'].unique().tolist()
-    states.sort()
-
-    st.sidebar.header("Select Emirate (State)")
-    selected_state = st.sidebar.selectbox(
-        "Choose an Emirate to view its trends:",
-        states,
-        key="state_selector"
-    )
-
-    st.subheader(f"Financial Trends in {selected_state} (2020-2025)")
-
-    df_state = df_hospitals[df_hospitals['State'] == selected_state].copy()
-
-    state_costs = [df_state[col].sum() for col in cost_cols]
-    state_incomes = [df_state[col].sum() for col in income_cols]
-    # st.info(state_costs[0])
-
-    plot_df = pd.DataFrame({
-        'Year': years,
-        'Total Cost (Million AED)': state_costs,
-        'Total Income (Million AED)': state_incomes
-    })
-    st.dataframe(plot_df.head(5))
-    # st.info(plot_df['Year'].dtypes)
-    # st.info(plot_df['Total Cost (Million AED)'].dtypes)
-    y_sorted1 = plot_df['Total Cost (Million AED)'].sort_values()
-    y_sorted2 = plot_df['Total Income (Million AED)'].sort_values()
-    y_min1 = y_sorted1.min()
-    y_max1 = y_sorted1.max()
-    y_min2 = y_sorted2.min()
-    y_max2 = y_sorted2.max()
-    df_long = plot_df.melt(id_vars='Year', value_vars=['Total Cost (Million AED)', 'Total Income (Million AED)'], 
-                  var_name='Line', value_name='Value')
-
-    fig = px.line(df_long, x='Year', y='Value', color='Line',
-                  title=f'Hospital Financial Performance in {selected_state}',
-                  labels={'value': 'Amount (Million AED)', 'variable': 'Metric'},
-                  # hover_data={'Total Cost (Million AED)': ':.2f','Year': True},
-                  # hover_data={'Total Cost (Million AED)': ':.2f','Total Income (Million AED)': ':.2f','Year': True},
-                  line_shape="linear"
-                 )
-
-
-
-    fig.update_layout(xaxis=dict(showline=True,linecolor='black',linewidth=1),yaxis=dict(showline=True,linecolor='black',linewidth=1))
-    fig.update_xaxes(tickmode='linear', dtick=1)
-    fig.update_yaxes(rangemode="tozero")
-    fig.update_layout(hovermode="x unified")
-    fig.update_layout(xaxis_range=[2020, 2025])
-    fig.update_layout(yaxis_range=[min(y_min1,y_min2), max(y_max1,y_max2)])
-
-
-    st.plotly_chart(fig, use_container_width=True)
-
-else:
-    st.warning("Data is incomplete or required financial columns (e.g., 'total cost of the hospital in 2020 (million AED)') or 'State' column are missing in the hospital data file.")
-
-st.markdown("---")
-st.write("Analyze the financial trends of healthcare institutions across different Emirates.")
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from hospital_data import load_hospitals_for_page
+from hospital_filters import filter_sidebar
+from hospital_metrics import available_years, metric_totals
+from hospital_forecast import state_forecast
+from figure_cache import cached_figure
+from instrumentation import end_run, render_chart
+
+st.title("💰 State Cost vs. Income Analysis")
+st.markdown("---")
+
+df_hospitals = load_hospitals_for_page()
+
+hospital_filter = filter_sidebar(df_hospitals) if not df_hospitals.empty else None
+if hospital_filter is not None and hospital_filter.restricts_rows and len(hospital_filter.rows()) == 0:
+    st.warning("No hospitals match the selected filters.")
+    st.stop()
+
+# Cost and income for every Emirate and every year, aggregated in one cached pass.
+state_totals = metric_totals(hospital_filter=hospital_filter) if not df_hospitals.empty else pd.DataFrame()
+years = hospital_filter.select_years(available_years()) if not df_hospitals.empty else []
+
+if not state_totals.empty and {'cost', 'income'}.issubset(state_totals.columns):
+    states = state_totals.index.get_level_values('State').unique().tolist()
+    states.sort()
+
+    st.sidebar.header("Select Emirate (State)")
+    selected_state = st.sidebar.selectbox(
+        "Choose an Emirate to view its trends:",
+        states,
+        key="state_selector"
+    )
+    horizon = st.sidebar.slider("Forecast years:", min_value=0, max_value=5, value=3, key="forecast_horizon")
+
+    st.subheader(f"Financial Trends in {selected_state} ({years[0]}-{years[-1]})")
+
+    state_trend = state_totals.loc[selected_state].loc[years]
+
+    plot_df = pd.DataFrame({
+        'Year': state_trend.index.to_numpy(),
+        'Total Cost (Million AED)': state_trend['cost'].to_numpy(),
+        'Total Income (Million AED)': state_trend['income'].to_numpy()
+    })
+    st.dataframe(plot_df.head(5))
+    # The melt, Plotly Express call and layout updates run only on a figure cache miss;
+    # repeat views of the same Emirate, years, filter and horizon reuse the serialized figure.
+    show_forecast = horizon > 0 and len(years) >= 3
+
+    def build_trend_figure():
+        # st.info(plot_df['Year'].dtypes)
+        # st.info(plot_df['Total Cost (Million AED)'].dtypes)
+        y_sorted1 = plot_df['Total Cost (Million AED)'].sort_values()
+        y_sorted2 = plot_df['Total Income (Million AED)'].sort_values()
+        y_min1 = y_sorted1.min()
+        y_max1 = y_sorted1.max()
+        y_min2 = y_sorted2.min()
+        y_max2 = y_sorted2.max()
+        df_long = plot_df.melt(id_vars='Year', value_vars=['Total Cost (Million AED)', 'Total Income (Million AED)'], 
+                      var_name='Line', value_name='Value')
+
+        fig = px.line(df_long, x='Year', y='Value', color='Line',
+                      title=f'Hospital Financial Performance in {selected_state}',
+                      labels={'value': 'Amount (Million AED)', 'variable': 'Metric'},
+                      # hover_data={'Total Cost (Million AED)': ':.2f','Year': True},
+                      # hover_data={'Total Cost (Million AED)': ':.2f','Total Income (Million AED)': ':.2f','Year': True},
+                      line_shape="linear"
+                     )
+
+
+
+        fig.update_layout(xaxis=dict(showline=True,linecolor='black',linewidth=1),yaxis=dict(showline=True,linecolor='black',linewidth=1))
+        fig.update_xaxes(tickmode='linear', dtick=1)
+        fig.update_yaxes(rangemode="tozero")
+        fig.update_layout(hovermode="x unified")
+        fig.update_layout(xaxis_range=[years[0], years[-1]])
+        fig.update_layout(yaxis_range=[min(y_min1,y_min2), max(y_max1,y_max2)])
+
+
+        # --- Forecast bands (linear trend fitted on the selected years, 95% prediction interval) ---
+        forecast_years = []
+        if show_forecast:
+            line_colors = {trace.name: trace.line.color for trace in fig.data}
+            for metric, name in [('cost', 'Total Cost (Million AED)'), ('income', 'Total Income (Million AED)')]:
+                band = state_forecast(metric, horizon, hospital_filter).loc[selected_state]
+                forecast_years = band.index.tolist()
+                # Start the forecast line at the last observed point so it joins the history.
+                x = [years[-1]] + forecast_years
+                y = [state_trend[metric].iloc[-1]] + band['forecast'].tolist()
+                fig.add_trace(go.Scatter(x=forecast_years + forecast_years[::-1],
+                                         y=band['upper'].tolist() + band['lower'].tolist()[::-1],
+                                         fill='toself', fillcolor=line_colors[name], opacity=0.15, line_width=0,
+                                         hoverinfo='skip', showlegend=False))
+                fig.add_trace(go.Scatter(x=x, y=y, mode='lines', name=f'{name} (forecast)',
+                                         line=dict(color=line_colors[name], dash='dash')))
+                y_min1 = min(y_min1, band['lower'].min())
+                y_max1 = max(y_max1, band['upper'].max())
+            fig.update_layout(xaxis_range=[years[0], forecast_years[-1]],
+                              yaxis_range=[min(y_min1, y_min2), max(y_max1, y_max2)])
+        return fig
+
+    fig = cached_figure('state_cost_income', (selected_state, tuple(years), horizon, hospital_filter), build_trend_figure)
+    if show_forecast:
+        st.caption(f"Dashed lines extend the {years[0]}-{years[-1]} linear trend; shaded bands are 95% prediction intervals.")
+    elif horizon > 0:
+        st.caption("Select at least three years to show a forecast.")
+
+    render_chart(fig, use_container_width=True)
+
+else:
+    st.warning("Data is incomplete or required financial columns (e.g., 'total cost of the hospital in 2020 (million AED)') or 'State' column are missing in the hospital data file.")
+
+st.markdown("---")
+st.write("Analyze the financial trends of healthcare institutions across different Emirates.")
+
+end_run()
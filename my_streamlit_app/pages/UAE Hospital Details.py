@@ -1,84 +1,190 @@
-import streamlit as st
-import pandas as pd
-import plotly.express as px
-import os
-
-# --- Page Configuration (Optional for sub-pages, but good for clarity) ---
-# st.set_page_config(page_title="UAE Hospitals Map", page_icon="🗺️")
-
-st.title("🗺️ Interactive UAE Hospitals Map")
-st.markdown("---")
-
-# --- Define Paths for Data ---
-app_directory = os.path.dirname(os.path.abspath(__file__))
-# نرجع خطوة للخلف للوصول إلى المجلد الرئيسي حيث يوجد ملف UAE_hospitals_data.csv
-data_directory = os.path.abspath(os.path.join(app_directory, os.pardir))
-HOSPITALS_DATA_PATH = os.path.join(data_directory, "UAE_hospitals_data.csv")
-
-# st.info(f"مجلد البيانات (المتوقع لملف المستشفيات): **`{data_directory}`**")
-# st.warning(f"تأكد أن ملف '{os.path.basename(HOSPITALS_DATA_PATH)}' موجود في هذا المسار لتجنب الأخطاء.")
-
-# --- Load Data ---
-df_hospitals = pd.DataFrame() # تعريف DataFrame فارغ مبدئياً
-if os.path.exists(HOSPITALS_DATA_PATH):
-    try:
-        df_hospitals = pd.read_csv(HOSPITALS_DATA_PATH)
-        st.success(f"تم تحميل بيانات المستشفيات بنجاح من: `{os.path.basename(HOSPITALS_DATA_PATH)}`")
-        st.dataframe(df_hospitals.head()) # عرض أول 5 صفوف من البيانات
-    except Exception as e:
-        st.error(f"حدث خطأ أثناء قراءة ملف بيانات المستشفيات: {e}")
-else:
-    st.error(f"ملف بيانات المستشفيات '{os.path.basename(HOSPITALS_DATA_PATH)}' غير موجود في المسار المحدد: `{HOSPITALS_DATA_PATH}`.")
-    st.info("الرجاء التأكد من وجود ملف 'UAE_hospitals_data.csv' في المجلد الرئيسي لمشروعك.")
-
-# --- Check for essential columns before plotting ---
-required_columns = ['Location_Lat', 'Location_Lon', 'Name of hospital or clinic']
-if not df_hospitals.empty and all(col in df_hospitals.columns for col in required_columns):
-    # Drop rows with missing latitude or longitude
-    df_hospitals.dropna(subset=['Location_Lat', 'Location_Lon'], inplace=True)
-
-    st.subheader("Interactive Map of UAE Hospitals")
-
-    # Define hover data columns
-    hover_cols = [
-        'Hospital rate',
-        # 'State',
-        'Number of Doctors',
-        'Number of patients in 2020',
-        # 'Types of treatment it contains',
-        'total cost of the hospital in 2020 (million AED)',
-        'total income of the hospital in 2020 (million AED)',
-        'total number of surgeries in 2020'
-    ]
-
-    # Filter hover_cols to only include columns that actually exist in the DataFrame
-    existing_hover_cols = [col for col in hover_cols if col in df_hospitals.columns]
-
-    if not df_hospitals.empty:
-        # Create the interactive map using Plotly Express
-        fig = px.scatter_mapbox(df_hospitals,
-                                lat="Location_Lat",
-                                lon="Location_Lon",
-                                hover_name="Name of hospital or clinic", # الاسم الذي يظهر في التلميح الرئيسي
-                                hover_data=existing_hover_cols, # البيانات الإضافية التي تظهر عند التمرير
-                                color="State", # تلوين النقاط حسب الولاية (اختياري)
-                                zoom=7, # مستوى التكبير الأولي (7 مناسب للإمارات)
-                                center={"lat": 24.4539, "lon": 54.3773}, # مركز الخريطة (أبوظبي)
-                                mapbox_style="open-street-map", # نوع الخريطة (يمكنك تجربة "carto-positron", "stamen-terrain", etc.)
-                                title="Hospitals and Clinics Across the UAE"
-                               )
-
-        # تحديث حجم النقط (اختياري)
-        fig.update_traces(marker=dict(size=10, opacity=0.8))
-        # تحديث هوامش الخريطة (اختياري)
-        fig.update_layout(margin={"r":0,"t":50,"l":0,"b":0})
-
-        st.plotly_chart(fig, use_container_width=True)
-    else:
-        st.warning("لا توجد بيانات مستشفيات صالحة لعرضها على الخريطة بعد إزالة الصفوف المفقودة.")
-
-else:
-    st.warning("البيانات غير مكتملة أو الأعمدة المطلوبة (Location_Lat, Location_Lon, Name of hospital or clinic) غير موجودة في ملف المستشفيات.")
-
-st.markdown("---")
-st.write("استكشف مواقع المستشفيات والبيانات الرئيسية الخاصة بها على الخريطة التفاعلية.")
+import streamlit as st
+import plotly.express as px
+import plotly.graph_objects as go
+import pandas as pd
+import os
+from hospital_data import HOSPITALS_DATA_PATH, load_hospitals_for_page
+from hospital_filters import filter_sidebar
+from map_clusters import CLUSTER_MAX_ZOOM, clusters_in_bbox, rows_in_bbox, state_centers, viewport_bbox
+from spatial_index import circle, nearest, nearest_many, within_radius, within_radius_many
+from cache_warmup import warmup_spinner
+from instrumentation import end_run, render_chart
+
+# --- Page Configuration (Optional for sub-pages, but good for clarity) ---
+# st.set_page_config(page_title="UAE Hospitals Map", page_icon="🗺️")
+
+st.title("🗺️ Interactive UAE Hospitals Map")
+st.markdown("---")
+
+# --- Load Data ---
+# البيانات تُقرأ مرة واحدة لكل عملية وتُشارك بين جميع الصفحات
+df_hospitals = load_hospitals_for_page()
+if not df_hospitals.empty:
+    st.success(f"تم تحميل بيانات المستشفيات بنجاح من: `{os.path.basename(HOSPITALS_DATA_PATH)}`")
+    # معاينة البيانات عند الطلب فقط لتقليل حجم البيانات المرسلة في كل تشغيل
+    if st.checkbox("عرض أول 5 صفوف من البيانات", value=False, key="map_show_preview"):
+        st.dataframe(df_hospitals.head())
+
+# --- Check for essential columns before plotting ---
+required_columns = ['Location_Lat', 'Location_Lon', 'Name of hospital or clinic']
+if not df_hospitals.empty and all(col in df_hospitals.columns for col in required_columns):
+    st.subheader("Interactive Map of UAE Hospitals")
+    hospital_filter = filter_sidebar(df_hospitals)
+
+    # --- Viewport Controls ---
+    # Streamlit does not report the map's pan/zoom back to the script, so the
+    # viewport is chosen here and only the markers inside it are sent.
+    st.sidebar.header("Map View")
+    centers = state_centers()
+    focus = st.sidebar.selectbox("Center the map on:", ['All UAE'] + centers.index.astype(str).tolist(), key="map_focus")
+    zoom = st.sidebar.slider("Zoom level:", min_value=5, max_value=14, value=7, key="map_zoom",
+                             help=f"Below zoom {CLUSTER_MAX_ZOOM} nearby hospitals are grouped into clusters.")
+    if focus == 'All UAE':
+        center = {"lat": 24.4539, "lon": 54.3773} # مركز الخريطة (أبوظبي)
+    else:
+        center = {"lat": float(centers.loc[focus, 'Location_Lat']), "lon": float(centers.loc[focus, 'Location_Lon'])}
+    bbox = viewport_bbox(center["lat"], center["lon"], zoom)
+
+    # --- Nearest Facilities ---
+    # Searches use the spatial index and respect the global filter (rating, treatments, ...)
+    st.sidebar.header("Nearest Facilities")
+    search = st.sidebar.radio("Find:", ['Off', 'Nearest facilities', 'Within a radius'], key="map_search")
+    nearby, radius_km = None, None
+    if search != 'Off':
+        origin = dict(center)
+        if st.sidebar.radio("Around:", ['Map center', 'Custom point'], horizontal=True, key="map_search_origin") == 'Custom point':
+            origin = {"lat": st.sidebar.number_input("Latitude:", -90.0, 90.0, 25.2048, format="%.4f", key="map_search_lat"),
+                      "lon": st.sidebar.number_input("Longitude:", -180.0, 180.0, 55.2708, format="%.4f", key="map_search_lon")}
+        with warmup_spinner('map'):
+            if search == 'Nearest facilities':
+                count = st.sidebar.slider("Number of facilities:", 1, 50, 5, key="map_search_count")
+                nearby = nearest(origin["lat"], origin["lon"], count, hospital_filter)
+            else:
+                radius_km = st.sidebar.slider("Radius (km):", 1, 100, 10, key="map_search_radius")
+                nearby = within_radius(origin["lat"], origin["lon"], radius_km, hospital_filter)
+        nearby = pd.concat([df_hospitals.iloc[nearby['row']].reset_index(drop=True), nearby['distance_km'].round(2)], axis=1)
+
+    def add_search_overlay(fig):
+        # Highlight the search results (and the search radius) on top of the map markers
+        if nearby is None:
+            return
+        if radius_km is not None:
+            circle_lat, circle_lon = circle(origin["lat"], origin["lon"], radius_km)
+            fig.add_trace(go.Scattermapbox(lat=circle_lat, lon=circle_lon, mode='lines', line=dict(color='crimson', width=2),
+                                           name=f'{radius_km} km', hoverinfo='skip'))
+        fig.add_trace(go.Scattermapbox(lat=nearby['Location_Lat'], lon=nearby['Location_Lon'], mode='markers',
+                                       marker=dict(size=14, color='crimson', opacity=0.9), name='Search results',
+                                       text=nearby['Name of hospital or clinic'],
+                                       customdata=nearby['distance_km'],
+                                       hovertemplate='%{text}<br>%{customdata:.2f} km<extra></extra>'))
+        fig.add_trace(go.Scattermapbox(lat=[origin["lat"]], lon=[origin["lon"]], mode='markers',
+                                       marker=dict(size=18, color='black'), name='Search point',
+                                       hovertemplate='Search point<extra></extra>'))
+
+    if zoom < CLUSTER_MAX_ZOOM:
+        # One marker per grid cell: centroid sized by the number of hospitals it holds
+        with warmup_spinner('map'):
+            clusters = clusters_in_bbox(zoom, bbox, hospital_filter)
+        if not clusters.empty:
+            fig = px.scatter_mapbox(clusters,
+                                    lat="Location_Lat",
+                                    lon="Location_Lon",
+                                    size="Hospitals",
+                                    color="State",
+                                    hover_data={'Hospitals': True, 'Location_Lat': False, 'Location_Lon': False},
+                                    size_max=30,
+                                    zoom=zoom,
+                                    center=center,
+                                    mapbox_style="open-street-map",
+                                    title="Hospitals and Clinics Across the UAE (clustered)"
+                                   )
+            fig.update_layout(margin={"r":0,"t":50,"l":0,"b":0})
+            add_search_overlay(fig)
+            render_chart(fig, use_container_width=True)
+            st.caption(f"{len(clusters):,} clusters covering {int(clusters['Hospitals'].sum()):,} hospitals in view. "
+                       f"Zoom to {CLUSTER_MAX_ZOOM} or more to see individual facilities.")
+        else:
+            st.warning("لا توجد مستشفيات في نطاق الخريطة المحدد.")
+    else:
+        # Define hover data columns
+        hover_cols = [
+            'Hospital rate',
+            # 'State',
+            'Number of Doctors',
+            'Number of patients in 2020',
+            # 'Types of treatment it contains',
+            'total cost of the hospital in 2020 (million AED)',
+            'total income of the hospital in 2020 (million AED)',
+            'total number of surgeries in 2020'
+        ]
+
+        # Filter hover_cols to only include columns that actually exist in the DataFrame
+        existing_hover_cols = [col for col in hover_cols if col in df_hospitals.columns]
+
+        # Only the facilities inside the visible bounding box (grid index lookup)
+        df_visible = df_hospitals.iloc[rows_in_bbox(bbox, hospital_filter)]
+
+        if not df_visible.empty:
+            # Create the interactive map using Plotly Express
+            fig = px.scatter_mapbox(df_visible,
+                                    lat="Location_Lat",
+                                    lon="Location_Lon",
+                                    hover_name="Name of hospital or clinic", # الاسم الذي يظهر في التلميح الرئيسي
+                                    hover_data=existing_hover_cols, # البيانات الإضافية التي تظهر عند التمرير
+                                    color="State", # تلوين النقاط حسب الولاية (اختياري)
+                                    zoom=zoom,
+                                    center=center,
+                                    mapbox_style="open-street-map", # نوع الخريطة (يمكنك تجربة "carto-positron", "stamen-terrain", etc.)
+                                    title="Hospitals and Clinics Across the UAE"
+                                   )
+
+            # تحديث حجم النقط (اختياري)
+            fig.update_traces(marker=dict(size=10, opacity=0.8))
+            # تحديث هوامش الخريطة (اختياري)
+            fig.update_layout(margin={"r":0,"t":50,"l":0,"b":0})
+            add_search_overlay(fig)
+
+            render_chart(fig, use_container_width=True)
+            st.caption(f"{len(df_visible):,} facilities in view.")
+        else:
+            st.warning("لا توجد بيانات مستشفيات صالحة لعرضها على الخريطة بعد إزالة الصفوف المفقودة.")
+
+    # --- Search Results ---
+    if nearby is not None:
+        st.subheader("Nearest Facilities" if radius_km is None else f"Facilities within {radius_km} km")
+        if nearby.empty:
+            st.info("No facility matches the search and the global filters.")
+        else:
+            st.dataframe(nearby[['Name of hospital or clinic', 'State', 'Hospital rate', 'distance_km']]
+                         .rename(columns={'distance_km': 'Distance (km)'}), hide_index=True, use_container_width=True)
+
+    # --- Catchment Analysis ---
+    # Batch queries: nearest facility and facilities within a radius for every uploaded point (e.g. districts)
+    with st.expander("Catchment analysis for many points"):
+        uploaded = st.file_uploader("CSV with a name and `lat`, `lon` columns:", type="csv", key="map_catchment_file")
+        catchment_km = st.slider("Catchment radius (km):", 1, 100, 10, key="map_catchment_radius")
+        if uploaded is not None:
+            try:
+                points = pd.read_csv(uploaded)
+            except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as error:
+                st.error(f"Could not read the file as a UTF-8 CSV: {error}")
+            else:
+                if not {'lat', 'lon'} <= set(points.columns):
+                    st.error("The file needs `lat` and `lon` columns.")
+                else:
+                    lats, lons = pd.to_numeric(points['lat'], errors='coerce'), pd.to_numeric(points['lon'], errors='coerce')
+                    rows, distances = nearest_many(lats, lons, 1, hospital_filter)
+                    names = df_hospitals['Name of hospital or clinic'].to_numpy()
+                    points['Nearest facility'] = [names[row] if row >= 0 else None for row in rows[:, 0]]
+                    points['Nearest (km)'] = distances[:, 0].round(2)
+                    points[f'Facilities within {catchment_km} km'] = [
+                        len(found) for found in within_radius_many(lats, lons, catchment_km, hospital_filter)]
+                    st.dataframe(points, hide_index=True, use_container_width=True)
+
+else:
+    st.warning("البيانات غير مكتملة أو الأعمدة المطلوبة (Location_Lat, Location_Lon, Name of hospital or clinic) غير موجودة في ملف المستشفيات.")
+
+st.markdown("---")
+st.write("استكشف مواقع المستشفيات والبيانات الرئيسية الخاصة بها على الخريطة التفاعلية.")
+
+end_run()
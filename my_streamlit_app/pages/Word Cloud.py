@@ -1,43 +1,58 @@
-import streamlit as st
-import os
-
-st.title("📸 Charts")
-st.markdown("---")
-
-# Define the directory where your images are stored
-# This assumes 'assets' is in the main project directory, one level up from 'pages'
-script_dir = os.path.dirname(os.path.abspath(__file__))
-ASSETS_DIR = os.path.abspath(os.path.join(script_dir, os.pardir, "Word Cloud"))
-
-st.write("""Explore a visual journey for Word Cloud of medial data reviews in the UAE.""")
-
-st.markdown("---") # Initial separator
-
-# Check if the assets directory exists
-if os.path.exists(ASSETS_DIR) and os.path.isdir(ASSETS_DIR):
-    # List all files in the assets directory
-    all_files = os.listdir(ASSETS_DIR)
-
-    # Filter for common image file extensions
-    image_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.tiff')
-    image_files = [f for f in all_files if f.lower().endswith(image_extensions)]
-
-    # Sort the image files alphabetically for consistent display
-    image_files.sort()
-
-    if not image_files:
-        st.warning(f"No image files found in the directory: {ASSETS_DIR}")
-    else:
-        # Loop through the image files and display each image with its filename as caption
-        for img_file in image_files:
-            image_path = os.path.join(ASSETS_DIR, img_file)
-            # Create caption from filename by removing the extension
-            caption = os.path.splitext(img_file)[0].replace('_', ' ').replace('-', ' ').title()
-
-            st.image(image_path, caption=caption, use_container_width=True)
-            st.markdown("---") # Separator after each image
-else:
-    st.error(f"Image assets directory not found: `{ASSETS_DIR}`. Please ensure your 'assets' folder is in the main project directory.")
-
-
-st.write("Thank you for exploring our gallery.")
+import streamlit as st
+import plotly.express as px
+from hospital_data import load_hospitals_for_page
+from hospital_filters import filter_sidebar
+from keyword_engine import keyword_frequencies
+from cache_warmup import warmup_spinner
+from instrumentation import end_run, render_chart
+from figure_cache import cached_figure
+
+st.title("☁️ Word Cloud")
+st.markdown("---")
+
+st.write("""Explore the most frequent review keywords and treatment types of medical facilities in the UAE.""")
+
+st.markdown("---") # Initial separator
+
+# --- Load Data (shared, parsed once per process) ---
+df_hospitals = load_hospitals_for_page()
+if df_hospitals.empty:
+    st.warning("No data loaded to display word clouds.")
+    st.stop()
+
+# --- Sidebar Filters (Emirate, rating, ... are shared with the other pages) ---
+hospital_filter = filter_sidebar(df_hospitals)
+st.sidebar.header("Word Cloud Options")
+top_n = st.sidebar.slider("Number of terms:", min_value=5, max_value=50, value=25, key="wordcloud_top_n")
+
+# --- Helper function to draw a word cloud as a treemap (tile area = frequency) ---
+def create_word_cloud(kind, title, color_scale):
+    with warmup_spinner('keywords'):
+        freq = keyword_frequencies(kind, hospital_filter, top=top_n)
+    if freq.empty:
+        st.warning(f"No terms found for '{title}' with the selected filters.")
+        return
+
+    def build():
+        plot_df = freq.rename_axis('Term').reset_index()
+        fig = px.treemap(plot_df, path=['Term'], values='Count', color='Count',
+                         color_continuous_scale=color_scale, title=title)
+        fig.update_traces(textinfo='label+value', hovertemplate='%{label}: %{value:,}<extra></extra>')
+        fig.update_layout(margin=dict(t=50, b=0, l=0, r=0), coloraxis_showscale=False)
+        return fig
+
+    render_chart(cached_figure('treemap', (kind, top_n, title, color_scale, hospital_filter), build),
+                 use_container_width=True)
+
+tab_pos, tab_neg, tab_treat = st.tabs(["Positive Review Keywords", "Negative Review Keywords", "Treatments"])
+with tab_pos:
+    create_word_cloud('positive', 'Top Positive Review Keywords', 'Greens')
+with tab_neg:
+    create_word_cloud('negative', 'Top Negative Review Keywords', 'Reds')
+with tab_treat:
+    create_word_cloud('treatments', 'Most Common Treatments', 'Blues')
+
+st.markdown("---")
+st.write("Thank you for exploring our word clouds.")
+
+end_run()
@@ -0,0 +1,153 @@
+"""Correlations and least-squares fits for every pair of numeric columns.
+
+The scatter page used to leave users guessing which of the ~30 numeric
+columns are worth plotting against each other. ``build_pair_statistics``
+computes, for all pairs at once, the moment matrices of the columns:
+row counts, sums, sums of squares and cross products. Each block of rows
+costs a few matrix products, and missing values count as 0 with a 0/1
+presence mask, so every pair uses the rows where both of its columns are
+present. From those matrices come:
+
+- Pearson correlation, and Spearman correlation (Pearson on the columns'
+  ranks)
+- the least-squares line of every column on every other (slope, intercept)
+- the same counts, correlations and lines within each State
+
+The result is cached per dataset version (and per global filter, in a small
+LRU), so the heatmap and the trendline on the scatter page read
+coefficients rather than refitting on each rerun.
+
+Ranks are computed once per column over all its present values. When a
+pair has rows where only one of its columns is missing, Spearman is
+therefore an approximation. The bundled data has no such rows.
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from hospital_data import STATE_COL, cached_artifact, dataset_fingerprint, load_hospitals
+from instrumentation import track_cache
+
+EXCLUDED_COLUMNS = ['Location_Lat', 'Location_Lon']
+BLOCK_ROWS = 65_536
+
+
+def pair_columns(df):
+    """Numeric columns the scatter page offers (coordinates excluded)."""
+    return [col for col in df.select_dtypes(include=['number']).columns if col not in EXCLUDED_COLUMNS]
+
+
+def _moments(values):
+    """(count, sum, sum of squares, cross products) matrices; entry [i, j] covers rows where i and j are present."""
+    present = ~np.isnan(values)
+    mask = present.astype('float64')
+    filled = np.where(present, values, 0.0)
+    return mask.T @ mask, filled.T @ mask, (filled * filled).T @ mask, filled.T @ filled
+
+
+def _fits(n, sx, sxx, sxy):
+    # Column i as x and column j as y: sums of y are the transposed sums of x.
+    sy, syy = sx.T, sxx.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = n * sxy - sx * sy
+        var_x = n * sxx - sx * sx
+        var_y = n * syy - sy * sy
+        pearson = cov / np.sqrt(var_x * var_y)
+        slope = cov / var_x
+        intercept = (sy - slope * sx) / n
+    undefined = (n < 2) | (var_x <= 0) | (var_y <= 0)
+    for matrix in (pearson, slope, intercept):
+        matrix[undefined] = np.nan
+    return np.clip(pearson, -1, 1), slope, intercept
+
+
+def build_pair_statistics(df, rows=None):
+    """Pairwise statistics of ``pair_columns(df)`` over the rows at positions ``rows`` (all if None).
+
+    Returns a dict: ``columns``; ``n``, ``pearson``, ``spearman``, ``slope``
+    and ``intercept`` (p x p, ``slope[i, j]`` is the slope of column j on
+    column i); ``states`` with ``state_n``, ``state_pearson``,
+    ``state_slope`` and ``state_intercept`` (States x p x p).
+    """
+    columns = pair_columns(df)
+    frame = df[columns] if rows is None else df[columns].iloc[rows]
+    ranks = frame.rank(method='average')
+    states = df[STATE_COL] if rows is None else df[STATE_COL].iloc[rows]
+    labels = states.cat.categories if hasattr(states, 'cat') else pd.Index(sorted(states.dropna().unique()))
+    codes = pd.Categorical(states, categories=labels).codes
+    p, n_states = len(columns), len(labels)
+
+    total = [np.zeros((p, p)) for _ in range(4)]
+    ranked = [np.zeros((p, p)) for _ in range(4)]
+    by_state = [np.zeros((n_states, p, p)) for _ in range(4)]
+    for start in range(0, len(frame), BLOCK_ROWS):
+        block = frame.iloc[start:start + BLOCK_ROWS].to_numpy(dtype='float64')
+        for acc, moment in zip(total, _moments(block)):
+            acc += moment
+        for acc, moment in zip(ranked, _moments(ranks.iloc[start:start + BLOCK_ROWS].to_numpy(dtype='float64'))):
+            acc += moment
+        block_codes = codes[start:start + BLOCK_ROWS]
+        for state in np.unique(block_codes[block_codes >= 0]):
+            for acc, moment in zip(by_state, _moments(block[block_codes == state])):
+                acc[state] += moment
+
+    pearson, slope, intercept = _fits(*total)
+    spearman, _, _ = _fits(*ranked)
+    state_fits = [_fits(*(acc[state] for acc in by_state)) for state in range(n_states)]
+    return {
+        'columns': np.asarray(columns, dtype=object),
+        'n': total[0].astype('int64'),
+        'pearson': pearson,
+        'spearman': spearman,
+        'slope': slope,
+        'intercept': intercept,
+        'states': np.asarray([str(label) for label in labels], dtype=object),
+        'state_n': by_state[0].astype('int64'),
+        'state_pearson': np.array([fit[0] for fit in state_fits]).reshape(n_states, p, p),
+        'state_slope': np.array([fit[1] for fit in state_fits]).reshape(n_states, p, p),
+        'state_intercept': np.array([fit[2] for fit in state_fits]).reshape(n_states, p, p),
+    }
+
+
+@track_cache
+@lru_cache(maxsize=32)
+def _filtered_pair_statistics(fingerprint, hospital_filter):
+    return build_pair_statistics(load_hospitals(), hospital_filter.rows())
+
+
+def pair_statistics(hospital_filter=None):
+    """Pairwise statistics of every numeric column, for the hospitals kept by ``hospital_filter``."""
+    if hospital_filter is not None and hospital_filter.restricts_rows:
+        return _filtered_pair_statistics(dataset_fingerprint(), hospital_filter)
+    return cached_artifact('pair_statistics', build_pair_statistics)
+
+
+def pair_fit(x, y, hospital_filter=None):
+    """Statistics of the pair (``x``, ``y``): n, pearson, spearman and the line y = intercept + slope * x."""
+    stats = pair_statistics(hospital_filter)
+    position = {col: i for i, col in enumerate(stats['columns'])}
+    i, j = position[x], position[y]
+    return {key: stats[key][i, j].item() for key in ('n', 'pearson', 'spearman', 'slope', 'intercept')}
+
+
+def strongest_pairs(method='pearson', top=10, hospital_filter=None):
+    """The ``top`` distinct column pairs with the largest absolute ``method`` correlation."""
+    stats = pair_statistics(hospital_filter)
+    matrix, columns = stats[method], stats['columns']
+    upper_i, upper_j = np.triu_indices(len(columns), k=1)
+    values = matrix[upper_i, upper_j]
+    order = np.argsort(-np.nan_to_num(np.abs(values), nan=-1), kind='stable')[:top]
+    return pd.DataFrame({'X': columns[upper_i[order]], 'Y': columns[upper_j[order]], 'Correlation': values[order],
+                         'Hospitals': stats['n'][upper_i[order], upper_j[order]]})
+
+
+def state_pair_breakdown(x, y, hospital_filter=None):
+    """Per-State hospital count, Pearson correlation and line of ``y`` on ``x``."""
+    stats = pair_statistics(hospital_filter)
+    position = {col: i for i, col in enumerate(stats['columns'])}
+    i, j = position[x], position[y]
+    breakdown = pd.DataFrame({STATE_COL: stats['states'], 'Hospitals': stats['state_n'][:, i, j],
+                              'Pearson r': stats['state_pearson'][:, i, j], 'Slope': stats['state_slope'][:, i, j],
+                              'Intercept': stats['state_intercept'][:, i, j]})
+    return breakdown[breakdown['Hospitals'] > 0].reset_index(drop=True)
@@ -0,0 +1,69 @@
+"""Server-side point reduction for large scatter plots.
+
+Plotly sends every point to the browser, so figure size and frame time grow
+with the row count. These helpers keep both bounded: pick WebGL above a
+point threshold, downsample while preserving each category's share of the
+points, or bin the points into a 2-D density grid before anything is sent.
+"""
+import numpy as np
+import pandas as pd
+
+# Above this many points SVG rendering gets sluggish; switch traces to WebGL.
+WEBGL_POINT_THRESHOLD = 1000
+# Maximum number of individual points sent to the browser in reduced modes.
+MAX_POINTS = 5000
+
+
+def render_mode_for(n_points):
+    return 'webgl' if n_points > WEBGL_POINT_THRESHOLD else 'svg'
+
+
+def within_ranges(df, x_col, y_col, x_range=None, y_range=None):
+    """Rows whose x/y fall inside the given (min, max) ranges; None means unbounded."""
+    mask = np.ones(len(df), dtype=bool)
+    for col, bounds in ((x_col, x_range), (y_col, y_range)):
+        if bounds is not None:
+            values = df[col].to_numpy()
+            mask &= (values >= bounds[0]) & (values <= bounds[1])
+    return df[mask]
+
+
+def stratified_sample(df, n, by=None, seed=0):
+    """Return at most ``n`` rows, keeping each ``by`` group's share of the rows.
+
+    Every group keeps at least one row so rare categories stay visible. The
+    sample is deterministic for a given seed, so reruns do not make points jump.
+    """
+    if len(df) <= n:
+        return df
+    rng = np.random.default_rng(seed)
+    priority = rng.random(len(df))
+    if by is None:
+        keep = np.argpartition(priority, n)[:n]
+        return df.iloc[np.sort(keep)]
+    codes, uniques = pd.factorize(df[by], use_na_sentinel=False)
+    group_sizes = np.bincount(codes, minlength=len(uniques))
+    quotas = np.maximum(1, np.floor(group_sizes * (n / len(df)))).astype(np.int64)
+    # Rank rows by random priority inside their group; keep those under the quota.
+    order = np.lexsort((priority, codes))
+    starts = np.concatenate(([0], np.cumsum(group_sizes)[:-1]))
+    rank_in_group = np.empty(len(df), dtype=np.int64)
+    rank_in_group[order] = np.arange(len(df)) - np.repeat(starts, group_sizes)
+    keep = rank_in_group < quotas[codes]
+    return df[keep]
+
+
+def density_grid(x, y, bins=60, x_range=None, y_range=None):
+    """2-D histogram of the points: returns (counts, x_centers, y_centers).
+
+    ``counts`` is shaped (len(y_centers), len(x_centers)) as go.Heatmap expects.
+    """
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    value_range = None
+    if x_range is not None and y_range is not None:
+        value_range = [x_range, y_range]
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=bins, range=value_range)
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    return counts.T, x_centers, y_centers
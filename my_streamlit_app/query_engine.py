@@ -0,0 +1,155 @@
+"""Optional in-process SQL backend (DuckDB) for filtered aggregations.
+
+With ``HOSPITALS_QUERY_BACKEND=duckdb`` (and ``pip install duckdb``), the
+hospitals frame of each dataset version is exposed to an embedded DuckDB
+database as the Arrow table ``hospitals`` (zero-copy for the numeric
+columns, plus a ``row`` column holding each hospital's row position). The
+global filter becomes a parameterized ``WHERE`` clause, so DuckDB's
+multithreaded, vectorized scans read only the columns and rows a query
+needs. Nothing like the long metrics table or a filtered copy of the frame
+is materialized in pandas.
+
+hospital_metrics serves filtered State cubes and summaries from here, and
+the scatter page fetches only the columns it plots. ``query`` runs any
+other parameterized statement. Without DuckDB, or with the variable unset,
+everything stays on the pandas code paths.
+"""
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from hospital_data import RATE_COL, STATE_COL, cached_artifact, year_metric_columns
+from hospital_schema import SUMMARY_COLUMNS
+
+try:
+    import duckdb
+    import pyarrow as pa
+except ImportError:  # the backend is optional; pandas handles every query without it
+    duckdb = pa = None
+
+logger = logging.getLogger(__name__)
+
+BACKEND = os.environ.get('HOSPITALS_QUERY_BACKEND', 'pandas')
+TABLE = 'hospitals'
+DOCTORS_COL = 'Number of Doctors'
+TREATMENTS_COL = 'Types of treatment it contains'
+
+if BACKEND == 'duckdb' and duckdb is None:
+    logger.warning("HOSPITALS_QUERY_BACKEND=duckdb but duckdb is not installed; using pandas")
+
+_database = duckdb.connect() if duckdb is not None and BACKEND == 'duckdb' else None
+_local = threading.local()  # .cursor: (Arrow table, cursor with the table registered)
+
+
+def enabled():
+    """Whether queries go through DuckDB."""
+    return _database is not None
+
+
+def quote(column):
+    """``column`` as a SQL identifier (the CSV's column names contain spaces and brackets)."""
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _arrow_table(df):
+    return pa.Table.from_pandas(df.assign(row=np.arange(len(df), dtype='int64')), preserve_index=False)
+
+
+def _cursor():
+    # Views registered on a cursor are private to it, so each thread keeps one
+    # per dataset version; registering the Arrow table again takes ~2 ms.
+    table = cached_artifact('sql_table', _arrow_table)
+    cached = getattr(_local, 'cursor', None)
+    if cached is None or cached[0] is not table:
+        cursor = _database.cursor()
+        cursor.register(TABLE, table)
+        _local.cursor = cached = (table, cursor)
+    return cached[1], table
+
+
+def _where(hospital_filter, columns):
+    """SQL predicate and named parameters for ``hospital_filter`` (``columns``: those in the table)."""
+    if hospital_filter is None or not hospital_filter.restricts_rows:
+        return 'TRUE', {}
+    clauses, params = [], {}
+    if hospital_filter.states:
+        clauses.append(f"{quote(STATE_COL)} IN (SELECT unnest($states))")
+        params['states'] = list(hospital_filter.states)
+    if hospital_filter.ratings:
+        clauses.append(f"{quote(RATE_COL)} IN (SELECT unnest($ratings))")
+        params['ratings'] = list(hospital_filter.ratings)
+    if hospital_filter.doctors:
+        clauses.append(f"{quote(DOCTORS_COL)} BETWEEN $doctors_min AND $doctors_max")
+        params.update(doctors_min=hospital_filter.doctors[0], doctors_max=hospital_filter.doctors[1])
+    if hospital_filter.treatments or hospital_filter.excluded_treatments:
+        if TREATMENTS_COL in columns:
+            # Same tokens as keyword_engine: split on ';', trimmed.
+            terms = f"list_transform(string_split({quote(TREATMENTS_COL)}, ';'), t -> trim(t))"
+            if hospital_filter.treatments:
+                match = 'list_has_all' if hospital_filter.treatment_match == 'all' else 'list_has_any'
+                clauses.append(f"{match}({terms}, $treatments::VARCHAR[])")
+                params['treatments'] = list(hospital_filter.treatments)
+            if hospital_filter.excluded_treatments:
+                # Hospitals without any listed treatment offer none of the excluded ones either.
+                clauses.append(f"NOT coalesce(list_has_any({terms}, $excluded::VARCHAR[]), FALSE)")
+                params['excluded'] = list(hospital_filter.excluded_treatments)
+        else:  # text columns kept on disk (hospital_store): use the filter's row selection
+            clauses.append("row IN (SELECT unnest($rows))")
+            params['rows'] = hospital_filter.rows().tolist()
+    return ' AND '.join(clauses), params
+
+
+def query(sql, params=None, hospital_filter=None):
+    """Run ``sql`` (named ``$parameters``) against the ``hospitals`` table; returns a DataFrame.
+
+    A ``{where}`` placeholder in ``sql`` is replaced by the predicate of
+    ``hospital_filter`` (``TRUE`` if it keeps every row).
+    """
+    cursor, table = _cursor()
+    where, filter_params = _where(hospital_filter, table.column_names)
+    return cursor.execute(sql.replace('{where}', where), {**(params or {}), **filter_params}).fetchdf()
+
+
+def state_totals(hospital_filter=None):
+    """Per-State count and sum of every year metric column, long format (Year, Metric, State, count, sum).
+
+    Amounts are rounded to 4 decimals first, like hospital_metrics' long table.
+    """
+    table = cached_artifact('sql_table', _arrow_table)
+    specs = year_metric_columns(table.column_names)
+    aggregates = ', '.join(f"count({quote(col)}) AS n{i}, sum(round(CAST({quote(col)} AS DOUBLE), 4)) AS s{i}"
+                           for i, (col, _, _) in enumerate(specs))
+    wide = query(f"SELECT {quote(STATE_COL)} AS state, {aggregates} FROM {TABLE} "
+                 f"WHERE {{where}} AND {quote(STATE_COL)} IS NOT NULL GROUP BY 1", hospital_filter=hospital_filter)
+    return pd.concat([pd.DataFrame({'Year': year, 'Metric': metric, STATE_COL: wide['state'].astype(str),
+                                    'count': wide[f'n{i}'].to_numpy(dtype='int64'),
+                                    'sum': wide[f's{i}'].to_numpy(dtype='float64')})
+                      for i, (_, metric, year) in enumerate(specs)], ignore_index=True)
+
+
+def state_summary_totals(hospital_filter=None):
+    """Per-State hospital count and sums of the ``SUMMARY_COLUMNS`` (doctors, reviews), indexed by State name."""
+    table = cached_artifact('sql_table', _arrow_table)
+    sums = []
+    for key, col in SUMMARY_COLUMNS.items():
+        if col in table.column_names:
+            integral = pa.types.is_integer(table.schema.field(col).type)
+            sums.append(f"CAST(sum({quote(col)}) AS BIGINT) AS {key}" if integral else f"sum({quote(col)}) AS {key}")
+    summary = query(f"SELECT {quote(STATE_COL)} AS state, count(*) AS hospitals, {', '.join(sums)} FROM {TABLE} "
+                    f"WHERE {{where}} AND {quote(STATE_COL)} IS NOT NULL GROUP BY 1", hospital_filter=hospital_filter)
+    return summary.set_index(summary['state'].astype(str).rename(STATE_COL)).drop(columns='state')
+
+
+def select_rows(columns, hospital_filter=None, not_null=()):
+    """``columns`` of the filtered hospitals in row order, skipping rows where any ``not_null`` column is missing.
+
+    The frame is indexed by row position.
+    """
+    conditions = ''.join(f" AND {quote(col)} IS NOT NULL" for col in not_null)
+    names = ', '.join(quote(col) for col in dict.fromkeys(columns))
+    rows = query(f"SELECT row, {names} FROM {TABLE} WHERE {{where}}{conditions} ORDER BY row",
+                 hospital_filter=hospital_filter)
+    return rows.set_index('row').rename_axis(None)
@@ -0,0 +1,292 @@
+"""Host-wide sharing of the loaded dataset and its derived tables between server processes.
+
+Several Streamlit processes on one host each used to parse the dataset and
+build every derived table into private memory, so RSS grew with every
+worker. With ``HOSPITALS_SHARED_DIR`` set (ideally on tmpfs, e.g.
+``/dev/shm/uae-hospitals``), the first process to load a dataset version
+writes the typed frame and each derived table it builds into a directory
+for that version. Every process, the publisher included, then memory-maps
+those files read-only. The pages live once in the host's page cache, and
+a new worker attaches in milliseconds instead of loading and aggregating.
+
+Two file formats are used, each written to a temporary file and renamed
+into place so readers never see a partial file:
+
+- ``.arrow``: DataFrames and Arrow tables as one Arrow IPC record batch.
+  Numbers are stored as they are (NaN stays NaN, not a null), categoricals
+  as their integer codes with the categories in the schema metadata, and
+  strings as Arrow strings. Every column therefore maps back to pandas
+  without a copy.
+- ``.npbin``: dicts and lists of numpy arrays and plain values (term
+  matrices, spatial indexes, fits, ...). The layout is a JSON header
+  followed by the raw arrays, each viewed straight out of the mapping.
+
+Values of any other shape are simply not shared; the caller keeps its own
+copy. Attached arrays are read-only, like everything handed out by
+hospital_data. Only the ``KEEP_VERSIONS`` most recent versions of a data
+file are kept. A process still using an older version keeps its mapping
+after the files are removed.
+"""
+import hashlib
+import json
+import os
+import shutil
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+except ImportError:  # sharing needs pyarrow; without it every process loads its own copy
+    pa = ipc = None
+
+SHARED_DIR = os.environ.get('HOSPITALS_SHARED_DIR')
+KEEP_VERSIONS = 4
+ALIGNMENT = 64
+METADATA_KEY = b'hospitals_shared'
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def enabled():
+    return bool(SHARED_DIR) and pa is not None
+
+
+def version_dir(path, fingerprint):
+    digest = hashlib.sha1(repr((os.path.abspath(path), fingerprint)).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(SHARED_DIR, f"{os.path.splitext(os.path.basename(path))[0]}-{digest}")
+
+
+def _file(path, fingerprint, name, suffix):
+    return os.path.join(version_dir(path, fingerprint), quote(name, safe='') + suffix)
+
+
+def _write_atomic(target, write):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# --- DataFrames as Arrow IPC ---
+
+def _encode_column(values):
+    """(Arrow array, metadata) for one pandas column, chosen so it maps back without a copy."""
+    dtype = values.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        categories = dtype.categories
+        if not (categories.dtype.kind in 'iu' or pd.api.types.is_string_dtype(categories.dtype)):
+            raise _Unsupported(f"categories of type {categories.dtype}")
+        return pa.array(values.cat.codes.to_numpy()), {
+            'kind': 'categorical', 'categories': categories.tolist(), 'ordered': bool(dtype.ordered),
+            'strings': pd.api.types.is_string_dtype(categories.dtype)}
+    if isinstance(dtype, pd.StringDtype):
+        return pa.array(values.array.to_numpy(na_value=None), type=pa.large_string()), {
+            'kind': 'string', 'na': 'nan' if dtype.na_value is not pd.NA else 'na'}
+    if isinstance(dtype, np.dtype) and dtype.kind in 'biuf':
+        return pa.array(values.to_numpy(), from_pandas=False), {'kind': 'numpy'}
+    raise _Unsupported(f"column type {dtype}")
+
+
+def _decode_column(column, meta):
+    array = column.chunk(0) if column.num_chunks == 1 else pa.concat_arrays(column.chunks)
+    if meta['kind'] == 'categorical':
+        categories = pd.Index(meta['categories'], dtype='str' if meta['strings'] else None)
+        return pd.Categorical.from_codes(array.to_numpy(zero_copy_only=True), validate=False,
+                                         dtype=pd.CategoricalDtype(categories, ordered=meta['ordered']))
+    if meta['kind'] == 'string':
+        strings = pd.arrays.ArrowStringArray(pa.chunked_array([array]))
+        return strings if meta['na'] == 'na' else pd.Series(strings).astype(pd.StringDtype('pyarrow', na_value=np.nan)).array
+    return array.to_numpy(zero_copy_only=True)
+
+
+def _frame_to_table(df):
+    if not all(isinstance(col, str) for col in df.columns) or df.columns.has_duplicates:
+        raise _Unsupported("column labels must be unique strings")
+    index = df.index
+    if isinstance(index, pd.RangeIndex):
+        index_meta = {'range': [index.start, index.stop, index.step], 'name': index.name}
+        levels = {}
+    else:
+        index_meta = {'names': list(index.names)}
+        levels = {f'__index_{i}__': index.get_level_values(i).to_series(index=None) for i in range(index.nlevels)}
+    arrays, columns = [], {}
+    for name, values in [*levels.items(), *((col, df[col]) for col in df.columns)]:
+        array, meta = _encode_column(values.reset_index(drop=True))
+        arrays.append(array)
+        columns[name] = meta
+    meta = {'kind': 'frame', 'index': index_meta, 'columns': columns, 'rows': len(df)}
+    return pa.table(arrays, names=list(columns)).replace_schema_metadata({METADATA_KEY: json.dumps(meta)})
+
+
+def _table_to_frame(table, meta):
+    columns = {name: _decode_column(table.column(name), column_meta) for name, column_meta in meta['columns'].items()}
+    index_meta = meta['index']
+    if 'range' in index_meta:
+        index = pd.RangeIndex(*index_meta['range'], name=index_meta['name'])
+    else:
+        levels = [columns.pop(f'__index_{i}__') for i in range(len(index_meta['names']))]
+        index = pd.MultiIndex.from_arrays(levels, names=index_meta['names']) if len(levels) > 1 \
+            else pd.Index(levels[0], name=index_meta['names'][0])
+    return pd.DataFrame(columns, index=index, copy=False) if columns else pd.DataFrame(index=index)
+
+
+def _write_table(table, target):
+    def write(tmp_path):
+        with ipc.new_file(tmp_path, table.schema) as writer:
+            writer.write_table(table.combine_chunks(), max_chunksize=max(table.num_rows, 1))
+    _write_atomic(target, write)
+
+
+def _read_arrow(target):
+    table = ipc.open_file(pa.memory_map(target)).read_all()
+    meta = json.loads((table.schema.metadata or {}).get(METADATA_KEY, b'{"kind": "table"}'))
+    if meta['kind'] == 'frame':
+        return _table_to_frame(table, meta)
+    return table
+
+
+# --- Dicts / lists of arrays as .npbin ---
+
+def _pack(value, buffers, offset):
+    """JSON-able description of ``value``; array bytes are appended to ``buffers``. Returns (spec, offset)."""
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind in 'biuf':
+            offset += -offset % ALIGNMENT
+            data = np.ascontiguousarray(value)
+            buffers.append((offset, data))
+            return {'array': [offset, data.dtype.str, list(data.shape)]}, offset + data.nbytes
+        if value.dtype.kind == 'O' and value.ndim == 1 and all(isinstance(item, str) for item in value):
+            return {'strings': value.tolist()}, offset
+        raise _Unsupported(f"array of type {value.dtype}")
+    if isinstance(value, dict):
+        if not all(isinstance(key, str) for key in value):
+            raise _Unsupported("dict keys must be strings")
+        packed = {}
+        for key, item in value.items():
+            packed[key], offset = _pack(item, buffers, offset)
+        return {'dict': packed}, offset
+    if isinstance(value, (list, tuple)):
+        packed = []
+        for item in value:
+            spec, offset = _pack(item, buffers, offset)
+            packed.append(spec)
+        return {'tuple' if isinstance(value, tuple) else 'list': packed}, offset
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return {'value': value}, offset
+    raise _Unsupported(f"value of type {type(value).__name__}")
+
+
+def _unpack(spec, data):
+    if 'array' in spec:
+        offset, dtype, shape = spec['array']
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        return np.frombuffer(data, dtype=dtype, count=count, offset=offset).reshape(shape) if count \
+            else np.empty(shape, dtype=dtype)
+    if 'strings' in spec:
+        return np.array(spec['strings'], dtype=object)
+    if 'dict' in spec:
+        return {key: _unpack(item, data) for key, item in spec['dict'].items()}
+    if 'list' in spec:
+        return [_unpack(item, data) for item in spec['list']]
+    if 'tuple' in spec:
+        return tuple(_unpack(item, data) for item in spec['tuple'])
+    return spec['value']
+
+
+def _write_npbin(value, target):
+    buffers = []
+    spec, size = _pack(value, buffers, 0)
+    header = json.dumps(spec).encode('utf-8')
+    start = 8 + len(header)
+    start += -start % ALIGNMENT
+
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            f.write(len(header).to_bytes(8, 'little') + header)
+            for offset, array in buffers:
+                f.seek(start + offset)
+                f.write(array.tobytes())
+            f.truncate(start + size)
+    _write_atomic(target, write)
+
+
+def _read_npbin(target):
+    mapped = np.memmap(target, mode='r', dtype=np.uint8)
+    length = int.from_bytes(mapped[:8].tobytes(), 'little')
+    start = 8 + length
+    start += -start % ALIGNMENT
+    return _unpack(json.loads(mapped[8:8 + length].tobytes()), mapped[start:])
+
+
+# --- Public API ---
+
+def attach(path, fingerprint, name):
+    """The shared copy of ``name`` for this dataset version, memory-mapped read-only, or None."""
+    if not enabled():
+        return None
+    try:
+        target = _file(path, fingerprint, name, '.arrow')
+        if os.path.exists(target):
+            return _read_arrow(target)
+        target = _file(path, fingerprint, name, '.npbin')
+        if os.path.exists(target):
+            return _read_npbin(target)
+    except (OSError, ValueError, KeyError, pa.ArrowException):
+        return None  # unreadable (e.g. removed mid-read): the caller builds its own copy
+    return None
+
+
+def publish(path, fingerprint, name, value):
+    """Write ``value`` to the shared directory and return the attached copy.
+
+    Returns ``value`` itself when it cannot be shared (unsupported type,
+    sharing off, or the directory is not writable).
+    """
+    if not enabled():
+        return value
+    try:
+        if isinstance(value, pd.DataFrame):
+            _write_table(_frame_to_table(value), _file(path, fingerprint, name, '.arrow'))
+        elif isinstance(value, pa.Table):
+            _write_table(value, _file(path, fingerprint, name, '.arrow'))
+        else:
+            _write_npbin(value, _file(path, fingerprint, name, '.npbin'))
+    except (_Unsupported, OSError, pa.ArrowException):
+        return value
+    attached = attach(path, fingerprint, name)
+    return value if attached is None else attached
+
+
+def prune(path):
+    """Remove all but the ``KEEP_VERSIONS`` most recently created version directories of ``path``."""
+    if not enabled() or not os.path.isdir(SHARED_DIR):
+        return
+    prefix = f"{os.path.splitext(os.path.basename(path))[0]}-"
+    versions = sorted((entry for entry in os.scandir(SHARED_DIR) if entry.is_dir() and entry.name.startswith(prefix)),
+                      key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in versions[KEEP_VERSIONS:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def shared_tables(path, fingerprint):
+    """Name -> size in bytes of every table published for this dataset version."""
+    if not enabled():
+        return {}
+    try:
+        entries = list(os.scandir(version_dir(path, fingerprint)))
+    except OSError:
+        return {}
+    return {unquote(os.path.splitext(entry.name)[0]): entry.stat().st_size
+            for entry in entries if entry.name.endswith(('.arrow', '.npbin'))}
@@ -0,0 +1,207 @@
+"""Nearest-facility and radius searches over the hospital coordinates.
+
+Hospitals are placed on the unit sphere (x, y, z) and indexed by a k-d tree
+with buckets of ``LEAF_SIZE`` points. On the sphere, the straight-line
+(chord) distance between two points orders them exactly like the
+great-circle (haversine) distance. The tree therefore answers
+"the k nearest hospitals" and "every hospital within r km" exactly, and
+converts to kilometres only at the end:
+
+- k nearest: best-first descent, pruning subtrees whose bounding box is
+  farther than the current k-th candidate
+- radius: subtrees entirely inside the sphere are taken whole, those
+  entirely outside are skipped, and only boundary buckets are checked point
+  by point
+
+Both visit O(log n) nodes for a typical query. The tree is built once per
+dataset version (and once per filter, in a small LRU, when a global filter
+restricts the candidates). ``nearest_many`` and ``within_radius_many``
+answer batches of points, e.g. a catchment table for every district.
+"""
+import heapq
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from hospital_data import cached_artifact, dataset_fingerprint, load_hospitals
+from instrumentation import track_cache
+
+LAT_COL = 'Location_Lat'
+LON_COL = 'Location_Lon'
+EARTH_RADIUS_KM = 6371.0088
+LEAF_SIZE = 32
+
+
+def _unit_vectors(lat, lon):
+    lat, lon = np.radians(np.asarray(lat, dtype='float64')), np.radians(np.asarray(lon, dtype='float64'))
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def _chord(km):
+    return 2 * np.sin(np.minimum(np.asarray(km, dtype='float64'), np.pi * EARTH_RADIUS_KM) / (2 * EARTH_RADIUS_KM))
+
+
+def _km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+
+def build_tree(lat, lon, rows):
+    """k-d tree over the points (``lat``, ``lon``) whose row positions are ``rows`` (NaN coordinates skipped).
+
+    Points are reordered so every node covers a contiguous slice
+    ``[start, stop)`` of ``points`` / ``rows``; ``left``/``right`` are child
+    node ids (-1 for a leaf) and ``low``/``high`` the node's bounding box.
+    """
+    lat, lon, rows = np.asarray(lat, dtype='float64'), np.asarray(lon, dtype='float64'), np.asarray(rows)
+    located = ~(np.isnan(lat) | np.isnan(lon))
+    points, rows = _unit_vectors(lat[located], lon[located]), rows[located].astype('int64')
+    order = np.arange(len(points))
+    start, stop, left, right, low, high = [], [], [], [], [], []
+
+    def build(lo, hi):
+        node = len(start)
+        block = points[order[lo:hi]]
+        start.append(lo), stop.append(hi), left.append(-1), right.append(-1)
+        low.append(block.min(axis=0) if hi > lo else np.zeros(3))
+        high.append(block.max(axis=0) if hi > lo else np.zeros(3))
+        if hi - lo > LEAF_SIZE:
+            # Split the widest side at the median, partitioning this node's slice of ``order`` in place.
+            axis = int(np.argmax(high[node] - low[node]))
+            mid = (hi - lo) // 2
+            order[lo:hi] = order[lo:hi][np.argpartition(block[:, axis], mid)]
+            left[node] = build(lo, lo + mid)
+            right[node] = build(lo + mid, hi)
+        return node
+
+    build(0, len(points))
+    return {'points': points[order], 'rows': rows[order], 'start': np.array(start), 'stop': np.array(stop),
+            'left': np.array(left), 'right': np.array(right), 'low': np.array(low), 'high': np.array(high)}
+
+
+def build_spatial_index(df):
+    return build_tree(df[LAT_COL], df[LON_COL], np.arange(len(df)))
+
+
+@track_cache
+@lru_cache(maxsize=16)
+def _filtered_tree(fingerprint, hospital_filter):
+    df = load_hospitals()
+    rows = hospital_filter.rows()
+    return build_tree(df[LAT_COL].to_numpy()[rows], df[LON_COL].to_numpy()[rows], rows)
+
+
+def spatial_index(hospital_filter=None):
+    """The tree over every located hospital, or over those kept by ``hospital_filter``."""
+    if hospital_filter is not None and hospital_filter.restricts_rows:
+        return _filtered_tree(dataset_fingerprint(), hospital_filter)
+    return cached_artifact('spatial_index', build_spatial_index)
+
+
+def _box_distance2(tree, node, q):
+    # Squared distance from ``q`` to the node's bounding box (0 inside it).
+    gap = np.maximum(tree['low'][node] - q, 0) + np.maximum(q - tree['high'][node], 0)
+    return float(gap @ gap)
+
+
+def _nearest(tree, q, k):
+    best_d2, best_i = np.empty(0), np.empty(0, dtype='int64')
+    if not len(tree['points']):
+        return best_i, best_d2
+    heap = [(0.0, 0)]
+    while heap:
+        bound, node = heapq.heappop(heap)
+        if len(best_d2) == k and bound > best_d2[-1]:
+            break
+        if tree['left'][node] < 0:
+            lo, hi = tree['start'][node], tree['stop'][node]
+            diff = tree['points'][lo:hi] - q
+            d2 = np.einsum('ij,ij->i', diff, diff)
+            best_d2 = np.concatenate([best_d2, d2])
+            best_i = np.concatenate([best_i, np.arange(lo, hi)])
+            keep = np.argsort(best_d2, kind='stable')[:k]
+            best_d2, best_i = best_d2[keep], best_i[keep]
+        else:
+            for child in (tree['left'][node], tree['right'][node]):
+                d2 = _box_distance2(tree, child, q)
+                if len(best_d2) < k or d2 <= best_d2[-1]:
+                    heapq.heappush(heap, (d2, child))
+    return best_i, best_d2
+
+
+def _within(tree, q, chord):
+    r2 = chord * chord
+    found, stack = [], [0] if len(tree['points']) else []
+    while stack:
+        node = stack.pop()
+        if _box_distance2(tree, node, q) > r2:
+            continue
+        lo, hi = tree['start'][node], tree['stop'][node]
+        far = np.maximum(np.abs(tree['low'][node] - q), np.abs(tree['high'][node] - q))
+        if float(far @ far) <= r2:  # the whole box is inside the sphere
+            found.append(np.arange(lo, hi))
+        elif tree['left'][node] < 0:
+            diff = tree['points'][lo:hi] - q
+            found.append(lo + np.flatnonzero(np.einsum('ij,ij->i', diff, diff) <= r2))
+        else:
+            stack.extend((tree['right'][node], tree['left'][node]))
+    index = np.concatenate(found) if found else np.empty(0, dtype='int64')
+    diff = tree['points'][index] - q
+    d2 = np.einsum('ij,ij->i', diff, diff)
+    order = np.argsort(d2, kind='stable')
+    return index[order], d2[order]
+
+
+def _result(tree, index, d2):
+    return pd.DataFrame({'row': tree['rows'][index], 'distance_km': _km(np.sqrt(d2))})
+
+
+def nearest(lat, lon, k=5, hospital_filter=None):
+    """The ``k`` hospitals closest to (``lat``, ``lon``): ``row`` positions and ``distance_km``, nearest first."""
+    tree = spatial_index(hospital_filter)
+    return _result(tree, *_nearest(tree, _unit_vectors(lat, lon), k))
+
+
+def within_radius(lat, lon, radius_km, hospital_filter=None):
+    """Every hospital within ``radius_km`` of (``lat``, ``lon``), nearest first (same columns as ``nearest``)."""
+    tree = spatial_index(hospital_filter)
+    return _result(tree, *_within(tree, _unit_vectors(lat, lon), float(_chord(radius_km))))
+
+
+def nearest_many(lats, lons, k=1, hospital_filter=None):
+    """Batch ``nearest``: (rows, distances_km) arrays of shape (points, k), nearest first.
+
+    Missing neighbours (fewer than ``k`` candidates) are -1 / NaN.
+    """
+    tree = spatial_index(hospital_filter)
+    queries = _unit_vectors(lats, lons).reshape(-1, 3)
+    rows = np.full((len(queries), k), -1, dtype='int64')
+    distances = np.full((len(queries), k), np.nan)
+    for i, q in enumerate(queries):
+        if np.isnan(q).any():
+            continue
+        index, d2 = _nearest(tree, q, k)
+        rows[i, :len(index)] = tree['rows'][index]
+        distances[i, :len(index)] = _km(np.sqrt(d2))
+    return rows, distances
+
+
+def within_radius_many(lats, lons, radius_km, hospital_filter=None):
+    """Batch ``within_radius``: one array of row positions per point, nearest first."""
+    tree = spatial_index(hospital_filter)
+    chord = float(_chord(radius_km))
+    results = []
+    for q in _unit_vectors(lats, lons).reshape(-1, 3):
+        results.append(np.empty(0, dtype='int64') if np.isnan(q).any() else tree['rows'][_within(tree, q, chord)[0]])
+    return results
+
+
+def circle(lat, lon, radius_km, points=72):
+    """(lats, lons) of a closed circle of ``radius_km`` around a point, for drawing on the map."""
+    bearing = np.radians(np.linspace(0, 360, points + 1))
+    angle = radius_km / EARTH_RADIUS_KM
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2 = np.arcsin(np.sin(lat1) * np.cos(angle) + np.cos(lat1) * np.sin(angle) * np.cos(bearing))
+    lon2 = lon1 + np.arctan2(np.sin(bearing) * np.sin(angle) * np.cos(lat1),
+                             np.cos(angle) - np.sin(lat1) * np.sin(lat2))
+    return np.degrees(lat2), np.degrees(lon2)
@@ -0,0 +1,47 @@
+"""Every test runs against a private copy of the bundled CSV.
+
+The app modules read their configuration (data path, backends, caches) from
+the environment at import time, so it is set here, before any test imports
+them. Caches shared between processes, on-disk figure caches and the
+background warm-up are switched off.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(tempfile.mkdtemp(prefix='hospitals-tests-'), 'UAE_hospitals_data.csv')
+shutil.copy(os.path.join(APP_DIR, 'UAE_hospitals_data.csv'), DATA_PATH)
+
+os.environ.update(HOSPITALS_DATA_PATH=DATA_PATH, HOSPITALS_WARMUP='0', HOSPITALS_STORE='0',
+                  HOSPITALS_QUERY_BACKEND='pandas')
+for name in ('HOSPITALS_SHARED_DIR', 'HOSPITALS_FIGURE_CACHE_DIR', 'HOSPITALS_TRACE_FILE', 'HOSPITALS_PROFILE_DIR'):
+    os.environ.pop(name, None)
+sys.path.insert(0, APP_DIR)
+
+
+@pytest.fixture
+def raw_hospitals():
+    """The bundled CSV as parsed, untyped rows (the material delta files are made of)."""
+    import pandas as pd
+    return pd.read_csv(DATA_PATH)
+
+
+@pytest.fixture
+def delta_files():
+    """Add delta CSVs with ``add(frame, name)``; they are removed again after the test (a full reload follows)."""
+    from hospital_deltas import add_delta, delta_dir
+
+    staging = tempfile.mkdtemp(prefix='hospitals-delta-')
+
+    def add(frame, name):
+        source = os.path.join(staging, name)
+        frame.to_csv(source, index=False)
+        add_delta(source, DATA_PATH)
+
+    yield add
+    shutil.rmtree(delta_dir(DATA_PATH), ignore_errors=True)
+    shutil.rmtree(staging, ignore_errors=True)
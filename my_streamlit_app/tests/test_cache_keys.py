@@ -0,0 +1,35 @@
+"""The background warm-up fills the same cache entries the pages read."""
+import cache_warmup
+import distributions
+import hospital_forecast
+import hospital_rankings
+import keyword_engine
+from hospital_filters import HospitalFilter
+from keyword_engine import TERM_COLUMNS
+
+
+def test_pages_hit_the_warmed_entries():
+    for step in ('rankings', 'forecasts', 'keywords', 'distributions'):
+        cache_warmup.WARMUP_STEPS[step][1]()
+    cached = [hospital_rankings._leaderboard, hospital_forecast._state_forecast, keyword_engine._cached_frequencies,
+              distributions._histogram]
+    misses = [function.cache_info().misses for function in cached]
+
+    # What the pages pass: the sidebar's unrestricted filter and their widgets' default values.
+    page_filter = HospitalFilter()
+    hospital_rankings.leaderboard('margin', 10, ascending=False, hospital_filter=page_filter)
+    hospital_forecast.state_forecast('cost', 3, page_filter)
+    for kind in TERM_COLUMNS:
+        keyword_engine.keyword_frequencies(kind, page_filter, top=20)
+    groups = distributions.distribution_groups(page_filter.select_years(hospital_forecast.year_matrices()['years']))
+    for column in next(iter(groups.values())):
+        distributions.histogram(column, bins=30, hospital_filter=page_filter)
+
+    assert [function.cache_info().misses for function in cached] == misses
+
+
+def test_year_range_stays_part_of_the_key():
+    years = hospital_forecast.year_matrices()['years']
+    full = hospital_forecast.state_forecast('cost', 3)
+    recent = hospital_forecast.state_forecast('cost', 3, HospitalFilter(years=(years[-3], years[-1])))
+    assert not full.equals(recent)
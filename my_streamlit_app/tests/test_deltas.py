@@ -0,0 +1,64 @@
+"""Derived tables patched from a delta file equal the same tables rebuilt from scratch."""
+import numpy as np
+import pandas as pd
+
+import hospital_data
+import hospital_forecast
+import hospital_metrics
+from hospital_deltas import KEY_COLUMNS
+from hospital_schema import STATE_COL
+
+
+def _patched():
+    return {'cube': hospital_metrics.state_cube(), 'summary': hospital_metrics.state_summary(),
+            'matrices': hospital_metrics.year_matrices(), 'fits': hospital_forecast.hospital_fits()}
+
+
+def _rebuilt():
+    df = hospital_data.load_hospitals()
+    matrices = hospital_metrics.build_year_matrices(df)
+    return {'cube': hospital_metrics.build_state_cube(hospital_metrics.build_long_metrics(df)),
+            'summary': hospital_metrics.build_state_summary(df), 'matrices': matrices,
+            'fits': {metric: hospital_forecast.fit_linear_trends(matrices['years'], matrices[metric])
+                     for metric in hospital_forecast.FORECAST_METRICS}}
+
+
+def _assert_same(patched, rebuilt):
+    pd.testing.assert_frame_equal(patched['cube'], rebuilt['cube'], check_dtype=False, rtol=1e-9)
+    pd.testing.assert_frame_equal(patched['summary'], rebuilt['summary'], check_dtype=False, rtol=1e-9)
+    assert patched['matrices'].keys() == rebuilt['matrices'].keys()
+    assert patched['matrices']['years'] == rebuilt['matrices']['years']
+    for metric, values in rebuilt['matrices'].items():
+        if metric != 'years':
+            np.testing.assert_allclose(patched['matrices'][metric], values, rtol=1e-9)
+    for metric, fit in rebuilt['fits'].items():
+        for key, values in fit.items():
+            np.testing.assert_allclose(patched['fits'][metric][key], values, rtol=1e-9, err_msg=f'{metric} {key}')
+
+
+def test_updated_and_new_hospitals(raw_hospitals, delta_files):
+    _patched()  # build the tables first, so the delta patches them
+    updated = raw_hospitals.sample(50, random_state=1)
+    updated['total cost of the hospital in 2023 (million AED)'] *= 1.5
+    updated[STATE_COL] = 'Dubai'
+    added = raw_hospitals.iloc[:20].copy()
+    added['Name of hospital or clinic'] = [f'New Clinic {i}' for i in range(20)]
+    delta_files(pd.concat([updated, added]), 'update.csv')
+
+    patched, rebuilt = _patched(), _rebuilt()
+    assert len(hospital_data.load_hospitals()) == len(raw_hospitals) + 20
+    _assert_same(patched, rebuilt)
+
+
+def test_new_year_for_some_hospitals(raw_hospitals, delta_files):
+    _patched()
+    picked = pd.concat([raw_hospitals[raw_hospitals[STATE_COL] == state].head(1) for state in ('Ajman', 'Fujairah')])
+    delta = picked[KEY_COLUMNS].assign(**{'Number of patients in 2026': [1000, 2000],
+                                          'total cost of the hospital in 2026 (million AED)': [12.5, 30.25]})
+    delta_files(delta, 'year-2026.csv')
+
+    patched, rebuilt = _patched(), _rebuilt()
+    _assert_same(patched, rebuilt)
+    # Every Emirate has 2026 rows, not just the two the delta touched.
+    states = raw_hospitals[STATE_COL].nunique()
+    assert patched['cube'].loc[2026].index.get_level_values(STATE_COL).nunique() == states
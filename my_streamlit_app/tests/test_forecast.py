@@ -0,0 +1,19 @@
+"""Per-hospital forecasts read from the cached fits match a direct fit of the same rows."""
+import numpy as np
+
+from hospital_forecast import fit_linear_trends, forecast_from_fit, hospital_forecast
+from hospital_metrics import year_matrices
+
+
+def test_hospital_forecast_matches_direct_fit():
+    matrices = year_matrices()
+    rows = [0, 7, 123, len(matrices['patients']) - 1]
+    forecast = hospital_forecast(rows, 'patients', horizon=2)
+    target_years = [matrices['years'][-1] + 1, matrices['years'][-1] + 2]
+    assert forecast.index.get_level_values('Year').unique().tolist() == target_years
+
+    mean, lower, upper = forecast_from_fit(fit_linear_trends(matrices['years'], matrices['patients'][rows]),
+                                           target_years)
+    np.testing.assert_allclose(forecast['forecast'].to_numpy(), mean.ravel())
+    np.testing.assert_allclose(forecast['lower'].to_numpy(), lower.ravel())
+    np.testing.assert_allclose(forecast['upper'].to_numpy(), upper.ravel())
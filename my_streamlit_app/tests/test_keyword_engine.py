@@ -0,0 +1,46 @@
+"""Bitset term queries select the same hospitals as splitting the text columns with pandas."""
+import numpy as np
+import pytest
+
+from hospital_data import load_hospitals
+from keyword_engine import TERM_COLUMNS, TERM_SEPARATOR, keyword_frequencies, term_frequencies, term_mask
+
+
+def _term_sets(kind):
+    tokens = load_hospitals()[TERM_COLUMNS[kind]].str.split(TERM_SEPARATOR)
+    return [set() if not isinstance(terms, list) else {t.strip() for t in terms} - {''} for terms in tokens]
+
+
+@pytest.mark.parametrize('kind', list(TERM_COLUMNS))
+def test_term_mask(kind):
+    sets = _term_sets(kind)
+    common = keyword_frequencies(kind).index[:6].tolist()
+    queries = [
+        dict(all_of=common[:2]),
+        dict(any_of=common[2:4]),
+        dict(none_of=common[4:5]),
+        dict(all_of=common[:1], any_of=common[1:3], none_of=common[3:5]),
+        dict(all_of=[common[0], 'no such term']),
+        dict(any_of=['no such term']),
+    ]
+    for query in queries:
+        expected = np.array([set(query.get('all_of', ())) <= terms
+                             and (not query.get('any_of') or bool(terms & set(query['any_of'])))
+                             and not terms & set(query.get('none_of', ())) for terms in sets])
+        assert (term_mask(kind, **query) == expected).all(), query
+
+
+def test_single_term_matches_str_contains():
+    # A term that is no part of another term is found by a plain substring search too.
+    column = load_hospitals()[TERM_COLUMNS['treatments']]
+    vocabulary = keyword_frequencies('treatments').index
+    term = next(t for t in vocabulary if sum(t in other for other in vocabulary) == 1)
+    assert (term_mask('treatments', all_of=[term]) == column.str.contains(term, regex=False).fillna(False)).all()
+
+
+def test_frequencies_of_selected_rows():
+    rows = np.flatnonzero(load_hospitals()['State'].eq('Sharjah').to_numpy())
+    sets = [terms for i, terms in enumerate(_term_sets('treatments')) if i in set(rows)]
+    freq = term_frequencies('treatments', rows)
+    for term in freq.index[:10]:
+        assert freq[term] == sum(term in terms for terms in sets)
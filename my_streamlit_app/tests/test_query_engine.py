@@ -0,0 +1,57 @@
+"""The DuckDB backend returns what the pandas code paths compute, for the same filters."""
+import pandas as pd
+import pytest
+
+duckdb = pytest.importorskip('duckdb')
+
+import hospital_metrics
+import query_engine
+from hospital_data import load_hospitals
+from hospital_filters import HospitalFilter
+from keyword_engine import keyword_frequencies
+
+
+@pytest.fixture
+def sql_backend(monkeypatch):
+    monkeypatch.setattr(query_engine, '_database', duckdb.connect())
+    monkeypatch.setattr(query_engine._local, 'cursor', None, raising=False)
+
+
+def _filters():
+    treatments = tuple(keyword_frequencies('treatments').index[:3])
+    return [
+        None,
+        HospitalFilter(states=('Dubai', 'Sharjah')),
+        HospitalFilter(ratings=('Good', 'Very Good')),
+        HospitalFilter(doctors=(5, 40)),
+        HospitalFilter(treatments=treatments[:2], treatment_match='any'),
+        HospitalFilter(treatments=treatments[:2], treatment_match='all', states=('Abu Dhabi',)),
+        HospitalFilter(excluded_treatments=treatments[2:], ratings=('Acceptable',)),
+    ]
+
+
+@pytest.mark.parametrize('hospital_filter', _filters(), ids=repr)
+def test_state_tables(sql_backend, hospital_filter):
+    df = load_hospitals()
+    rows = None if hospital_filter is None else hospital_filter.rows()
+    expected_cube = hospital_metrics.build_state_cube(
+        hospital_metrics.long_metrics() if rows is None else hospital_metrics._filtered_long(rows))
+    expected_summary = hospital_metrics.build_state_summary(df if rows is None else df.iloc[rows])
+
+    pd.testing.assert_frame_equal(hospital_metrics.sql_state_cube(df, hospital_filter), expected_cube,
+                                  check_dtype=False, check_index_type=False, rtol=1e-9)
+    pd.testing.assert_frame_equal(hospital_metrics.sql_state_summary(df, hospital_filter), expected_summary,
+                                  check_dtype=False, check_index_type=False, rtol=1e-9)
+
+
+@pytest.mark.parametrize('hospital_filter', _filters(), ids=repr)
+def test_select_rows(sql_backend, hospital_filter):
+    columns = ['Number of Doctors', 'total cost of the hospital in 2023 (million AED)', 'State']
+    df = load_hospitals()
+    rows = None if hospital_filter is None else hospital_filter.rows()
+    expected = (df if rows is None else df.iloc[rows])[columns].dropna(subset=columns[:2])
+
+    selected = query_engine.select_rows(columns, hospital_filter, not_null=columns[:2])
+    assert selected.index.tolist() == expected.index.tolist()
+    pd.testing.assert_frame_equal(selected, expected, check_dtype=False, check_categorical=False,
+                                  check_index_type=False)
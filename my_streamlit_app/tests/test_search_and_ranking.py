@@ -0,0 +1,29 @@
+"""Trigram name search and argpartition top-k against straightforward pandas equivalents."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from hospital_index import _normalize, hospital_names, search_names
+from hospital_rankings import top_k_rows
+
+
+def test_exact_names_come_first():
+    names = hospital_names()
+    for name in pd.Series(names).sample(200, random_state=3):
+        found = search_names(name)
+        assert name in found
+        assert _normalize(found[0]) == _normalize(name)
+
+
+def test_search_ignores_case_and_punctuation():
+    name = next(name for name in hospital_names() if len(name.split()) > 2)
+    assert name in search_names(name.upper().replace(' ', '  - '))
+
+
+@pytest.mark.parametrize('k', [1, 10, 250, 10_000])
+def test_top_k_matches_nlargest(k):
+    # Few distinct values, so ties are common; both keep tied rows in their original order.
+    values = np.random.default_rng(11).integers(0, 50, size=5_000).astype('float64')
+    series = pd.Series(values)
+    assert top_k_rows(values, k).tolist() == series.nlargest(k, keep='first').index.tolist()
+    assert top_k_rows(values, k, ascending=True).tolist() == series.nsmallest(k, keep='first').index.tolist()
@@ -0,0 +1,53 @@
+"""Tree searches return exactly what a brute-force haversine scan over every hospital returns."""
+import numpy as np
+import pytest
+
+from hospital_data import load_hospitals
+from hospital_filters import HospitalFilter
+from spatial_index import EARTH_RADIUS_KM, LAT_COL, LON_COL, nearest, nearest_many, within_radius
+
+QUERIES = np.random.default_rng(7).uniform((22.6, 51.6), (26.0, 56.3), size=(25, 2))
+
+
+def _haversine(lat, lon, lats, lons):
+    lat, lon, lats, lons = map(np.radians, (lat, lon, lats, lons))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def _brute_force(lat, lon, hospital_filter):
+    df = load_hospitals()
+    rows = hospital_filter.rows() if hospital_filter is not None else None
+    rows = np.arange(len(df)) if rows is None else rows
+    lats, lons = df[LAT_COL].to_numpy()[rows], df[LON_COL].to_numpy()[rows]
+    located = ~(np.isnan(lats) | np.isnan(lons))
+    return rows[located], _haversine(lat, lon, lats[located], lons[located])
+
+
+@pytest.mark.parametrize('hospital_filter', [None, HospitalFilter(states=('Ajman', 'Dubai'))], ids=repr)
+def test_nearest(hospital_filter):
+    for lat, lon in QUERIES:
+        rows, distances = _brute_force(lat, lon, hospital_filter)
+        found = nearest(lat, lon, k=8, hospital_filter=hospital_filter)
+        np.testing.assert_allclose(found['distance_km'], np.sort(distances)[:8], rtol=1e-9, atol=1e-6)
+        np.testing.assert_allclose(distances[np.searchsorted(rows, found['row'])], found['distance_km'],
+                                   rtol=1e-9, atol=1e-6)
+
+
+def test_nearest_many_matches_nearest():
+    rows, distances = nearest_many(QUERIES[:, 0], QUERIES[:, 1], k=3)
+    for (lat, lon), picked, km in zip(QUERIES, rows, distances):
+        found = nearest(lat, lon, k=3)
+        assert picked.tolist() == found['row'].tolist()
+        np.testing.assert_allclose(km, found['distance_km'])
+
+
+@pytest.mark.parametrize('radius_km', [0.5, 5, 40])
+def test_within_radius(radius_km):
+    for lat, lon in QUERIES:
+        rows, distances = _brute_force(lat, lon, None)
+        found = within_radius(lat, lon, radius_km)
+        # Points within a rounding error of the boundary may land on either side.
+        inside, outside = set(rows[distances < radius_km - 1e-6]), set(rows[distances <= radius_km + 1e-6])
+        assert inside <= set(found['row']) <= outside
+        assert found['distance_km'].is_monotonic_increasing